@@ -98,6 +98,9 @@ const appData = {
   }
 };
 
+// Backend API (enhanced_backend_server.py)
+const API_BASE_URL = 'http://localhost:5000/api';
+
 // Global variables
 let currentAnalyticsRoute = 'tp_pc';
 let comparisonChart = null;
@@ -105,6 +108,8 @@ let accuracyChart = null;
 let allocationChart = null;
 let updateInterval = null;
 let clockInterval = null;
+let eventSource = null;
+let knownVersions = null;
 let currentTime = new Date();
 
 // Wait for DOM to be fully loaded
@@ -275,6 +280,12 @@ function updateRefreshCountdown() {
   const nextUpdateEl = document.getElementById('next-update');
   if (!nextUpdateEl) return;
   
+  // Pushed by the server as soon as data changes
+  if (eventSource && eventSource.readyState === EventSource.OPEN) {
+    nextUpdateEl.textContent = 'LIVE';
+    return;
+  }
+  
   const now = Math.floor(Date.now() / 1000);
   const nextUpdate = now + (30 - (now % 30));
   const countdown = nextUpdate - now;
@@ -610,6 +621,28 @@ function createAccuracyChart() {
   });
   
   console.log('Accuracy chart created successfully');
+  loadAccuracyData();
+}
+
+// Replace the sample accuracy series with tracked per-hour accuracy (100 - MAPE)
+function loadAccuracyData() {
+  fetch(`${API_BASE_URL}/accuracy?route=${currentAnalyticsRoute}&group_by=hour`)
+    .then(response => response.ok ? response.json() : Promise.reject(response.status))
+    .then(result => {
+      const groups = result.groups.filter(group => group.forecast && group.forecast.mape !== null);
+      if (!accuracyChart || groups.length === 0) {
+        return;
+      }
+      
+      const accuracyData = groups.map(group => Math.max(0, 100 - group.forecast.mape).toFixed(1));
+      accuracyChart.data.labels = groups.map(group => `${group.hour.toString().padStart(2, '0')}:00`);
+      accuracyChart.data.datasets[0].data = accuracyData;
+      accuracyChart.options.scales.y.min = Math.max(0, Math.floor(Math.min(...accuracyData) / 5) * 5);
+      accuracyChart.options.scales.y.max = 100;
+      accuracyChart.update();
+      console.log('Accuracy chart updated from tracked forecast errors');
+    })
+    .catch(error => console.log('Accuracy API unavailable, showing sample data:', error));
 }
 
 function createAllocationChart() {
@@ -668,6 +701,37 @@ function createAllocationChart() {
   });
   
   console.log('Allocation chart created successfully');
+  loadAllocationData();
+}
+
+// Replace the sample allocation with tomorrow's shared-fleet depot allocation, stacked by route
+function loadAllocationData() {
+  fetch(`${API_BASE_URL}/depot-allocation`)
+    .then(response => response.ok ? response.json() : Promise.reject(response.status))
+    .then(result => {
+      const routes = result.depots.flatMap(depot => depot.routes);
+      if (!allocationChart || routes.length === 0) {
+        return;
+      }
+      
+      const colors = ['#1FB8CD', '#FFC185', '#B4413C', '#5D878F', '#DB4545', '#D2BA4C'];
+      allocationChart.data.datasets = routes.map((route, i) => {
+        const info = appData.routes.find(r => r.id === route.route_id);
+        return {
+          label: info ? info.name : route.route_id,
+          data: route.buses,
+          backgroundColor: colors[i % colors.length],
+          borderRadius: 4,
+          borderSkipped: false
+        };
+      });
+      allocationChart.options.plugins.legend.display = true;
+      allocationChart.options.scales.x.stacked = true;
+      allocationChart.options.scales.y.stacked = true;
+      allocationChart.update();
+      console.log('Allocation chart updated from depot allocation');
+    })
+    .catch(error => console.log('Depot allocation API unavailable, showing sample data:', error));
 }
 
 // Chart Refresh Functions
@@ -687,6 +751,8 @@ function refreshAnalyticsCharts() {
   
   if (!accuracyChart) {
     setTimeout(createAccuracyChart, 200);
+  } else {
+    loadAccuracyData();
   }
   
   updateConfidenceScore();
@@ -698,6 +764,9 @@ function refreshSchedulerCharts() {
   // Create chart if it doesn't exist yet
   if (!allocationChart) {
     setTimeout(createAllocationChart, 100);
+  } else if (allocationChart.data.datasets.length > 1) {
+    // Already showing the depot allocation; reload it
+    loadAllocationData();
   } else {
     // Simulate dynamic allocation based on current conditions
     const baseAllocation = [8, 6, 4, 3, 5, 12, 25, 35, 32, 20, 18, 15, 14, 13, 12, 11, 28, 38, 35, 25, 18, 15, 12, 10];
@@ -707,6 +776,7 @@ function refreshSchedulerCharts() {
     allocationChart.data.datasets[0].data = adjustedAllocation;
     allocationChart.update();
     console.log('Allocation chart updated with weather adjustment:', weatherAdjustment);
+    loadAllocationData();
   }
 }
 
@@ -769,7 +839,70 @@ function deploySchedule() {
 }
 
 // Real-time Updates and Simulations
+
+// What to refetch when the server reports a dataset changed
+const DATASET_REFRESHERS = {
+  actuals: () => {
+    simulateDataUpdates();
+    updateDashboard();
+    updateRouteMetrics();
+    if (accuracyChart) loadAccuracyData();
+  },
+  predictions: () => {
+    updateTomorrowPreview();
+    if (allocationChart) loadAllocationData();
+    if (accuracyChart) loadAccuracyData();
+  },
+  schedules: () => {
+    updateRouteMetrics();
+    if (allocationChart) loadAllocationData();
+  },
+  routes: () => updateDashboard()
+};
+
 function startRealTimeUpdates() {
+  if (typeof EventSource === 'undefined') {
+    startPolling();
+    return;
+  }
+  
+  // Server-Sent Events: one idle connection instead of a timer
+  eventSource = new EventSource(`${API_BASE_URL}/events`);
+  
+  // Sent on every (re)connect; refresh whatever changed while disconnected
+  eventSource.addEventListener('versions', event => {
+    const versions = JSON.parse(event.data);
+    if (knownVersions) {
+      Object.keys(DATASET_REFRESHERS).forEach(dataset => {
+        if (versions[dataset] !== knownVersions[dataset]) {
+          DATASET_REFRESHERS[dataset]();
+        }
+      });
+    }
+    knownVersions = versions;
+    stopPolling();
+    updateElementText('auto-status', 'LIVE');
+  });
+  
+  Object.keys(DATASET_REFRESHERS).forEach(dataset => {
+    eventSource.addEventListener(dataset, event => {
+      const { version } = JSON.parse(event.data);
+      if (knownVersions) knownVersions[dataset] = version;
+      console.log(`Server update: ${dataset} (version ${version})`);
+      DATASET_REFRESHERS[dataset]();
+    });
+  });
+  
+  // The browser retries on its own; poll until the stream is back
+  eventSource.onerror = () => {
+    updateElementText('auto-status', 'AUTO');
+    startPolling();
+  };
+}
+
+function startPolling() {
+  if (updateInterval) return;
+  
   // Update metrics every 30 seconds
   updateInterval = setInterval(() => {
     simulateDataUpdates();
@@ -778,6 +911,11 @@ function startRealTimeUpdates() {
   }, 30000);
 }
 
+function stopPolling() {
+  if (updateInterval) clearInterval(updateInterval);
+  updateInterval = null;
+}
+
 function simulateSystemUpdates() {
   // Simulate system health monitoring
   setInterval(() => {
@@ -826,7 +964,8 @@ function updateElementText(id, text) {
 
 // Cleanup function
 function cleanup() {
-  if (updateInterval) clearInterval(updateInterval);
+  stopPolling();
+  if (eventSource) eventSource.close();
   if (clockInterval) clearInterval(clockInterval);
   
   // Destroy charts
@@ -1,154 +1,79 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, current_app, request, jsonify
 from flask_cors import CORS
 from datetime import datetime, timedelta
-import sqlite3
 import json
 import os
 
+import demand_rollup
+import metrics
+from bulk_writer import BulkWriter
+from db_pool import DB_PATH, close_pools, get_db, get_pool, init_app
+from migrations import migrate
+from route_registry import get_registry
+
 app = Flask(__name__)
 CORS(app)
+init_app(app)
+metrics.init_app(app, 'backend')
 
 # Database initialization
-def init_db():
-    conn = sqlite3.connect('transport_optimizer.db')
+def init_db(db_path=DB_PATH):
+    pool = get_pool(db_path)
+    conn = pool.acquire()
     cursor = conn.cursor()
 
-    # Routes table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS routes (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        distance INTEGER NOT NULL,
-        travel_time INTEGER NOT NULL,
-        current_buses INTEGER NOT NULL,
-        daily_passengers INTEGER NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Passenger demand data
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS passenger_demand (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id TEXT NOT NULL,
-        hour INTEGER NOT NULL,
-        day_of_week INTEGER NOT NULL,
-        passenger_count INTEGER NOT NULL,
-        date_recorded DATE NOT NULL,
-        FOREIGN KEY (route_id) REFERENCES routes (id)
-    )
-    """)
-
-    # Bus schedules
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS bus_schedules (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id TEXT NOT NULL,
-        departure_time TIME NOT NULL,
-        frequency_minutes INTEGER NOT NULL,
-        is_peak_hour BOOLEAN DEFAULT FALSE,
-        is_active BOOLEAN DEFAULT TRUE,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (route_id) REFERENCES routes (id)
-    )
-    """)
-
-    # Optimization results
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS optimization_results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id TEXT NOT NULL,
-        optimization_date DATE NOT NULL,
-        current_cost REAL NOT NULL,
-        optimized_cost REAL NOT NULL,
-        cost_savings REAL NOT NULL,
-        fuel_savings REAL NOT NULL,
-        recommendations TEXT NOT NULL,
-        FOREIGN KEY (route_id) REFERENCES routes (id)
-    )
-    """)
-
-    # Insert initial route data
-    routes = [
-        ('tp_pc', 'Tiruppur to Pollachi', 85, 120, 12, 2800),
-        ('tp_cb', 'Tiruppur to Coimbatore', 65, 90, 18, 4200),
-        ('tp_sl', 'Tiruppur to Salem', 113, 150, 15, 3500)
-    ]
-
-    cursor.executemany("""
-    INSERT OR REPLACE INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, routes)
+    # Create or upgrade the schema
+    migrate(conn)
 
     # Insert sample passenger demand data
     import random
-    hourly_patterns = {
-        'tp_pc': [45, 35, 25, 20, 30, 85, 180, 450, 380, 220, 180, 160, 140, 120, 110, 95, 280, 520, 420, 290, 180, 120, 80, 60],
-        'tp_cb': [60, 45, 30, 25, 40, 120, 250, 680, 540, 320, 260, 220, 190, 170, 150, 130, 380, 720, 600, 420, 260, 180, 110, 85],
-        'tp_sl': [50, 40, 28, 22, 35, 100, 210, 520, 450, 280, 230, 190, 170, 150, 130, 115, 340, 580, 480, 350, 220, 150, 95, 70]
-    }
+    registry = get_registry(db_path)
 
     # Generate 30 days of sample data
-    for route_id, pattern in hourly_patterns.items():
-        for day in range(30):
-            date = datetime.now() - timedelta(days=day)
-            for hour, base_passengers in enumerate(pattern):
-                # Add some random variation
-                passengers = max(0, int(base_passengers + random.randint(-20, 20)))
-                cursor.execute("""
-                INSERT OR REPLACE INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
-                VALUES (?, ?, ?, ?, ?)
-                """, (route_id, hour, date.weekday(), passengers, date.date()))
+    def sample_rows():
+        for route in registry:
+            for day in range(30):
+                date = datetime.now() - timedelta(days=day)
+                for hour, base_passengers in enumerate(route.profile(date.weekday())):
+                    # Add some random variation
+                    passengers = max(0, int(base_passengers + random.randint(-20, 20)))
+                    yield (route.id, hour, date.weekday(), passengers, date.date())
+
+    BulkWriter(conn).write("""
+    INSERT OR REPLACE INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
+    VALUES (?, ?, ?, ?, ?)
+    """, sample_rows(), single_transaction=True)
+    demand_rollup.sync(conn)
 
     conn.commit()
-    conn.close()
+    pool.release(conn)
 
 # API Routes
 @app.route('/api/routes', methods=['GET'])
 def get_routes():
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM routes")
-    routes = cursor.fetchall()
-    conn.close()
-
-    route_list = []
-    for route in routes:
-        route_list.append({
-            'id': route[0],
-            'name': route[1],
-            'distance': route[2],
-            'travel_time': route[3],
-            'current_buses': route[4],
-            'daily_passengers': route[5]
-        })
+    registry = get_registry(current_app.config['DATABASE'])
+    route_list = [route.to_dict() for route in registry]
 
     return jsonify(route_list)
 
 @app.route('/api/passenger-demand/<route_id>', methods=['GET'])
 def get_passenger_demand(route_id):
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-
-    # Get hourly demand for the route
-    cursor.execute("""
-    SELECT hour, AVG(passenger_count) as avg_passengers
-    FROM passenger_demand 
-    WHERE route_id = ? AND date_recorded >= date('now', '-7 days')
-    GROUP BY hour
-    ORDER BY hour
-    """, (route_id,))
+    days = request.args.get('days', demand_rollup.DEFAULT_WINDOW_DAYS, type=int)
+    day_type = request.args.get('day_type', 'all')
 
-    demand_data = cursor.fetchall()
-    conn.close()
+    if days < 1:
+        return jsonify({'error': 'days must be a positive integer'}), 400
+    if day_type not in demand_rollup.DAY_TYPES:
+        return jsonify({'error': f"day_type must be one of {', '.join(demand_rollup.DAY_TYPES)}"}), 400
 
-    hourly_demand = [0] * 24
-    for hour, avg_passengers in demand_data:
-        hourly_demand[hour] = int(avg_passengers)
+    # Averages come from the running totals, not a scan of the raw rows
+    hourly_demand = demand_rollup.hourly_average(get_db(), route_id, days, day_type)
 
     return jsonify({
         'route_id': route_id,
+        'days': days,
+        'day_type': day_type,
         'hourly_demand': hourly_demand
     })
 
@@ -160,12 +85,11 @@ def optimize_schedule():
     if not route_id:
         return jsonify({'error': 'Route ID is required'}), 400
 
-    conn = sqlite3.connect('transport_optimizer.db')
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get route information
-    cursor.execute("SELECT * FROM routes WHERE id = ?", (route_id,))
-    route = cursor.fetchone()
+    route = get_registry(current_app.config['DATABASE']).get(route_id)
 
     if not route:
         return jsonify({'error': 'Route not found'}), 404
@@ -210,7 +134,7 @@ def optimize_schedule():
             buses_needed = 1 if passengers > 0 else 0
 
         # Calculate costs
-        distance = route[2]  # distance from route table
+        distance = route.distance
         fuel_cost_per_trip = distance * 8.5  # 8.5 rupees per km
         driver_cost_per_hour = 120
         maintenance_cost_per_trip = distance * 3.2
@@ -242,7 +166,6 @@ def optimize_schedule():
     """, (route_id, datetime.now().date(), current_cost, optimized_cost, cost_savings, fuel_savings, json.dumps(recommendations)))
 
     conn.commit()
-    conn.close()
 
     return jsonify({
         'route_id': route_id,
@@ -256,7 +179,7 @@ def optimize_schedule():
 
 @app.route('/api/schedule-history/<route_id>', methods=['GET'])
 def get_schedule_history(route_id):
-    conn = sqlite3.connect('transport_optimizer.db')
+    conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -268,7 +191,6 @@ def get_schedule_history(route_id):
     """, (route_id,))
 
     history = cursor.fetchall()
-    conn.close()
 
     history_data = []
     for record in history:
@@ -284,7 +206,7 @@ def get_schedule_history(route_id):
 
 @app.route('/api/dashboard-stats', methods=['GET'])
 def get_dashboard_stats():
-    conn = sqlite3.connect('transport_optimizer.db')
+    conn = get_db()
     cursor = conn.cursor()
 
     # Total routes
@@ -306,7 +228,6 @@ def get_dashboard_stats():
     """)
     weekly_savings = cursor.fetchone()[0] or 0
 
-    conn.close()
 
     return jsonify({
         'total_routes': total_routes,
@@ -317,7 +238,10 @@ def get_dashboard_stats():
 
 if __name__ == '__main__':
     # Initialize database on startup
-    if not os.path.exists('transport_optimizer.db'):
+    if not os.path.exists(DB_PATH):
         init_db()
 
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    try:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    finally:
+        close_pools()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Tamil Nadu Transport Optimizer - Historical Backtest
+Replays forecast and scheduling policies over recorded actual demand
+
+For every day in the range, each policy forecasts demand using only data
+available before that day, derives buses and frequency from its schedule
+ladder or from the fleet-constrained optimizer, costs the schedule like
+calculate_hourly_cost and scores it against the actuals: cost, unserved
+passengers, seat utilization and forecast error. Seats per hour are those
+of seats_array, one bus per departure. Forecasters are the
+calendar profile, a trailing same-weekday mean and the seasonal smoothing
+model, which is warmed up on the look-back window and then fed each day's
+actuals after forecasting it. The report also shows each policy's cost
+and unserved passengers relative to a baseline policy.
+
+Actuals are read once from the demand cube into a [day, route, hour]
+array; days are split into chunks that worker processes score
+independently, and the per-chunk totals are summed into one summary row
+per policy.
+"""
+
+import argparse
+import json
+import logging
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db_pool import DB_PATH, close_pools, get_pool
+from demand_cube import MISSING, open_cube
+from festival_calendar import TAMIL_NADU_FESTIVALS
+from forecast_engine import (MARKET_MULTIPLIER, SCHEDULE_BOUNDS, SCHEDULE_BUSES, SCHEDULE_FREQUENCY,
+                             ForecastEngine, hourly_cost_array, schedule_arrays, seats_array)
+from route_registry import Route, get_registry
+from schedule_optimizer import optimize_schedule
+from smoothing_model import (DEFAULT_PARAMS, RouteModelState, forecast_states, hour_step,
+                             initial_state, season_slot)
+
+DEFAULT_DAYS_PER_TASK = 14
+
+
+@dataclass
+class BacktestPolicy:
+    """A forecasting method plus a schedule ladder to evaluate"""
+    name: str
+    forecaster: str = 'profile'          # 'profile' (calendar), 'trailing' (recent actuals) or 'smoothing'
+    scheduler: str = 'ladder'            # 'ladder' or 'optimizer' (schedule_optimizer)
+    lookback_weeks: int = 4              # trailing: history to average; smoothing: warm-up
+    use_festivals: bool = True
+    market_multiplier: float = MARKET_MULTIPLIER
+    demand_buffer: float = 1.0           # scale the forecast before scheduling
+    bounds: List[int] = field(default_factory=lambda: SCHEDULE_BOUNDS.tolist())
+    buses: List[int] = field(default_factory=lambda: SCHEDULE_BUSES.tolist())
+    frequency: List[int] = field(default_factory=lambda: SCHEDULE_FREQUENCY.tolist())
+    max_buses: int = 8                   # ladder only; the optimizer uses routes.current_buses
+    depot_fleet: Optional[int] = None    # optimizer: buses across all routes per hour
+
+
+# Built-in policies; more can be loaded from a JSON file with --config
+PRESET_POLICIES = {
+    'current': BacktestPolicy('current'),
+    'trailing': BacktestPolicy('trailing', forecaster='trailing'),
+    'buffered': BacktestPolicy('buffered', forecaster='trailing', demand_buffer=1.1),
+    'lean': BacktestPolicy('lean', bounds=[0, 30, 60, 110, 160, 240, 340, 450]),
+    'smoothing': BacktestPolicy('smoothing', forecaster='smoothing'),
+    'optimized': BacktestPolicy('optimized', scheduler='optimizer'),
+    'production': BacktestPolicy('production', forecaster='smoothing', scheduler='optimizer')
+}
+
+DEFAULT_BASELINE = 'current'
+
+
+@dataclass
+class BacktestData:
+    """Everything the workers need, loaded once"""
+    dates: List[date]               # History start .. end; the first lookback days are warm-up
+    first_scored: int               # Index of the first backtested day
+    route_ids: List[str]
+    actuals: np.ndarray             # [day, route, hour], NaN where nothing was recorded
+    weekday_patterns: np.ndarray
+    weekend_patterns: np.ndarray
+    distances: np.ndarray
+    current_buses: np.ndarray
+    market_days: Dict[str, frozenset]
+    festivals: Dict[str, dict]
+    routes: List[Route]             # In route_ids order, to seed the smoothing model
+
+
+@dataclass
+class BacktestSummary:
+    policy: str
+    forecaster: str
+    scheduler: str
+    days: int
+    routes: int
+    scored_hours: int
+    total_cost: float
+    passengers: int
+    unserved_passengers: int
+    unserved_pct: float
+    utilization_pct: float
+    bus_hours: int
+    mape_pct: Optional[float]
+    cost_per_passenger: float
+    cost_vs_baseline_pct: Optional[float] = None
+    unserved_vs_baseline_pct: Optional[float] = None
+
+
+def load_backtest_data(db_path: str, start: date, end: date, lookback_days: int,
+                       festivals: Dict[str, dict]) -> BacktestData:
+    """Read actuals for the range plus the look-back window"""
+    registry = get_registry(db_path)
+    index = registry.index
+    history_start = start - timedelta(days=lookback_days)
+    dates = [history_start + timedelta(days=i) for i in range((end - history_start).days + 1)]
+
+    # The cube's [route, day, hour] window, brought up to date first
+    cube = open_cube(db_path)
+    with get_pool(db_path).connection() as conn:
+        cube.sync(conn)
+    window = cube.window(history_start, end, index.route_ids)
+    actuals = np.ascontiguousarray(np.where(window == MISSING, np.nan, window).transpose(1, 0, 2))
+
+    routes = [registry.get(route_id) for route_id in index.route_ids]
+    return BacktestData(dates, lookback_days, index.route_ids, actuals, index.weekday_patterns,
+                        index.weekend_patterns, index.distances,
+                        np.array([route.current_buses for route in routes], dtype=np.int64),
+                        index.market_days, festivals, routes)
+
+
+_data: Optional[BacktestData] = None
+
+
+def _init_worker(data: BacktestData):
+    global _data
+    close_pools()  # Connections inherited across fork belong to the parent
+    _data = data
+
+
+def forecast_days(data: BacktestData, policy: BacktestPolicy, day_indices: Sequence[int]) -> np.ndarray:
+    """Policy forecast per [day, route, hour] using only earlier data"""
+    dates = [data.dates[i] for i in day_indices]
+    engine = ForecastEngine(data.route_ids, data.weekday_patterns, data.weekend_patterns,
+                            data.distances, data.market_days,
+                            data.festivals if policy.use_festivals else {},
+                            market_multiplier=policy.market_multiplier)
+    weather = np.ones(len(dates))
+    shape = (len(dates), len(data.route_ids), 24)
+
+    if policy.forecaster == 'profile':
+        return engine.demand_matrix(dates, weather, variation=np.ones(shape))
+    if policy.forecaster == 'smoothing':
+        # Hour-of-week seasonality covers market days, as in the daily update
+        return engine.demand_matrix(dates, weather, base=smoothing_days(data, policy, day_indices),
+                                    market_factors=np.ones(shape[:2]), variation=np.ones(shape))
+    if policy.forecaster != 'trailing':
+        raise ValueError(f"Unknown forecaster: {policy.forecaster}")
+
+    # Mean of the same weekday over the previous weeks (covers market days);
+    # fall back to the calendar profile where there is no history
+    base = np.empty(shape)
+    for n, i in enumerate(day_indices):
+        history = [i - 7 * week for week in range(1, policy.lookback_weeks + 1) if i - 7 * week >= 0]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN cells are filled below
+            base[n] = np.nanmean(data.actuals[history], axis=0) if history else np.nan
+    calendar = engine.demand_matrix(dates, weather, festival_factors=np.ones(len(dates)),
+                                    variation=np.ones(shape))
+    base = np.where(np.isnan(base), calendar, base)
+    return engine.demand_matrix(dates, weather, base=base, market_factors=np.ones(shape[:2]),
+                                variation=np.ones(shape))
+
+
+def _replay(states: List[RouteModelState], data: BacktestData, day_index: int):
+    """Feed one day's recorded actuals to the smoothing states"""
+    day = data.dates[day_index]
+    for state, actual in zip(states, data.actuals[day_index]):
+        for hour in np.nonzero(~np.isnan(actual))[0]:
+            state.update(hour_step(day, int(hour)), season_slot(day, int(hour)), float(actual[hour]),
+                         DEFAULT_PARAMS)
+
+
+def smoothing_days(data: BacktestData, policy: BacktestPolicy, day_indices: Sequence[int]) -> np.ndarray:
+    """Smoothing model base demand per [day, route, hour], one day ahead
+
+    The states start from the calendar profiles at the beginning of the
+    look-back window and see each day's actuals only after forecasting it.
+    """
+    states = [initial_state(route, policy.market_multiplier) for route in data.routes]
+    replayed = 0
+    base = np.empty((len(day_indices), len(data.route_ids), 24))
+    for n, i in enumerate(day_indices):
+        for earlier in range(replayed, i):
+            _replay(states, data, earlier)
+        replayed = i
+        day = data.dates[i]
+        # Rounded like the daily update, so unwarmed states reproduce the profiles
+        base[n] = np.round(forecast_states(states, [day], DEFAULT_PARAMS, hour_step(day, 0) - 1)[0], 6)
+    return base
+
+
+def schedule_days(data: BacktestData, policy: BacktestPolicy,
+                  planned: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Buses, frequency and cost per [day, route, hour] for the planned demand"""
+    if policy.scheduler == 'optimizer':
+        solution = optimize_schedule(planned, data.distances, [route.travel_time for route in data.routes],
+                                     data.current_buses, policy.depot_fleet)
+        return solution.buses, solution.frequency, solution.cost
+    if policy.scheduler != 'ladder':
+        raise ValueError(f"Unknown scheduler: {policy.scheduler}")
+    buses, frequency = schedule_arrays(planned, policy.bounds, policy.buses,
+                                       policy.frequency, policy.max_buses)
+    return buses, frequency, hourly_cost_array(buses, data.distances[None, :, None], frequency)
+
+
+def score_chunk(policy: BacktestPolicy, day_indices: Sequence[int],
+                data: Optional[BacktestData] = None) -> Dict[str, float]:
+    """Schedule, cost and score a run of days; returns additive totals"""
+    data = data or _data
+    forecast = forecast_days(data, policy, day_indices)
+    planned = np.floor(forecast * policy.demand_buffer).astype(np.int64)
+    buses, frequency, cost = schedule_days(data, policy, planned)
+
+    actual = data.actuals[list(day_indices)]
+    observed = ~np.isnan(actual)
+    actual = np.where(observed, actual, 0)
+    seats = np.floor(seats_array(buses, frequency))
+    served = np.minimum(actual, seats)
+    positive = observed & (actual > 0)
+
+    return {
+        'scored_hours': int(observed.sum()),
+        'total_cost': float(cost[observed].sum()),
+        'passengers': float(actual.sum()),
+        'unserved_passengers': float((actual - served)[observed].sum()),
+        'served_passengers': float(served[observed].sum()),
+        'seats': float(seats[observed].sum()),
+        'bus_hours': float(buses[observed].sum()),
+        'abs_pct_error': float((np.abs(forecast - actual)[positive] / actual[positive]).sum()),
+        'pct_samples': int(positive.sum())
+    }
+
+
+def _score_task(args: Tuple[BacktestPolicy, List[int]]) -> Tuple[str, Dict[str, float]]:
+    policy, day_indices = args
+    return policy.name, score_chunk(policy, day_indices)
+
+
+def summarize(policy: BacktestPolicy, days: int, routes: int, totals: Dict[str, float]) -> BacktestSummary:
+    passengers = totals['passengers']
+    return BacktestSummary(
+        policy=policy.name,
+        forecaster=policy.forecaster,
+        scheduler=policy.scheduler,
+        days=days,
+        routes=routes,
+        scored_hours=int(totals['scored_hours']),
+        total_cost=round(totals['total_cost'], 2),
+        passengers=int(passengers),
+        unserved_passengers=int(totals['unserved_passengers']),
+        unserved_pct=round(totals['unserved_passengers'] / passengers * 100, 2) if passengers else 0.0,
+        utilization_pct=round(totals['served_passengers'] / totals['seats'] * 100, 2) if totals['seats'] else 0.0,
+        bus_hours=int(totals['bus_hours']),
+        mape_pct=round(totals['abs_pct_error'] / totals['pct_samples'] * 100, 2) if totals['pct_samples'] else None,
+        cost_per_passenger=round(totals['total_cost'] / passengers, 2) if passengers else 0.0
+    )
+
+
+def compare_to_baseline(summaries: Sequence[BacktestSummary], baseline: str):
+    """Fill each summary's cost and unserved change against the baseline policy, in percent"""
+    reference = next((s for s in summaries if s.policy == baseline), None)
+    if reference is None:
+        return
+    for summary in summaries:
+        if reference.total_cost:
+            summary.cost_vs_baseline_pct = round(
+                (summary.total_cost - reference.total_cost) / reference.total_cost * 100, 2)
+        if reference.unserved_passengers:
+            summary.unserved_vs_baseline_pct = round(
+                (summary.unserved_passengers - reference.unserved_passengers)
+                / reference.unserved_passengers * 100, 2)
+
+
+def run_backtest(policies: Sequence[BacktestPolicy], start: date, end: date,
+                 db_path: str = DB_PATH, workers: Optional[int] = None,
+                 days_per_task: int = DEFAULT_DAYS_PER_TASK,
+                 festivals: Optional[Dict[str, dict]] = None,
+                 baseline: Optional[str] = DEFAULT_BASELINE) -> List[BacktestSummary]:
+    """Backtest each policy over start..end (inclusive)"""
+    lookback_days = 7 * max([p.lookback_weeks for p in policies if p.forecaster in ('trailing', 'smoothing')]
+                            or [0])
+    started = time.perf_counter()
+    data = load_backtest_data(db_path, start, end, lookback_days, festivals or {})
+    logging.info(f"Loaded {len(data.dates)} days x {len(data.route_ids)} routes of actuals "
+                 f"in {time.perf_counter() - started:.2f}s")
+
+    scored_days = list(range(data.first_scored, len(data.dates)))
+    chunks = [scored_days[i:i + days_per_task] for i in range(0, len(scored_days), days_per_task)]
+    tasks = [(policy, chunk) for policy in policies for chunk in chunks]
+
+    totals: Dict[str, Dict[str, float]] = {policy.name: {} for policy in policies}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as executor:
+        for name, chunk_totals in executor.map(_score_task, tasks):
+            for key, value in chunk_totals.items():
+                totals[name][key] = totals[name].get(key, 0) + value
+
+    logging.info(f"Backtested {len(policies)} policies over {len(scored_days)} days "
+                 f"in {time.perf_counter() - started:.2f}s")
+    summaries = [summarize(policy, len(scored_days), len(data.route_ids), totals[policy.name])
+                 for policy in policies]
+    if baseline:
+        compare_to_baseline(summaries, baseline)
+    return summaries
+
+
+def format_table(summaries: Sequence[BacktestSummary]) -> str:
+    """Fixed-width summary table"""
+    columns = [('policy', 'Policy', '{}'), ('forecaster', 'Forecast', '{}'), ('scheduler', 'Schedule', '{}'),
+               ('total_cost', 'Cost (₹)', '{:,.0f}'), ('cost_vs_baseline_pct', 'Cost Δ%', '{:+.2f}'),
+               ('cost_per_passenger', '₹/pax', '{:.2f}'), ('unserved_pct', 'Unserved %', '{:.2f}'),
+               ('unserved_vs_baseline_pct', 'Unserved Δ%', '{:+.2f}'),
+               ('utilization_pct', 'Util %', '{:.1f}'), ('bus_hours', 'Bus-hours', '{:,}'),
+               ('mape_pct', 'MAPE %', '{}')]
+    rows = [['-' if getattr(s, key) is None else fmt.format(getattr(s, key)) for key, _, fmt in columns]
+            for s in summaries]
+    widths = [max(len(title), *(len(row[i]) for row in rows)) for i, (_, title, _) in enumerate(columns)]
+    lines = ['  '.join(title.ljust(w) for (_, title, _), w in zip(columns, widths))]
+    lines.append('  '.join('-' * w for w in widths))
+    lines.extend('  '.join(value.ljust(w) for value, w in zip(row, widths)) for row in rows)
+    return '\n'.join(lines)
+
+
+def load_policies(names: Sequence[str], config_path: Optional[str]) -> List[BacktestPolicy]:
+    policies = dict(PRESET_POLICIES)
+    if config_path:
+        with open(config_path) as f:
+            for spec in json.load(f):
+                policies[spec['name']] = BacktestPolicy(**spec)
+    unknown = [name for name in names if name not in policies]
+    if unknown:
+        raise SystemExit(f"Unknown policies: {', '.join(unknown)} (available: {', '.join(policies)})")
+    return [policies[name] for name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest forecast and schedule policies on recorded actuals')
+    parser.add_argument('--start', help='first day (YYYY-MM-DD, default: 90 days ago)')
+    parser.add_argument('--end', help='last day (YYYY-MM-DD, default: yesterday)')
+    parser.add_argument('--policy', action='append', help='policy name (repeatable, default: all presets)')
+    parser.add_argument('--config', help='JSON list of extra policies (BacktestPolicy fields)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help=f'policy the others are compared to (default: {DEFAULT_BASELINE})')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--days-per-task', type=int, default=DEFAULT_DAYS_PER_TASK)
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    end = datetime.strptime(args.end, '%Y-%m-%d').date() if args.end else date.today() - timedelta(days=1)
+    start = datetime.strptime(args.start, '%Y-%m-%d').date() if args.start else end - timedelta(days=89)
+    policies = load_policies(args.policy or list(PRESET_POLICIES), args.config)
+
+    summaries = run_backtest(policies, start, end, args.db, args.workers, args.days_per_task,
+                             TAMIL_NADU_FESTIVALS, args.baseline)
+
+    if args.json:
+        print(json.dumps([asdict(s) for s in summaries], indent=2))
+    else:
+        print(f"🚌 Backtest {start} .. {end}, relative to {args.baseline}")
+        print(format_table(summaries))
+
+
+if __name__ == '__main__':
+    main()
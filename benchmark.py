@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Tamil Nadu Transport Optimizer - API Benchmark Suite
+Latency and throughput of both Flask apps across network sizes and history lengths
+
+For every combination of route count and history length, a temporary
+database is generated with synthetic_data.py and the daily update is run
+on it twice. The first run warms the smoothing model over the whole
+history. The second is the steady-state nightly cost. Each endpoint of
+enhanced_backend_server.py and backend_server.py is then called through
+Flask's test client, with no server or network involved. Route ids rotate
+between requests, so the response cache sees a realistic mix of hits and
+misses. Results are written as JSON. --baseline compares them with an
+earlier run and fails on p95 regressions.
+
+Histories are generated into passenger_demand up to AUTO_SQLITE_HOURS
+route-hours (1,000 routes over 3 years). Only larger ones go straight into
+the demand cube, because SQLite inserts would dominate the run (see
+synthetic_data.py). Endpoints that read actuals from SQLite have no
+history to read then; their results are flagged. The target is recorded
+with each result.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import backend_server
+import enhanced_backend_server
+from daily_update_scheduler import TransportDataUpdater
+from db_pool import get_pool
+from forecast_horizon import MAX_HORIZON_DAYS
+from synthetic_data import DEFAULT_SEED, generate
+
+DEFAULT_ROUTE_COUNTS = (3, 100, 1000, 5000)
+DEFAULT_HISTORY_DAYS = (30, 365, 1095)
+DEFAULT_REQUESTS = 50
+WARMUP_REQUESTS = 3
+
+# Histories up to this many route-hours go into passenger_demand, larger ones into the cube
+AUTO_SQLITE_HOURS = 30000000
+
+DEFAULT_TOLERANCE = 0.2
+
+# Slowdowns smaller than this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 1.0
+
+
+@dataclass
+class EndpointCase:
+    app: str
+    name: str
+    method: str
+    path: Callable[[str], str]          # route id -> path with query string
+    body: Optional[Callable[[str], dict]] = None
+    reads_actuals: bool = False         # reads actual demand from passenger_demand or its rollups
+
+
+@dataclass
+class EndpointResult:
+    app: str
+    endpoint: str
+    method: str
+    requests: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    throughput_rps: float
+    sqlite_history: bool = True         # False: the actuals it reads were generated into the cube only
+
+
+@dataclass
+class ConfigResult:
+    routes: int
+    days: int
+    target: str
+    generate_seconds: float
+    daily_update_first_seconds: Optional[float]
+    daily_update_second_seconds: Optional[float]
+    endpoints: List[EndpointResult] = field(default_factory=list)
+
+
+def endpoint_cases() -> List[EndpointCase]:
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    return [
+        EndpointCase('enhanced', 'routes', 'GET', lambda r: '/api/routes'),
+        EndpointCase('enhanced', 'dashboard-stats', 'GET', lambda r: '/api/dashboard-stats'),
+        EndpointCase('enhanced', 'current-factors', 'GET', lambda r: '/api/current-factors'),
+        EndpointCase('enhanced', 'passenger-demand', 'GET', lambda r: f'/api/passenger-demand/{r}',
+                     reads_actuals=True),
+        EndpointCase('enhanced', 'demand-history', 'GET',
+                     lambda r: f'/api/demand-history/{r}?start={(date.today() - timedelta(days=90)).isoformat()}'),
+        EndpointCase('enhanced', 'next-day-schedule', 'GET', lambda r: f'/api/next-day-schedule/{r}'),
+        EndpointCase('enhanced', 'schedules', 'GET', lambda r: f'/api/schedules?date={tomorrow}'),
+        EndpointCase('enhanced', 'forecast', 'GET', lambda r: f'/api/forecast?route={r}&days=7'),
+        EndpointCase('enhanced', 'depot-allocation', 'GET', lambda r: f'/api/depot-allocation?date={tomorrow}'),
+        EndpointCase('enhanced', 'timetable', 'GET', lambda r: f'/api/timetable/{r}?date={tomorrow}'),
+        EndpointCase('enhanced', 'accuracy', 'GET', lambda r: f'/api/accuracy?route={r}', reads_actuals=True),
+        EndpointCase('enhanced', 'scenarios', 'POST', lambda r: '/api/scenarios',
+                     lambda r: {'date': tomorrow, 'routes': [r],
+                                'scenarios': [{'fuel_per_km': 14.0}, {'demand_multiplier': 1.2}]}),
+        EndpointCase('backend', 'routes', 'GET', lambda r: '/api/routes'),
+        EndpointCase('backend', 'dashboard-stats', 'GET', lambda r: '/api/dashboard-stats'),
+        EndpointCase('backend', 'passenger-demand', 'GET', lambda r: f'/api/passenger-demand/{r}',
+                     reads_actuals=True),
+        EndpointCase('backend', 'schedule-history', 'GET', lambda r: f'/api/schedule-history/{r}'),
+        EndpointCase('backend', 'optimize-schedule', 'POST', lambda r: '/api/optimize-schedule',
+                     lambda r: {'route_id': r}, reads_actuals=True),
+    ]
+
+
+APPS = {
+    'enhanced': enhanced_backend_server.app,
+    'backend': backend_server.app
+}
+
+
+def percentile_ms(samples: Sequence[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def measure(client, case: EndpointCase, route_ids: Sequence[str], requests: int,
+            rng: np.random.Generator) -> EndpointResult:
+    """Time requests calls of one endpoint, after a few untimed warm-up calls"""
+    def call(route_id: str) -> int:
+        path = case.path(route_id)
+        if case.method == 'POST':
+            response = client.post(path, json=case.body(route_id))
+        else:
+            response = client.get(path)
+        response.get_data()  # Streamed bodies are produced while being read
+        return response.status_code
+
+    chosen = rng.choice(route_ids, WARMUP_REQUESTS + requests)
+    for route_id in chosen[:WARMUP_REQUESTS]:
+        call(route_id)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for route_id in chosen[WARMUP_REQUESTS:]:
+        began = time.perf_counter()
+        status = call(route_id)
+        latencies.append(time.perf_counter() - began)
+        errors += status >= 400
+    elapsed = time.perf_counter() - started
+
+    return EndpointResult(
+        app=case.app,
+        endpoint=case.name,
+        method=case.method,
+        requests=requests,
+        errors=errors,
+        p50_ms=percentile_ms(latencies, 50),
+        p95_ms=percentile_ms(latencies, 95),
+        p99_ms=percentile_ms(latencies, 99),
+        mean_ms=round(float(np.mean(latencies)) * 1000, 3),
+        throughput_rps=round(requests / elapsed, 1) if elapsed > 0 else 0.0
+    )
+
+
+def timed(call: Callable) -> Tuple[object, float]:
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+def run_config(routes: int, days: int, requests: int, seed: int, target: str,
+               workdir: str, daily_update: bool = True) -> ConfigResult:
+    """Generate one database and benchmark it"""
+    db_path = os.path.join(workdir, f"bench_{routes}_{days}.db")
+    if target == 'auto':
+        target = 'sqlite' if routes * days * 24 <= AUTO_SQLITE_HOURS else 'cube'
+    summary = generate(db_path, routes, days, seed, target, overwrite=True)
+    result = ConfigResult(routes, days, target, round(summary.seconds, 3), None, None)
+    logging.info(f"Benchmarking {routes} routes x {days} days ({target})")
+
+    if daily_update:
+        # As the scheduler runs it, so GET /api/forecast reads a stored horizon
+        def daily_update():
+            return updater.run_daily_update(horizon_days=MAX_HORIZON_DAYS)
+
+        updater = TransportDataUpdater(db_path)
+        first, first_seconds = timed(daily_update)
+        second, second_seconds = timed(daily_update)
+        result.daily_update_first_seconds = round(first_seconds, 3)
+        result.daily_update_second_seconds = round(second_seconds, 3)
+        if first is None or second is None:
+            logging.warning(f"Daily update failed for {routes} routes x {days} days")
+
+    with get_pool(db_path).connection() as conn:
+        route_ids = [row[0] for row in conn.execute("SELECT id FROM routes ORDER BY id")]
+    rng = np.random.default_rng(seed)
+    enhanced_backend_server.response_cache.invalidate()
+    for name, app in APPS.items():
+        app.config['DATABASE'] = db_path
+    clients = {name: app.test_client() for name, app in APPS.items()}
+    for case in endpoint_cases():
+        measured = measure(clients[case.app], case, route_ids, requests, rng)
+        measured.sqlite_history = not (case.reads_actuals and target == 'cube')
+        result.endpoints.append(measured)
+
+    get_pool(db_path).close_all()
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(route_counts: Sequence[int], history_days: Sequence[int],
+                  requests: int = DEFAULT_REQUESTS, seed: int = DEFAULT_SEED, target: str = 'auto',
+                  daily_update: bool = True, keep: bool = False) -> dict:
+    """Every route count x history length; returns the JSON report"""
+    workdir = tempfile.mkdtemp(prefix='transport_bench_')
+    results = []
+    try:
+        for routes in route_counts:
+            for days in history_days:
+                results.append(run_config(routes, days, requests, seed, target, workdir, daily_update))
+    finally:
+        if keep:
+            logging.info(f"Benchmark databases kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'requests_per_endpoint': requests,
+        'seed': seed,
+        'results': [asdict(result) for result in results]
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """p95 latencies and daily update times more than tolerance slower than the baseline"""
+    def keyed(data: dict) -> Dict[tuple, float]:
+        values = {}
+        for result in data['results']:
+            config = (result['routes'], result['days'])
+            for name in ('daily_update_first_seconds', 'daily_update_second_seconds'):
+                if result.get(name) is not None:
+                    values[config + (name,)] = (result[name], result[name] * 1000)
+            for endpoint in result['endpoints']:
+                p95 = endpoint['p95_ms']
+                values[config + (endpoint['app'], endpoint['method'], endpoint['endpoint'])] = (p95, p95)
+        return values
+
+    old, new = keyed(baseline), keyed(report)
+    regressions = []
+    for key in sorted(set(old) & set(new), key=str):
+        (before, before_ms), (after, after_ms) = old[key], new[key]
+        if before_ms > 0 and after_ms > before_ms * (1 + tolerance) and after_ms - before_ms > NOISE_FLOOR_MS:
+            regressions.append(f"{key[0]} routes x {key[1]} days {' '.join(key[2:])}: {before:g} -> {after:g}")
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for result in report['results']:
+        update = ''
+        if result['daily_update_first_seconds'] is not None:
+            update = (f", daily update {result['daily_update_first_seconds']:.2f}s first / "
+                      f"{result['daily_update_second_seconds']:.2f}s second")
+        lines.append(f"{result['routes']} routes x {result['days']} days ({result['target']}): "
+                     f"generated in {result['generate_seconds']:.2f}s{update}")
+        lines.append(f"  {'endpoint':<36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>6}")
+        for e in result['endpoints']:
+            name = f"{e['app']} {e['method']} {e['endpoint']}"
+            lines.append(f"  {name:<36} {e['p50_ms']:>9.2f} {e['p95_ms']:>9.2f} {e['p99_ms']:>9.2f} "
+                         f"{e['throughput_rps']:>9.1f} {e['errors']:>6}"
+                         f"{'' if e.get('sqlite_history', True) else '  (no SQLite history)'}")
+    return '\n'.join(lines)
+
+
+def _counts(text: str) -> List[int]:
+    return [int(value) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API servers on generated databases')
+    parser.add_argument('--routes', type=_counts, default=list(DEFAULT_ROUTE_COUNTS),
+                        help='comma-separated route counts (default: 3,100,1000,5000)')
+    parser.add_argument('--days', type=_counts, default=list(DEFAULT_HISTORY_DAYS),
+                        help='comma-separated history lengths in days (default: 30,365,1095)')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='timed requests per endpoint')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--target', choices=('auto', 'sqlite', 'cube'), default='auto',
+                        help='where generated history goes (auto: by size)')
+    parser.add_argument('--skip-daily-update', action='store_true', help='do not time run_daily_update')
+    parser.add_argument('--output', help='write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', help='earlier JSON report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown against the baseline (0.2 = 20%%)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated databases')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.requests < 1 or not args.routes or not args.days or min(args.routes + args.days) < 1:
+        parser.error('route counts, history lengths and requests must be positive')
+
+    report = run_benchmark(args.routes, args.days, args.requests, args.seed, args.target,
+                           not args.skip_daily_update, args.keep)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(format_report(report))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression: {line}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Tamil Nadu Transport Optimizer - Bulk Writer
+Chunked executemany writes for predictions, history and generated data
+
+Rows are accepted as lists or lazy iterators and written with executemany
+in fixed-size chunks, each chunk in its own transaction (or all of them in
+one transaction when the write must be atomic). Large backfills can relax
+the sync pragmas for the duration of the load. Each write is logged at
+DEBUG; callers that write in a loop log one summary of the returned stats.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+@dataclass
+class BulkWriteStats:
+    table: str
+    rows: int
+    chunks: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+
+def _target_table(sql: str) -> str:
+    """Table name from an INSERT/REPLACE statement, for reporting"""
+    match = re.search(r'\bINTO\s+(\w+)', sql, re.IGNORECASE)
+    return match.group(1) if match else '?'
+
+
+class BulkWriter:
+    """Writes row batches through one connection using chunked executemany"""
+
+    def __init__(self, conn: sqlite3.Connection, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.conn = conn
+        self.chunk_size = chunk_size
+
+    def _chunks(self, rows: Iterable[tuple]) -> Iterator[list]:
+        iterator = iter(rows)
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def write(self, sql: str, rows: Iterable[tuple],
+              single_transaction: bool = False) -> BulkWriteStats:
+        """Insert all rows; commit per chunk unless single_transaction is set
+
+        With single_transaction the rows join the caller's open transaction
+        and nothing is committed here, so the write is all-or-nothing.
+        """
+        table = _target_table(sql)
+        started = time.perf_counter()
+        total = 0
+        chunks = 0
+
+        for chunk in self._chunks(rows):
+            try:
+                self.conn.executemany(sql, chunk)
+                if not single_transaction:
+                    self.conn.commit()
+            except Exception:
+                if not single_transaction:
+                    self.conn.rollback()
+                raise
+            total += len(chunk)
+            chunks += 1
+
+        stats = BulkWriteStats(table, total, chunks, time.perf_counter() - started)
+        logging.debug(f"Bulk wrote {stats.rows} rows to {table} in {stats.seconds:.3f}s "
+                     f"({stats.rows_per_second:,.0f} rows/s)")
+        return stats
+
+    @contextmanager
+    def relaxed_sync(self):
+        """Temporarily disable fsyncs and enlarge the cache for a backfill
+
+        A crash during the load can lose the backfilled rows (the database
+        itself stays consistent), so only use this for data that can be
+        regenerated.
+        """
+        if self.conn.in_transaction:
+            self.conn.commit()
+        synchronous = self.conn.execute("PRAGMA synchronous").fetchone()[0]
+        cache_size = self.conn.execute("PRAGMA cache_size").fetchone()[0]
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+        try:
+            yield self
+            if self.conn.in_transaction:
+                self.conn.commit()
+        except Exception:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            raise
+        finally:
+            self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+            self.conn.execute(f"PRAGMA cache_size = {cache_size}")
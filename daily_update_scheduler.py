@@ -8,16 +8,43 @@ Date: August 30, 2025
 """
 
 import requests
-import sqlite3
 import json
 import schedule
 import time
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import random
 import math
 import logging
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+import data_versions
+import demand_rollup
+import forecast_accuracy
+import metrics
+from bulk_writer import BulkWriter
+from db_pool import DB_PATH, close_pools, get_pool
+from demand_cube import open_cube
+from depot_allocation import allocate_forecasts
+from festival_calendar import TAMIL_NADU_FESTIVALS
+from forecast_engine import Forecast, ForecastEngine, MARKET_MULTIPLIER
+from forecast_horizon import MAX_HORIZON_DAYS, HorizonForecaster, record_daily_inputs
+from profiling import DEFAULT_SLOW_STAGE_SECONDS, StageProfiler
+from route_registry import Route, get_registry
+from schedule_optimizer import optimize_forecasts
+from smoothing_model import SmoothingForecaster
+from timetable import TimetableResult, generate_timetables
+
+# Routes per task handed to a worker process in parallel mode
+DEFAULT_CHUNK_SIZE = 25
+
+# How far back actuals ingestion catches up after downtime
+MAX_CATCHUP_DAYS = 7
 
 # Configure logging
 logging.basicConfig(
@@ -45,50 +72,115 @@ class FestivalData:
     impact_multiplier: float
     type: str  # major, regional, national
 
+@dataclass
+class RouteTiming:
+    route_id: str
+    seconds: float
+    cells: int = 0
+    error: Optional[str] = None
+    cpu_seconds: float = 0.0
+
+@dataclass
+class DailyUpdateReport:
+    date: str
+    workers: int
+    chunk_size: int
+    seconds: float = 0.0
+    routes: List[RouteTiming] = field(default_factory=list)
+
+    @property
+    def failed(self) -> List[RouteTiming]:
+        return [timing for timing in self.routes if timing.error]
+
+    @property
+    def succeeded(self) -> List[RouteTiming]:
+        return [timing for timing in self.routes if not timing.error]
+
+    def to_dict(self) -> dict:
+        return {
+            'date': self.date,
+            'workers': self.workers,
+            'chunk_size': self.chunk_size,
+            'seconds': round(self.seconds, 3),
+            'routes_succeeded': len(self.succeeded),
+            'routes_failed': len(self.failed),
+            'routes': [asdict(timing) for timing in self.routes]
+        }
+
+@dataclass
+class RouteChunkTask:
+    """Inputs a worker needs to forecast one shard of routes for one day"""
+    routes: List[Route]
+    target_date: date
+    weather_factor: float
+    festival_multiplier: float
+    market_multiplier: float
+    seed: int
+    baselines: Optional[np.ndarray] = None  # Model baseline per [route, hour]
+
+def forecast_route_chunk(task: RouteChunkTask) -> List[Tuple[RouteTiming, Optional[Forecast]]]:
+    """Forecast each route of a shard independently (runs in a worker process)
+
+    Errors are caught per route so one bad route only drops its own rows.
+    """
+    rng = np.random.default_rng(task.seed)
+    results = []
+    for i, route in enumerate(task.routes):
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            engine = ForecastEngine([route.id], [route.weekday_profile], [route.weekend_profile],
+                                    [route.distance], {route.id: route.market_days}, {},
+                                    market_multiplier=task.market_multiplier)
+            if task.baselines is None:
+                forecast = engine.forecast([task.target_date], [task.weather_factor],
+                                           [task.festival_multiplier], rng=rng)
+            else:
+                forecast = engine.forecast([task.target_date], [task.weather_factor],
+                                           [task.festival_multiplier],
+                                           base=task.baselines[i][None, None, :],
+                                           market_factors=np.ones((1, 1)),
+                                           variation=np.ones((1, 1, 24)))
+            timing = RouteTiming(route.id, time.perf_counter() - started, forecast.demand.size,
+                                 cpu_seconds=time.thread_time() - cpu_started)
+            results.append((timing, forecast))
+        except Exception as e:
+            timing = RouteTiming(route.id, time.perf_counter() - started,
+                                 error=f"{type(e).__name__}: {e}", cpu_seconds=time.thread_time() - cpu_started)
+            results.append((timing, None))
+    return results
+
 class TransportDataUpdater:
     
-    def __init__(self, db_path='transport_optimizer.db'):
+    def __init__(self, db_path=DB_PATH, use_smoothing_model: bool = True,
+                 depot_fleet: Optional[int] = None, profile_path: Optional[str] = None,
+                 slow_stage_seconds: float = DEFAULT_SLOW_STAGE_SECONDS, pipeline: str = 'scheduler'):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
         self.api_base_url = 'http://localhost:5000/api'
         
         # Tamil Nadu Festival Calendar
-        self.festivals = {
-            '2025-09-01': {'name': 'Vinayaka Chaturthi', 'multiplier': 1.6, 'type': 'major'},
-            '2025-09-17': {'name': 'Onam', 'multiplier': 1.4, 'type': 'regional'},
-            '2025-10-02': {'name': 'Gandhi Jayanti', 'multiplier': 1.3, 'type': 'national'},
-            '2025-10-12': {'name': 'Vijaya Dashami', 'multiplier': 1.7, 'type': 'major'},
-            '2025-11-01': {'name': 'Diwali', 'multiplier': 1.8, 'type': 'major'},
-            '2025-11-15': {'name': 'Karthikai Deepam', 'multiplier': 1.5, 'type': 'regional'},
-            '2025-12-25': {'name': 'Christmas', 'multiplier': 1.4, 'type': 'national'},
-            '2026-01-14': {'name': 'Thai Pusam', 'multiplier': 1.6, 'type': 'regional'},
-            '2026-01-26': {'name': 'Republic Day', 'multiplier': 1.3, 'type': 'national'},
-            '2026-02-16': {'name': 'Maha Shivratri', 'multiplier': 1.5, 'type': 'major'},
-            '2026-03-14': {'name': 'Holi', 'multiplier': 1.4, 'type': 'national'},
-            '2026-04-14': {'name': 'Tamil New Year', 'multiplier': 1.7, 'type': 'regional'},
-        }
+        self.festivals = TAMIL_NADU_FESTIVALS
         
-        # Market days for each route
-        self.market_days = {
-            'tp_pc': [1, 4],  # Tuesday, Friday
-            'tp_cb': [0, 2, 5],  # Monday, Wednesday, Saturday
-            'tp_sl': [2, 5]   # Wednesday, Saturday
-        }
+        # Routes, distances, demand profiles and market days
+        self.registry = get_registry(db_path)
         
-        # Base demand patterns
-        self.base_patterns = {
-            'tp_pc': {
-                'weekday': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
-                'weekend': [25, 18, 12, 8, 15, 35, 85, 200, 180, 120, 100, 90, 80, 70, 65, 55, 130, 250, 200, 140, 85, 55, 35, 28]
-            },
-            'tp_cb': {
-                'weekday': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
-                'weekend': [35, 25, 18, 15, 22, 55, 120, 350, 280, 180, 150, 130, 115, 105, 95, 80, 200, 380, 320, 220, 135, 90, 55, 42]
-            },
-            'tp_sl': {
-                'weekday': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55],
-                'weekend': [28, 22, 16, 12, 20, 45, 105, 260, 220, 150, 125, 110, 95, 85, 75, 65, 170, 300, 240, 175, 110, 75, 45, 35]
-            }
-        }
+        # Memory-mapped copy of passenger_demand for analytical reads
+        self.cube = open_cube(db_path)
+        
+        # Learned per-route baseline; falls back to the calendar profiles when off
+        self.use_smoothing_model = use_smoothing_model
+        self.model = SmoothingForecaster(self.registry, cube=self.cube)
+        
+        # Buses available across all routes in any hour (None: route fleets only)
+        self.depot_fleet = depot_fleet
+        
+        # Stage and route timings; profile_path also captures a cProfile of each run
+        self.profiler = StageProfiler(pipeline, slow_stage_seconds, profile_path)
+
+    @property
+    def engine(self) -> ForecastEngine:
+        """Vectorized forecaster over all registered routes"""
+        return self.registry.forecast_engine(self.festivals)
 
     def get_weather_data_free_api(self) -> WeatherData:
         """Get weather data - currently simulated, can integrate with real APIs"""
@@ -187,129 +279,306 @@ class TransportDataUpdater:
 
     def is_market_day(self, route_id: str, day_of_week: int) -> bool:
         """Check if it's a market day for the route"""
-        return day_of_week in self.market_days.get(route_id, [])
+        route = self.registry.get(route_id)
+        return route is not None and day_of_week in route.market_days
 
     def calculate_base_demand(self, route_id: str, hour: int, day_of_week: int) -> int:
         """Get base demand for route, hour, and day"""
-        pattern_key = 'weekday' if day_of_week < 5 else 'weekend'
-        return self.base_patterns[route_id][pattern_key][hour]
+        return self.registry.get(route_id).profile(day_of_week)[hour]
 
-    def update_current_day_actual(self):
-        """Update actual passenger data for current day"""
-        today = date.today()
-        current_hour = datetime.now().hour
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_watermarks(self, conn) -> Dict[str, datetime]:
+        """Last ingested actual hour for each route"""
+        return {route_id: datetime.strptime(last_date, '%Y-%m-%d') + timedelta(hours=last_hour)
+                for route_id, last_date, last_hour in conn.execute("""
+                SELECT route_id, last_date, last_hour FROM ingestion_watermarks
+                """)}
+
+    def update_current_day_actual(self, now: Optional[datetime] = None,
+                                  max_catchup_days: int = MAX_CATCHUP_DAYS) -> int:
+        """Ingest actual passenger data for the hours since each route's watermark
         
-        routes = ['tp_pc', 'tp_cb', 'tp_sl']
+        Only hours after the route's last ingested hour up to the current hour
+        are written, so the job can run every few minutes. After downtime it
+        catches up on missed hours, at most max_catchup_days back. New routes
+        start at midnight today. Returns the number of rows written.
+        """
+        now = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        midnight = now.replace(hour=0)
+        earliest = midnight - timedelta(days=max_catchup_days)
         
-        for route_id in routes:
-            for hour in range(min(current_hour + 1, 24)):
-                base_demand = self.calculate_base_demand(route_id, hour, today.weekday())
-                actual_demand = int(base_demand * random.uniform(0.7, 1.3))
-                actual_demand = max(0, actual_demand)
-                
-                cursor.execute("""
+        with self.pool.connection() as conn:
+            watermarks = self.get_watermarks(conn)
+            
+            rows = []
+            marks = []
+            with self.profiler.stage('generate'):
+                for route in self.registry:
+                    if route.id in watermarks:
+                        slot = max(watermarks[route.id] + timedelta(hours=1), earliest)
+                    else:
+                        slot = midnight
+                    if slot > now:
+                        continue
+                    
+                    while slot <= now:
+                        day = slot.date()
+                        profile = route.profile(day.weekday())
+                        actual_demand = int(profile[slot.hour] * random.uniform(0.7, 1.3))
+                        actual_demand = max(0, actual_demand)
+                        rows.append((route.id, slot.hour, day.weekday(), actual_demand, day,
+                                     False, 1.0, 1.0, 1.0, 1.0))
+                        slot += timedelta(hours=1)
+                    marks.append((route.id, now.date(), now.hour))
+            
+            # Rows and watermarks commit together, so a failed run is retried in full
+            with self.profiler.stage('write'):
+                BulkWriter(conn).write("""
                 INSERT OR REPLACE INTO passenger_demand
                 (route_id, hour, day_of_week, passenger_count, date_recorded, 
                  is_predicted, weather_factor, festival_factor, market_factor, confidence_score)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, hour, today.weekday(), actual_demand, today,
-                      False, 1.0, 1.0, 1.0, 1.0))
+                """, rows, single_transaction=True)
+                conn.executemany("""
+                INSERT INTO ingestion_watermarks (route_id, last_date, last_hour, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(route_id) DO UPDATE SET
+                    last_date = excluded.last_date,
+                    last_hour = excluded.last_hour,
+                    updated_at = excluded.updated_at
+                """, marks)
+                if rows:
+                    data_versions.bump_version(conn, data_versions.ACTUALS)
+            with self.profiler.stage('rollups'):
+                demand_rollup.sync(conn)
+                forecast_accuracy.sync(conn)
+        
+        # The cube only mirrors committed rows, so the model reads them afterwards
+        self.sync_cube()
+        with self.profiler.stage('model_update'), self.pool.connection() as conn:
+            self.model.update(conn, route_timer=self.profiler.route)
         
-        conn.commit()
-        conn.close()
-        logging.info(f"Updated actual data for {today}")
+        logging.info(f"Ingested {len(rows)} actual hours for {len(marks)} routes up to "
+                     f"{now.strftime('%Y-%m-%d %H:00')}")
+        return len(rows)
 
-    def predict_tomorrow_demand(self):
-        """Generate predictions for tomorrow"""
+    def sync_cube(self) -> int:
+        """Append newly committed passenger_demand rows to the demand cube"""
+        with self.profiler.stage('cube_sync'), self.pool.connection() as conn:
+            return self.cube.sync(conn)
+
+    def get_tomorrow_factors(self) -> Tuple[date, WeatherData, FestivalData]:
+        """Weather forecast and festival data for tomorrow"""
         tomorrow = date.today() + timedelta(days=1)
-        tomorrow_weekday = tomorrow.weekday()
-        
-        weather_data = self.get_weather_data_free_api()
-        festival_data = self.get_festival_data(tomorrow)
+        with self.profiler.stage('weather'):
+            weather_data = self.get_weather_data_free_api()
+        with self.profiler.stage('festival'):
+            festival_data = self.get_festival_data(tomorrow)
         
         logging.info(f"Weather forecast: {weather_data.condition}, {weather_data.temperature:.1f}°C")
         if festival_data.is_festival:
             logging.info(f"Festival tomorrow: {festival_data.name} (impact: {festival_data.impact_multiplier}x)")
+        return tomorrow, weather_data, festival_data
+
+    def store_predictions(self, tomorrow: date, weather_data: WeatherData,
+                          festival_data: FestivalData, forecasts: Iterable[Forecast]) -> List[TimetableResult]:
+        """Persist external factors, forecasts and the day's timetables in one transaction"""
+        confidence = 0.8 if not festival_data.is_festival else 0.6
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Store external factors
-        cursor.execute("""
-        INSERT OR REPLACE INTO external_factors 
-        (date_recorded, weather_condition, temperature, rainfall, humidity, 
-         is_festival, festival_name, festival_impact, day_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (tomorrow, weather_data.condition, weather_data.temperature,
-              weather_data.rainfall, weather_data.humidity, festival_data.is_festival,
-              festival_data.name, festival_data.impact_multiplier,
-              'festival' if festival_data.is_festival else ('weekend' if tomorrow_weekday >= 5 else 'weekday')))
-        
-        routes = ['tp_pc', 'tp_cb', 'tp_sl']
-        
-        for route_id in routes:
-            is_market = self.is_market_day(route_id, tomorrow_weekday)
-            market_factor = 1.3 if is_market else 1.0
-            
-            if is_market:
-                logging.info(f"Market day tomorrow for {route_id}")
-            
-            for hour in range(24):
-                base_demand = self.calculate_base_demand(route_id, hour, tomorrow_weekday)
-                
-                # Apply all factors
-                predicted_demand = base_demand
-                predicted_demand = int(predicted_demand * weather_data.weather_factor)
-                predicted_demand = int(predicted_demand * festival_data.impact_multiplier)
-                predicted_demand = int(predicted_demand * market_factor)
-                
-                # Add natural variation
-                variation = random.uniform(0.85, 1.15)
-                predicted_demand = int(predicted_demand * variation)
-                predicted_demand = max(0, predicted_demand)
-                
-                # Calculate optimal schedule
-                buses_needed, frequency = self.calculate_optimal_schedule(predicted_demand)
-                cost_per_hour = self.calculate_hourly_cost(buses_needed, self.get_route_distance(route_id), frequency)
-                utilization_rate = min(predicted_demand / (buses_needed * 45), 1.0) if buses_needed > 0 else 0
-                
-                # Store prediction
-                cursor.execute("""
+        with self.profiler.stage('write'), self.pool.connection() as conn:
+            cursor = conn.cursor()
+        
+            # Store external factors
+            cursor.execute("""
+            INSERT OR REPLACE INTO external_factors 
+            (date_recorded, weather_condition, temperature, rainfall, humidity, 
+             is_festival, festival_name, festival_impact, day_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (tomorrow, weather_data.condition, weather_data.temperature,
+                  weather_data.rainfall, weather_data.humidity, festival_data.is_festival,
+                  festival_data.name, festival_data.impact_multiplier,
+                  'festival' if festival_data.is_festival else ('weekend' if tomorrow.weekday() >= 5 else 'weekday')))
+        
+            # Store predictions and the passenger_demand tracking rows atomically
+            writer = BulkWriter(conn)
+            written = []
+            for forecast in forecasts:
+                written.append(writer.write("""
                 INSERT OR REPLACE INTO daily_schedule_predictions
                 (route_id, prediction_date, hour, predicted_passengers, recommended_buses, 
                  frequency_minutes, cost_per_hour, utilization_rate)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, tomorrow, hour, predicted_demand, buses_needed,
-                      frequency, cost_per_hour, utilization_rate))
-                
-                # Store in passenger_demand for tracking
-                confidence = 0.8 if not festival_data.is_festival else 0.6
-                
-                cursor.execute("""
+                """, forecast.schedule_rows(), single_transaction=True))
+            
+                written.append(writer.write("""
                 INSERT OR REPLACE INTO passenger_demand
                 (route_id, hour, day_of_week, passenger_count, date_recorded, 
                  is_predicted, weather_factor, festival_factor, market_factor, confidence_score)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, hour, tomorrow_weekday, predicted_demand, tomorrow, True,
-                      weather_data.weather_factor, festival_data.impact_multiplier,
-                      market_factor, confidence))
-        
-        conn.commit()
-        conn.close()
+                """, forecast.demand_rows([confidence]), single_transaction=True))
+            
+                record_daily_inputs(conn, forecast.route_ids, tomorrow,
+                                    weather_data.weather_factor, festival_data.impact_multiplier)
+            
+            # Tells the API servers' response caches that predictions changed
+            data_versions.bump_version(conn, data_versions.PREDICTIONS)
+            
+            # Trips for the new predictions, so readers never see one without the other
+            timetables = generate_timetables(conn, self.registry, tomorrow)
         
-        logging.info(f"Generated predictions for {tomorrow}")
+        logging.info(f"Stored predictions for {tomorrow}: {sum(stats.rows for stats in written)} rows "
+                     f"in {sum(stats.seconds for stats in written):.3f}s")
+        self.sync_cube()
+        return timetables
+
+    def prediction_summary(self, tomorrow: date, weather_data: WeatherData,
+                           festival_data: FestivalData, timetables: List[TimetableResult]) -> dict:
         return {
             'date': tomorrow.strftime('%Y-%m-%d'),
             'weather_factor': weather_data.weather_factor,
             'festival': festival_data.name if festival_data.is_festival else None,
-            'festival_impact': festival_data.impact_multiplier
+            'festival_impact': festival_data.impact_multiplier,
+            'timetable': {'trips': sum(len(t.trips) for t in timetables),
+                          'vehicles': sum(t.vehicles for t in timetables),
+                          'extra_vehicles': sum(t.extra_vehicles for t in timetables)}
+        }
+
+    def model_baseline(self, dates: List[date]) -> np.ndarray:
+        """Smoothing model forecast per [day, route, hour], brought up to date first"""
+        with self.profiler.stage('model_baseline'):
+            self.sync_cube()
+            with self.pool.connection() as conn:
+                self.model.update(conn, route_timer=self.profiler.route)
+                # Rounded so a model seeded from the profiles reproduces them exactly
+                return np.round(self.model.base_demand(conn, dates, self.engine.route_ids), 6)
+
+    def forecast_options(self, dates: List[date]) -> dict:
+        """Extra ForecastEngine.forecast arguments for the configured baseline
+        
+        The smoothing model's hour-of-week seasonality already covers the
+        weekly market days, and its forecast is an expectation, so neither
+        the market calendar nor random variation is applied on top.
+        """
+        if not self.use_smoothing_model:
+            return {}
+        shape = (len(dates), len(self.engine.route_ids))
+        return {
+            'base': self.model_baseline(dates),
+            'market_factors': np.ones(shape),
+            'variation': np.ones(shape + (24,))
         }
 
+    def plan_schedules(self, forecasts: List[Forecast]) -> List[Forecast]:
+        """Optimized buses and headways; routes of a depot share its fleet"""
+        forecasts = optimize_forecasts(forecasts, self.registry, self.depot_fleet)
+        return allocate_forecasts(forecasts, self.registry, self.depot_fleet)
+
+    def predict_tomorrow_demand(self):
+        """Generate predictions for tomorrow"""
+        tomorrow, weather_data, festival_data = self.get_tomorrow_factors()
+        
+        for route_id, market_factor in zip(self.engine.route_ids, self.engine.market_factors([tomorrow])[0]):
+            if market_factor > 1.0:
+                logging.info(f"Market day tomorrow for {route_id}")
+        
+        options = self.forecast_options([tomorrow])
+        with self.profiler.stage('forecast'):
+            forecast = self.engine.forecast([tomorrow], [weather_data.weather_factor],
+                                            [festival_data.impact_multiplier], **options)
+        with self.profiler.stage('schedule'):
+            forecast, = self.plan_schedules([forecast])
+        
+        with self.profiler.stage('store'):
+            timetables = self.store_predictions(tomorrow, weather_data, festival_data, [forecast])
+        
+        logging.info(f"Generated predictions for {tomorrow}")
+        return self.prediction_summary(tomorrow, weather_data, festival_data, timetables)
+
+    def predict_tomorrow_demand_parallel(self, workers: Optional[int] = None,
+                                         chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                         seed: Optional[int] = None) -> Tuple[dict, DailyUpdateReport]:
+        """Generate tomorrow's predictions with routes sharded across worker processes
+        
+        Workers only compute forecasts; this process is the single writer and
+        stores every successful route in one transaction. Failed routes are
+        listed in the report and keep their previous predictions.
+        """
+        started = time.perf_counter()
+        tomorrow, weather_data, festival_data = self.get_tomorrow_factors()
+        workers = workers or os.cpu_count() or 1
+        report = DailyUpdateReport(tomorrow.strftime('%Y-%m-%d'), workers, chunk_size)
+        
+        routes = list(self.registry)
+        baselines = None
+        if self.use_smoothing_model:
+            baselines = self.model_baseline([tomorrow])[0]
+        
+        tasks = []
+        seeds = np.random.SeedSequence(seed).generate_state(max(1, -(-len(routes) // chunk_size)))
+        for shard_seed, i in zip(seeds, range(0, len(routes), chunk_size)):
+            tasks.append(RouteChunkTask(
+                routes[i:i + chunk_size], tomorrow, weather_data.weather_factor,
+                festival_data.impact_multiplier, MARKET_MULTIPLIER, int(shard_seed),
+                baselines[i:i + chunk_size] if baselines is not None else None
+            ))
+        
+        forecasts = []
+        with self.profiler.stage('route_forecasts'), ProcessPoolExecutor(
+                max_workers=workers, initializer=close_pools) as executor:
+            futures = {executor.submit(forecast_route_chunk, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # The worker itself died; every route of the shard failed
+                    results = [(RouteTiming(route.id, 0.0, error=f"{type(e).__name__}: {e}"), None)
+                               for route in futures[future].routes]
+                for timing, forecast in results:
+                    report.routes.append(timing)
+                    self.profiler.add_route(timing.route_id, timing.seconds, timing.cpu_seconds)
+                    if forecast is not None:
+                        forecasts.append(forecast)
+                    else:
+                        logging.error(f"Prediction failed for route {timing.route_id}: {timing.error}")
+        
+        report.routes.sort(key=lambda timing: timing.route_id)
+        # Shards are scheduled together so depot fleet limits see every route
+        with self.profiler.stage('schedule'):
+            forecasts = self.plan_schedules(forecasts)
+        with self.profiler.stage('store'):
+            timetables = self.store_predictions(tomorrow, weather_data, festival_data, forecasts)
+        report.seconds = time.perf_counter() - started
+        
+        logging.info(f"Generated predictions for {tomorrow}: {len(report.succeeded)} routes, "
+                     f"{len(report.failed)} failed, {workers} workers, {report.seconds:.2f}s")
+        return self.prediction_summary(tomorrow, weather_data, festival_data, timetables), report
+
+    def forecast_horizon(self, days: int):
+        """Refresh the multi-day forecast, regenerating only days whose inputs changed
+        
+        Tomorrow keeps the daily update's weather-aware prediction.
+        """
+        with self.pool.connection() as conn:
+            result = HorizonForecaster(self.registry, self.festivals,
+                                       depot_fleet=self.depot_fleet).refresh(conn, days)
+        self.sync_cube()
+        return result
+
+    def predict_cell_demand(self, route_id: str, hour: int, target_date: date,
+                            weather_factor: float, festival_multiplier: float,
+                            variation: float) -> int:
+        """Per-cell reference for the forecast engine's demand calculation"""
+        day_of_week = target_date.weekday()
+        market_factor = 1.3 if self.is_market_day(route_id, day_of_week) else 1.0
+        
+        predicted_demand = self.calculate_base_demand(route_id, hour, day_of_week)
+        predicted_demand = int(predicted_demand * weather_factor)
+        predicted_demand = int(predicted_demand * festival_multiplier)
+        predicted_demand = int(predicted_demand * market_factor)
+        predicted_demand = int(predicted_demand * variation)
+        return max(0, predicted_demand)
+
     def calculate_optimal_schedule(self, demand: int) -> Tuple[int, int]:
-        """Calculate optimal buses and frequency"""
+        """Threshold ladder the schedule optimizer replaced (kept as the backtest baseline)"""
         if demand == 0:
             return 0, 120
         elif demand <= 20:
@@ -333,8 +602,7 @@ class TransportDataUpdater:
 
     def get_route_distance(self, route_id: str) -> int:
         """Get route distance"""
-        distances = {'tp_pc': 85, 'tp_cb': 65, 'tp_sl': 113}
-        return distances.get(route_id, 85)
+        return self.registry.distance(route_id)
 
     def calculate_hourly_cost(self, buses: int, distance: int, frequency: int) -> float:
         """Calculate operational cost per hour"""
@@ -352,26 +620,87 @@ class TransportDataUpdater:
         
         return fuel_cost + driver_cost + maintenance_cost
 
-    def run_daily_update(self):
-        """Main daily update routine"""
+    def run_daily_update(self, parallel: bool = False, workers: Optional[int] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, horizon_days: int = 0):
+        """Main daily update routine
+        
+        With parallel set, route forecasts are computed in a process pool and
+        the result includes a per-route timing report. With horizon_days, the
+        days after tomorrow are forecast too, up to that many days ahead.
+        Stage and route timings are logged as JSON and returned under 'profile'.
+        """
         try:
-            logging.info("Starting daily update process...")
-            self.update_current_day_actual()
-            prediction_data = self.predict_tomorrow_demand()
+            with self.profiler.run() as profile:
+                logging.info("Starting daily update process...")
+                with self.profiler.stage('actuals'):
+                    self.update_current_day_actual()
+                with self.profiler.stage('predictions'):
+                    if parallel:
+                        prediction_data, report = self.predict_tomorrow_demand_parallel(workers, chunk_size)
+                        prediction_data['report'] = report.to_dict()
+                    else:
+                        prediction_data = self.predict_tomorrow_demand()
+                if horizon_days > 1:
+                    with self.profiler.stage('horizon'):
+                        horizon = self.forecast_horizon(horizon_days)
+                    prediction_data['horizon'] = {'days': horizon.days, 'regenerated': horizon.regenerated,
+                                                  'unchanged': horizon.unchanged}
+            prediction_data['profile'] = profile.to_dict()
             logging.info("Daily update process completed successfully")
             return prediction_data
         except Exception as e:
             logging.error(f"Daily update failed: {e}")
             return None
 
+def run_scheduler(updater: TransportDataUpdater, actuals_every: int = 5,
+                  daily_at: str = '23:00', **update_options):
+    """Ingest actuals every few minutes and run the full update once a day"""
+    schedule.every(actuals_every).minutes.do(updater.update_current_day_actual)
+    schedule.every().day.at(daily_at).do(updater.run_daily_update, **update_options)
+    
+    logging.info(f"Scheduler started: actuals every {actuals_every} min, daily update at {daily_at}")
+    updater.update_current_day_actual()
+    while True:
+        schedule.run_pending()
+        time.sleep(max(1, min(60, schedule.idle_seconds() or 60)))
+
 def main():
-    """Run a single update (for testing)"""
+    """Run a single update (for testing), or keep running on a schedule"""
+    parser = argparse.ArgumentParser(description='Run the daily transport data update')
+    parser.add_argument('--parallel', action='store_true', help='forecast routes in a process pool')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='routes per worker task')
+    parser.add_argument('--horizon', type=int, default=MAX_HORIZON_DAYS,
+                        help='also forecast this many days ahead for GET /api/forecast (0 to skip)')
+    parser.add_argument('--depot-fleet', type=int, default=None,
+                        help='buses available across all routes in any hour')
+    parser.add_argument('--watch', action='store_true', help='keep running: ingest actuals and update daily')
+    parser.add_argument('--actuals-every', type=int, default=5, help='minutes between actuals ingestion')
+    parser.add_argument('--daily-at', default='23:00', help='time of the daily update (HH:MM)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='with --watch, serve Prometheus metrics at /metrics on this port')
+    parser.add_argument('--profile', nargs='?', const='daily_update.prof', default=None, metavar='PATH',
+                        help='capture a cProfile of each daily update to PATH (default: daily_update.prof); '
+                             'worker processes are not included')
+    parser.add_argument('--slow-stage', type=float, default=DEFAULT_SLOW_STAGE_SECONDS, metavar='SECONDS',
+                        help='log a warning for daily update stages slower than this')
+    args = parser.parse_args()
+    
+    updater = TransportDataUpdater(depot_fleet=args.depot_fleet, profile_path=args.profile,
+                                   slow_stage_seconds=args.slow_stage)
+    if args.watch:
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+        run_scheduler(updater, args.actuals_every, args.daily_at,
+                      parallel=args.parallel, workers=args.workers, chunk_size=args.chunk_size,
+                      horizon_days=args.horizon)
+        return
+    
     print("🚌 Tamil Nadu Transport Optimizer - Daily Update Test")
     print(f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')}")
     print("=" * 50)
     
-    updater = TransportDataUpdater()
-    result = updater.run_daily_update()
+    result = updater.run_daily_update(args.parallel, args.workers, args.chunk_size, args.horizon)
     
     if result:
         print("✅ Daily update completed successfully!")
@@ -379,6 +708,29 @@ def main():
         print(f"Weather factor: {result['weather_factor']:.2f}")
         if result.get('festival'):
             print(f"Festival: {result['festival']} (impact: {result['festival_impact']:.1f}x)")
+        if result.get('timetable'):
+            timetable = result['timetable']
+            print(f"Timetable: {timetable['trips']} trips in {timetable['vehicles']} vehicle blocks")
+        if result.get('horizon'):
+            horizon = result['horizon']
+            print(f"Horizon: {horizon['days']} days, {horizon['regenerated']} route-days regenerated, "
+                  f"{horizon['unchanged']} unchanged")
+        if result.get('profile'):
+            profile = result['profile']
+            print(f"Time: {profile['wall_seconds']:.2f}s wall, {profile['cpu_seconds']:.2f}s CPU")
+            for stage in profile['stages']:
+                print(f"  {stage['name']}: {stage['wall_seconds']:.3f}s wall, {stage['cpu_seconds']:.3f}s CPU")
+            for slow in profile['slow_stages']:
+                print(f"  ⚠️  slow stage: {slow}")
+            if profile['profile_path']:
+                print(f"cProfile stats: {profile['profile_path']}")
+        if result.get('report'):
+            report = result['report']
+            print(f"Routes: {report['routes_succeeded']} updated, {report['routes_failed']} failed "
+                  f"({report['workers']} workers, {report['seconds']:.2f}s)")
+            for timing in report['routes']:
+                if timing['error']:
+                    print(f"  ❌ {timing['route_id']}: {timing['error']}")
         print("\nCheck the database for updated predictions.")
     else:
         print("❌ Daily update failed. Check the logs for details.")
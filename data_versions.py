@@ -0,0 +1,37 @@
+"""
+Tamil Nadu Transport Optimizer - Data Version Counters
+Cheap change detection for in-memory caches shared across processes
+
+Each named dataset (routes, predictions, ...) has a counter in the
+data_versions table that writers bump in the same transaction as their
+change. Readers compare the counter against the version they loaded,
+which costs a single primary-key lookup.
+"""
+
+import sqlite3
+from typing import Dict
+
+ROUTES = 'routes'
+PREDICTIONS = 'predictions'
+ACTUALS = 'actuals'                   # ingested actual passenger counts
+SCHEDULES = 'schedules'               # deployed trip timetables in bus_schedules
+DEMAND_REWRITES = 'demand_rewrites'   # deletes and in-place updates of passenger_demand
+
+
+def get_version(conn: sqlite3.Connection, name: str) -> int:
+    """Current version of a dataset (0 if never bumped)"""
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def get_versions(conn: sqlite3.Connection) -> Dict[str, int]:
+    """All dataset versions"""
+    return dict(conn.execute("SELECT name, version FROM data_versions"))
+
+
+def bump_version(conn: sqlite3.Connection, name: str):
+    """Mark a dataset as changed; commits with the caller's transaction"""
+    conn.execute("""
+    INSERT INTO data_versions (name, version) VALUES (?, 1)
+    ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
@@ -0,0 +1,165 @@
+"""
+Tamil Nadu Transport Optimizer - SQLite Connection Pool
+Shared, persistent SQLite connections for the Flask servers and the daily updater
+
+Connections are opened once, switched to WAL journaling so readers keep
+working while the daily update is writing, tuned with performance pragmas
+and kept in a bounded pool. Each connection keeps its own prepared
+statement cache, so repeated queries are not re-parsed on every request,
+and times its statements for the /metrics endpoint.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from metrics import TimedConnection
+from migrations import migrate
+
+DB_PATH = 'transport_optimizer.db'
+
+# Pragmas applied to every pooled connection
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),      # Safe with WAL, avoids an fsync per commit
+    ('cache_size', -16000),         # ~16 MB page cache per connection
+    ('mmap_size', 268435456),       # 256 MB memory-mapped reads
+    ('temp_store', 'MEMORY'),
+)
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_SECONDS = 30.0
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections for one database file"""
+
+    def __init__(self, db_path: str = DB_PATH, max_size: int = POOL_SIZE,
+                 timeout: float = BUSY_TIMEOUT_SECONDS):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _open(self) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=TimedConnection
+        )
+        for pragma, value in CONNECTION_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under the limit"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commit on success, roll back on error"""
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> ConnectionPool:
+    """Get the process-wide pool for a database file, migrating it on first use"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                with pool.connection() as conn:
+                    migrate(conn)
+                _pools[key] = pool
+    return pool
+
+
+def close_pools():
+    """Close all pooled connections (used on shutdown and in forked workers)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+# Flask integration; flask is imported lazily so the scheduler and CLI tools don't need it
+
+def init_app(app, db_path: Optional[str] = None):
+    """Bind a Flask app to the pool and release connections after each request"""
+    app.config.setdefault('DATABASE', db_path or DB_PATH)
+    app.teardown_appcontext(_release_request_connection)
+
+
+def get_db() -> sqlite3.Connection:
+    """Get the pooled connection bound to the current Flask app context"""
+    from flask import current_app, g
+    if 'db_conn' not in g:
+        g.db_pool = get_pool(current_app.config['DATABASE'])
+        g.db_conn = g.db_pool.acquire()
+    return g.db_conn
+
+
+def _release_request_connection(exception=None):
+    """Return the request's connection to its pool"""
+    from flask import g
+    conn = g.pop('db_conn', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.release(conn)
@@ -0,0 +1,396 @@
+"""
+Tamil Nadu Transport Optimizer - Memory-Mapped Demand Cube
+Columnar route x date x hour copy of passenger demand for analytical reads
+
+passenger_demand remains the system of record. Its actual and predicted
+passenger counts are mirrored into two int32 arrays shaped
+[route, day, hour]. The arrays are stored as .npy files in a directory next
+to the database and memory-mapped. A window of days for one route, or for
+the whole network, is then a slice of the mapping instead of a query, and
+repeated reads are served from the page cache. Hours with nothing recorded
+hold MISSING.
+
+sync() appends the rows written since the last sync, found by
+passenger_demand's AUTOINCREMENT id. INSERT OR REPLACE gives the new row a
+new id, so a rewritten hour is picked up as well. Deletes and in-place
+updates bump the demand_rewrites data version instead, and the next sync
+rebuilds the cube from scratch. The arrays grow geometrically along the route
+and day axes. Growth writes new files and then switches meta.json over to
+them, so readers keep a consistent mapping while it happens.
+
+Readers never see the sync's working state. refresh() publishes the dates,
+routes and mappings as one immutable CubeSnapshot, swapped in with a single
+assignment, and every query reads one snapshot from start to end. Only
+writers call sync(); reads take no lock.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+import data_versions
+from db_pool import DB_PATH
+
+CUBE_SUFFIX = '.cube'
+MISSING = -1
+
+ACTUAL = 'actual'
+PREDICTED = 'predicted'
+KINDS = (ACTUAL, PREDICTED)
+
+# Rows fetched from SQLite per batch while syncing, to bound memory
+SYNC_BATCH_ROWS = 200000
+
+MIN_ROUTE_CAPACITY = 8
+MIN_DAY_CAPACITY = 64
+
+
+def cube_path(db_path: str = DB_PATH) -> str:
+    """Directory holding the cube of a database file"""
+    return os.path.abspath(db_path) + CUBE_SUFFIX
+
+
+def _grown(capacity: int, needed: int, minimum: int) -> int:
+    """Capacity for needed entries; grows by at least a quarter to amortize copies"""
+    if needed <= capacity:
+        return capacity
+    return max(needed, capacity + capacity // 4, minimum)
+
+
+@dataclass(frozen=True)
+class CubeSnapshot:
+    """Published state of a cube; replaced, never modified"""
+    start: Optional[date] = None
+    days: int = 0
+    route_ids: Tuple[str, ...] = ()
+    route_index: Dict[str, int] = field(default_factory=dict)
+    arrays: Dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class DemandCube:
+    """Memory-mapped actual and predicted passengers per [route, day, hour]"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.start: Optional[date] = None   # date of day index 0
+        self.days = 0                       # days in use from start
+        self.route_ids: List[str] = []
+        self.last_id = 0                    # newest passenger_demand id mirrored
+        self.rewrites: Optional[int] = None
+        self.generation = 0
+        self._route_index: Dict[str, int] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._mapped = None                 # generation of the read-only mappings
+        self._stamp = None
+        self._snapshot = CubeSnapshot()     # what readers see
+        self._lock = threading.RLock()
+        self.refresh()
+
+    # Files
+
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def _array_file(self, kind: str, generation: int) -> str:
+        return os.path.join(self.path, f"{kind}.{generation}.npy")
+
+    def refresh(self, wait: bool = True):
+        """Pick up a sync made by another process; one stat() when nothing changed
+
+        Without wait, a refresh that would block on a sync running in this
+        process is skipped and the current snapshot stays published.
+        """
+        try:
+            stat = os.stat(self._meta_file())
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        if not self._lock.acquire(blocking=wait):
+            return
+        try:
+            with open(self._meta_file()) as f:
+                meta = json.load(f)
+            self.start = date.fromisoformat(meta['start']) if meta['start'] else None
+            self.days = meta['days']
+            self.route_ids = meta['route_ids']
+            self._route_index = {route_id: r for r, route_id in enumerate(self.route_ids)}
+            self.last_id = meta['last_id']
+            self.rewrites = meta['rewrites']
+            self.generation = meta['generation']
+            if self.generation != self._mapped:
+                self._arrays = {kind: np.load(self._array_file(kind, self.generation), mmap_mode='r')
+                                for kind in KINDS} if self.start else {}
+                self._mapped = self.generation
+            self._snapshot = CubeSnapshot(self.start, self.days, tuple(self.route_ids),
+                                          dict(self._route_index), self._arrays)
+            self._stamp = stamp
+        finally:
+            self._lock.release()
+
+    def snapshot(self) -> CubeSnapshot:
+        """Latest published state, consistent however long the caller holds it"""
+        self.refresh(wait=False)
+        return self._snapshot
+
+    def _save_meta(self):
+        meta = {
+            'start': self.start.isoformat() if self.start else None,
+            'days': self.days,
+            'route_ids': self.route_ids,
+            'last_id': self.last_id,
+            'rewrites': self.rewrites,
+            'generation': self.generation
+        }
+        temporary = self._meta_file() + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._meta_file())
+
+    def _remove_old_files(self):
+        current = {os.path.basename(self._array_file(kind, self.generation)) for kind in KINDS}
+        for name in os.listdir(self.path):
+            if name.endswith('.npy') and name not in current:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass  # Still mapped by a reader on platforms that lock open files
+
+    # Sync
+
+    def _is_current(self, conn: sqlite3.Connection) -> bool:
+        newest = conn.execute("SELECT MAX(id) FROM passenger_demand").fetchone()[0] or 0
+        rewrites = data_versions.get_version(conn, data_versions.DEMAND_REWRITES)
+        return newest == self.last_id and rewrites == self.rewrites
+
+    def sync(self, conn: sqlite3.Connection) -> int:
+        """Mirror rows written since the last sync; returns the rows applied
+
+        Call with no transaction open on conn. The sync holds the database
+        write lock, so only one process appends at a time and only committed
+        rows are mirrored.
+        """
+        with self._lock:
+            self.refresh()
+            if self._is_current(conn):
+                return 0
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.refresh()
+                newest = conn.execute("SELECT MAX(id) FROM passenger_demand").fetchone()[0] or 0
+                rewrites = data_versions.get_version(conn, data_versions.DEMAND_REWRITES)
+                rebuild = rewrites != self.rewrites or newest < self.last_id
+                applied = self._apply(conn, rebuild)
+                self.rewrites = rewrites
+                self._save_meta()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                self._stamp = None  # Forget the half-applied state
+                self.refresh()
+                raise
+            self._remove_old_files()
+            self.refresh()
+        if rebuild:
+            logging.info(f"Demand cube rebuilt: {applied} rows, {len(self.route_ids)} routes, "
+                         f"{self.days} days")
+        return applied
+
+    def rebuild(self, conn: sqlite3.Connection) -> int:
+        """Mirror passenger_demand from scratch"""
+        with self._lock:
+            self.rewrites = None
+            return self.sync(conn)
+
+    def _writable(self) -> Dict[str, np.ndarray]:
+        if self.start is None:
+            return {}
+        return {kind: np.load(self._array_file(kind, self.generation), mmap_mode='r+') for kind in KINDS}
+
+    @contextmanager
+    def bulk_load(self, conn: sqlite3.Connection, route_ids: Sequence[str], first: date, last: date,
+                  predicted: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray, int]]:
+        """Writable [route, day, hour] array for loading history straight into the cube
+
+        Yields the array, the row of each route in it and the day index of
+        first. Values loaded this way are not in passenger_demand, so a
+        rebuild drops them; meant for generated load-test history.
+        """
+        with self._lock:
+            self.sync(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.refresh()
+                os.makedirs(self.path, exist_ok=True)
+                for route_id in route_ids:
+                    self._route_index.setdefault(route_id, len(self._route_index))
+                self.route_ids = list(self._route_index)
+                writable = self._fit(self._writable(), first, last)
+                rows = np.array([self._route_index[route_id] for route_id in route_ids], dtype=np.int64)
+                yield writable[PREDICTED if predicted else ACTUAL], rows, (first - self.start).days
+
+                for array in writable.values():
+                    array.flush()
+                self.days = max(self.days, (last - self.start).days + 1)
+                self._save_meta()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                self._stamp = None
+                self.refresh()
+                raise
+            self._remove_old_files()
+            self.refresh()
+
+    def _apply(self, conn: sqlite3.Connection, rebuild: bool) -> int:
+        os.makedirs(self.path, exist_ok=True)
+        if rebuild:
+            self.start, self.days, self.route_ids, self._route_index, self.last_id = None, 0, [], {}, 0
+            writable = {}
+        else:
+            writable = self._writable()
+
+        applied = 0
+        cursor = conn.execute("""
+        SELECT id, route_id, date_recorded, hour, passenger_count, is_predicted
+        FROM passenger_demand
+        WHERE id > ?
+        ORDER BY id
+        """, (self.last_id,))
+        while True:
+            rows = cursor.fetchmany(SYNC_BATCH_ROWS)
+            if not rows:
+                break
+            ids, route_col, date_col, hours, counts, predicted = zip(*rows)
+            days = np.array(date_col, dtype='datetime64[D]')
+            routes = np.array([self._route_index.setdefault(route_id, len(self._route_index))
+                               for route_id in route_col], dtype=np.int64)
+            self.route_ids = list(self._route_index)
+
+            writable = self._fit(writable, days.min().item(), days.max().item())
+            day_index = (days - np.datetime64(self.start, 'D')).astype(np.int64)
+            hours = np.array(hours, dtype=np.int64)
+            counts = np.array(counts, dtype=np.int32)
+            is_predicted = np.array(predicted, dtype=bool)
+            for kind, mask in ((ACTUAL, ~is_predicted), (PREDICTED, is_predicted)):
+                array = writable[kind]
+                flat = np.ravel_multi_index((routes[mask], day_index[mask], hours[mask]), array.shape)
+                # Rows come in id order, so the last write of a cell wins
+                cells, last = np.unique(flat[::-1], return_index=True)
+                array.reshape(-1)[cells] = counts[mask][::-1][last]
+
+            self.days = max(self.days, int(day_index.max()) + 1)
+            self.last_id = ids[-1]
+            applied += len(rows)
+
+        for array in writable.values():
+            array.flush()
+        if rebuild and not writable:
+            self.generation += 1  # Empty table: readers drop the old arrays
+            self.start = None
+        return applied
+
+    def _fit(self, writable: Dict[str, np.ndarray], first: date, last: date) -> Dict[str, np.ndarray]:
+        """Arrays large enough for every route seen and the dates first..last"""
+        start = first if self.start is None else min(self.start, first)
+        end = max(last, self.start + timedelta(days=self.days - 1)) if self.start else last
+        needed_routes = len(self.route_ids)
+        needed_days = (end - start).days + 1
+
+        if writable and start == self.start:
+            routes, days, _ = writable[ACTUAL].shape
+            if needed_routes <= routes and needed_days <= days:
+                return writable
+
+        old_routes, old_days = writable[ACTUAL].shape[:2] if writable else (0, 0)
+        shape = (_grown(old_routes, needed_routes, MIN_ROUTE_CAPACITY),
+                 _grown(old_days, needed_days, MIN_DAY_CAPACITY), 24)
+        offset = (self.start - start).days if writable else 0
+        self.generation += 1
+        grown = {}
+        for kind in KINDS:
+            array = open_memmap(self._array_file(kind, self.generation), mode='w+',
+                                dtype=np.int32, shape=shape)
+            array[:] = MISSING
+            if writable:
+                # Only the days in use; the spare capacity may not fit after the offset
+                array[:old_routes, offset:offset + self.days] = writable[kind][:, :self.days]
+            grown[kind] = array
+        self.start = start
+        self.days += offset
+        return grown
+
+    # Queries
+
+    def stored_range(self) -> Optional[Tuple[date, date]]:
+        """First and last date in the cube"""
+        snapshot = self.snapshot()
+        if snapshot.start is None or not snapshot.days:
+            return None
+        return snapshot.start, snapshot.start + timedelta(days=snapshot.days - 1)
+
+    def window(self, start: date, end: date, route_ids: Optional[Sequence[str]] = None,
+               predicted: bool = False, snapshot: Optional[CubeSnapshot] = None) -> np.ndarray:
+        """Passengers per [route, day, hour] for start..end inclusive, MISSING where unrecorded
+
+        All routes (in cube order) over dates inside the cube come back as a
+        read-only view of the mapping; anything else is a padded copy.
+        """
+        snapshot = snapshot or self.snapshot()
+        array = snapshot.arrays.get(PREDICTED if predicted else ACTUAL)
+        routes = snapshot.route_ids if route_ids is None else list(route_ids)
+        count = max((end - start).days + 1, 0)
+        if array is None or not count:
+            return np.full((len(routes), count, 24), MISSING, dtype=np.int32)
+
+        first = (start - snapshot.start).days
+        lo, hi = max(first, 0), min(first + count, snapshot.days)
+        if route_ids is None and lo == first and hi == first + count:
+            return array[:len(routes), first:first + count]
+
+        result = np.full((len(routes), count, 24), MISSING, dtype=np.int32)
+        rows = np.array([snapshot.route_index.get(route_id, -1) for route_id in routes], dtype=np.int64)
+        known = np.nonzero(rows >= 0)[0]
+        if hi > lo and len(known):
+            result[known, lo - first:hi - first] = array[rows[known], lo:hi]
+        return result
+
+    def route_window(self, route_id: str, start: date, end: date,
+                     predicted: bool = False) -> np.ndarray:
+        """Passengers per [day, hour] for one route; a view when the dates are in the cube"""
+        snapshot = self.snapshot()
+        array = snapshot.arrays.get(PREDICTED if predicted else ACTUAL)
+        r = snapshot.route_index.get(route_id)
+        if array is not None and r is not None:
+            first = (start - snapshot.start).days
+            last = first + (end - start).days + 1
+            if 0 <= first < last <= snapshot.days:
+                return array[r, first:last]
+        return self.window(start, end, [route_id], predicted, snapshot)[0]
+
+
+_cubes: Dict[str, DemandCube] = {}
+_cubes_lock = threading.Lock()
+
+
+def open_cube(db_path: str = DB_PATH) -> DemandCube:
+    """Get the process-wide cube of a database file"""
+    path = cube_path(db_path)
+    cube = _cubes.get(path)
+    if cube is None:
+        with _cubes_lock:
+            cube = _cubes.get(path)
+            if cube is None:
+                cube = DemandCube(path)
+                _cubes[path] = cube
+    return cube
@@ -0,0 +1,149 @@
+"""
+Tamil Nadu Transport Optimizer - Hourly Demand Rollup
+Running per-route, per-hour totals of actual passenger demand
+
+demand_rollup holds one row per route, hour and date with that day's sum
+and count of actual passengers, plus running totals over all earlier dates
+(overall and weekend-only). The average over any window is then the
+difference of two running totals, so a 7, 28 or 90 day profile costs two
+index seeks per hour regardless of how much history there is.
+
+Triggers on passenger_demand record the earliest changed date per route
+and hour in demand_rollup_dirty; sync() recomputes the running totals from
+that date onwards. Writers of actuals call sync() before committing, so
+readers never take the write lock. The tables and triggers are created by
+migration 6.
+"""
+
+import sqlite3
+from datetime import date, timedelta
+from typing import List, Optional
+
+DAY_TYPES = ('all', 'weekday', 'weekend')
+DEFAULT_WINDOW_DAYS = 7
+
+_EMPTY_TOTALS = (0, 0, 0, 0)
+
+
+def _previous_totals(conn: sqlite3.Connection, route_id: str, hour: int, before: str) -> tuple:
+    """Running totals as of the last date strictly before `before`"""
+    row = conn.execute("""
+    SELECT cum_sum, cum_count, cum_weekend_sum, cum_weekend_count
+    FROM demand_rollup
+    WHERE route_id = ? AND hour = ? AND date_recorded < ?
+    ORDER BY date_recorded DESC LIMIT 1
+    """, (route_id, hour, before)).fetchone()
+    return tuple(row) if row else _EMPTY_TOTALS
+
+
+def rebuild_cell(conn: sqlite3.Connection, route_id: str, hour: int, since: str):
+    """Recompute one route/hour series from `since` onwards"""
+    base_sum, base_count, base_weekend_sum, base_weekend_count = \
+        _previous_totals(conn, route_id, hour, since)
+
+    conn.execute("""
+    DELETE FROM demand_rollup WHERE route_id = ? AND hour = ? AND date_recorded >= ?
+    """, (route_id, hour, since))
+    conn.execute("""
+    INSERT INTO demand_rollup
+    (route_id, hour, date_recorded, is_weekend, passenger_sum, sample_count,
+     cum_sum, cum_count, cum_weekend_sum, cum_weekend_count)
+    SELECT route_id, hour, date_recorded, is_weekend, passenger_sum, sample_count,
+           ? + SUM(passenger_sum) OVER running,
+           ? + SUM(sample_count) OVER running,
+           ? + SUM(CASE WHEN is_weekend THEN passenger_sum ELSE 0 END) OVER running,
+           ? + SUM(CASE WHEN is_weekend THEN sample_count ELSE 0 END) OVER running
+    FROM (
+        SELECT route_id, hour, date_recorded,
+               strftime('%w', date_recorded) IN ('0', '6') AS is_weekend,
+               SUM(passenger_count) AS passenger_sum,
+               COUNT(*) AS sample_count
+        FROM passenger_demand
+        WHERE route_id = ? AND hour = ? AND is_predicted = 0 AND date_recorded >= ?
+        GROUP BY date_recorded
+    )
+    WINDOW running AS (ORDER BY date_recorded)
+    """, (base_sum, base_count, base_weekend_sum, base_weekend_count, route_id, hour, since))
+
+
+def sync(conn: sqlite3.Connection, route_id: Optional[str] = None) -> int:
+    """Bring the rollup up to date with passenger_demand
+
+    Joins the caller's transaction if one is open; otherwise takes the
+    write lock and commits. Returns the number of route/hour series rebuilt.
+    """
+    if route_id is None:
+        dirty = conn.execute("SELECT route_id, hour, since FROM demand_rollup_dirty").fetchall()
+    else:
+        dirty = conn.execute("""
+        SELECT route_id, hour, since FROM demand_rollup_dirty WHERE route_id = ?
+        """, (route_id,)).fetchall()
+    if not dirty:
+        return 0
+
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock; another connection may have synced already
+        for cell_route_id, hour, _ in dirty:
+            row = conn.execute("""
+            SELECT since FROM demand_rollup_dirty WHERE route_id = ? AND hour = ?
+            """, (cell_route_id, hour)).fetchone()
+            if row is None:
+                continue
+            rebuild_cell(conn, cell_route_id, hour, row[0])
+            conn.execute("""
+            DELETE FROM demand_rollup_dirty WHERE route_id = ? AND hour = ?
+            """, (cell_route_id, hour))
+        if own_transaction:
+            conn.commit()
+    except Exception:
+        if own_transaction:
+            conn.rollback()
+        raise
+    return len(dirty)
+
+
+def _totals_through(conn: sqlite3.Connection, route_id: str, hour: int, through: str) -> tuple:
+    """Running totals as of the last date on or before `through`"""
+    row = conn.execute("""
+    SELECT cum_sum, cum_count, cum_weekend_sum, cum_weekend_count
+    FROM demand_rollup
+    WHERE route_id = ? AND hour = ? AND date_recorded <= ?
+    ORDER BY date_recorded DESC LIMIT 1
+    """, (route_id, hour, through)).fetchone()
+    return tuple(row) if row else _EMPTY_TOTALS
+
+
+def hourly_average(conn: sqlite3.Connection, route_id: str, days: int = DEFAULT_WINDOW_DAYS,
+                   day_type: str = 'all', today: Optional[date] = None) -> List[int]:
+    """Average actual passengers per hour over the last `days` days
+
+    The window starts `days` days before today, as the original
+    date('now', '-N days') query did. day_type restricts it to weekdays or
+    weekends. Read-only: the totals are as of the writers' last sync().
+    """
+    if day_type not in DAY_TYPES:
+        raise ValueError(f"day_type must be one of {', '.join(DAY_TYPES)}")
+
+    start = ((today or date.today()) - timedelta(days=days)).isoformat()
+    hourly_demand = [0] * 24
+    for hour in range(24):
+        latest = _totals_through(conn, route_id, hour, '9999-12-31')
+        if latest[1] == 0:
+            continue
+        before = _previous_totals(conn, route_id, hour, start)
+
+        total_sum, total_count, weekend_sum, weekend_count = \
+            (now - then for now, then in zip(latest, before))
+        if day_type == 'weekend':
+            passengers, samples = weekend_sum, weekend_count
+        elif day_type == 'weekday':
+            passengers, samples = total_sum - weekend_sum, total_count - weekend_count
+        else:
+            passengers, samples = total_sum, total_count
+
+        if samples:
+            hourly_demand[hour] = int(passengers / samples)
+    return hourly_demand
@@ -0,0 +1,196 @@
+"""
+Tamil Nadu Transport Optimizer - Depot Fleet Allocation
+Shares one depot's buses across its routes, hour by hour
+
+Routes of a depot draw on a pooled fleet. Every route starts from the
+optimizer's plan, which already keeps it within its own current_buses, and
+keeps that plan in each hour where the depot's routes fit in its
+fleet_size (or, in the daily plan, in what the overall depot_fleet limit
+leaves it). Only in hours where they do not fit are buses withdrawn, one
+at a time from the route that loses the fewest seated passengers, with
+schedule_optimizer.withdraw_buses. A depot with buses to spare therefore
+runs exactly the optimizer's schedule.
+"""
+
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from forecast_engine import Forecast, hourly_cost_array, utilization_array
+from route_registry import Depot, RouteRegistry
+from schedule_optimizer import ServiceLevel, optimize_schedule, seated_passengers, withdraw_buses
+from timetable import cycle_minutes
+
+
+@dataclass
+class DepotAllocation:
+    """Buses per [route, hour] for one depot day"""
+    depot_id: str
+    fleet_size: int
+    route_ids: List[str]
+    demand: np.ndarray
+    buses: np.ndarray
+    frequency: np.ndarray
+    cost: np.ndarray
+    unserved: np.ndarray
+    withdrawn: List[int]       # buses taken off the optimizer's plan, per hour
+
+    @property
+    def total_cost(self) -> float:
+        return float(self.cost.sum())
+
+    def to_dict(self) -> dict:
+        return {
+            'depot_id': self.depot_id,
+            'fleet_size': self.fleet_size,
+            'total_cost': round(self.total_cost, 2),
+            'total_unserved': int(self.unserved.sum()),
+            'hourly_buses': self.buses.sum(axis=0).tolist(),
+            'hourly_withdrawn': self.withdrawn,
+            'routes': [{
+                'route_id': route_id,
+                'buses': self.buses[r].tolist(),
+                'frequency_minutes': self.frequency[r].tolist(),
+                'daily_cost': round(float(self.cost[r].sum()), 2),
+                'unserved': int(self.unserved[r].sum())
+            } for r, route_id in enumerate(self.route_ids)]
+        }
+
+
+def allocate_depot(demand: np.ndarray, distances: Sequence[float], travel_times: Sequence[int],
+                   fleet_size: int, buses: Optional[np.ndarray] = None,
+                   frequency: Optional[np.ndarray] = None,
+                   service: ServiceLevel = ServiceLevel(),
+                   depot_id: str = '', route_ids: Optional[List[str]] = None,
+                   route_fleet: Optional[Sequence[int]] = None,
+                   hourly_fleet: Optional[Sequence[int]] = None) -> DepotAllocation:
+    """Fit one day of a depot's plan, shaped [route, hour], into a shared fleet
+
+    buses and frequency are the optimizer's plan; without them it is solved
+    here from the demand, with route_fleet capping each route (its
+    current_buses). hourly_fleet lowers the fleet available in individual
+    hours below fleet_size.
+    """
+    demand = np.asarray(demand, dtype=np.int64)
+    distances = np.asarray(distances, dtype=np.float64)
+    cycle = np.array([cycle_minutes(t) for t in travel_times], dtype=np.int64)
+    if buses is None:
+        solution = optimize_schedule(demand, distances, travel_times, route_fleet, service=service)
+        buses, frequency = solution.buses, solution.frequency
+    buses = np.array(buses, dtype=np.int64)
+    frequency = np.array(frequency, dtype=np.int64)
+
+    available = np.full(demand.shape[1], fleet_size, dtype=np.int64)
+    if hourly_fleet is not None:
+        available = np.minimum(available, np.maximum(np.asarray(hourly_fleet, dtype=np.int64), 0))
+
+    withdrawn = []
+    for hour in range(demand.shape[1]):
+        running = int(buses[:, hour].sum())
+        if running > available[hour]:
+            buses[:, hour], frequency[:, hour] = withdraw_buses(
+                demand[:, hour], buses[:, hour], frequency[:, hour], cycle, distances, int(available[hour]))
+        withdrawn.append(running - int(buses[:, hour].sum()))
+
+    return DepotAllocation(
+        depot_id=depot_id,
+        fleet_size=fleet_size,
+        route_ids=list(route_ids) if route_ids is not None else [],
+        demand=demand,
+        buses=buses,
+        frequency=frequency,
+        cost=hourly_cost_array(buses, distances[:, None], frequency),
+        unserved=demand - seated_passengers(demand, buses, frequency),
+        withdrawn=withdrawn
+    )
+
+
+def load_depot_demand(conn, route_ids: Sequence[str], day: date) -> np.ndarray:
+    """Stored predicted passengers per [route, hour] for one date (0 where missing)"""
+    position = {route_id: r for r, route_id in enumerate(route_ids)}
+    demand = np.zeros((len(route_ids), 24), dtype=np.int64)
+    placeholders = ', '.join('?' * len(route_ids))
+    for route_id, hour, passengers in conn.execute(f"""
+    SELECT route_id, hour, predicted_passengers
+    FROM daily_schedule_predictions
+    WHERE prediction_date = ? AND route_id IN ({placeholders})
+    """, (day, *route_ids)):
+        demand[position[route_id], hour] = passengers
+    return demand
+
+
+def allocate_stored(conn, registry: RouteRegistry, depot: Depot, day: date,
+                    fleet_size: Optional[int] = None) -> DepotAllocation:
+    """Allocation over a depot's stored predictions for one date
+
+    The optimizer's plan is solved afresh from the stored demand, so a
+    larger fleet_size than the stored plan had gets its buses back.
+    """
+    route_ids = list(depot.route_ids)
+    routes = [registry.get(route_id) for route_id in route_ids]
+    return allocate_depot(load_depot_demand(conn, route_ids, day),
+                          [route.distance for route in routes], [route.travel_time for route in routes],
+                          depot.fleet_size if fleet_size is None else fleet_size,
+                          depot_id=depot.id, route_ids=route_ids,
+                          route_fleet=[route.current_buses for route in routes])
+
+
+def _member_rows(arrays: List[np.ndarray], located: Dict[str, Tuple[int, int]],
+                 members: Sequence[str], day: int) -> np.ndarray:
+    """[member, hour] rows of one day, gathered from per-forecast [day, route, hour] arrays"""
+    return np.stack([arrays[located[route_id][0]][day, located[route_id][1]] for route_id in members])
+
+
+def allocate_forecasts(forecasts: List[Forecast], registry: RouteRegistry,
+                       depot_fleet: Optional[int] = None) -> List[Forecast]:
+    """Fit optimized forecasts into their depots' fleets (same dates in all forecasts)
+
+    The forecasts come from optimize_forecasts; their buses and headways
+    are the starting plan and only change in hours where a depot's fleet
+    binds. Routes without a depot keep the schedule they came with. With
+    depot_fleet, the overall limit optimize_forecasts applied across all
+    routes, a depot only gets the buses the other routes leave free in each
+    hour.
+    """
+    if not forecasts:
+        return forecasts
+    located: Dict[str, Tuple[int, int]] = {}
+    for f, forecast in enumerate(forecasts):
+        for r, route_id in enumerate(forecast.route_ids):
+            located[route_id] = (f, r)
+
+    buses = [forecast.buses.copy() for forecast in forecasts]
+    frequency = [forecast.frequency.copy() for forecast in forecasts]
+    for depot in registry.depots():
+        members = [route_id for route_id in depot.route_ids if route_id in located]
+        if not members:
+            continue
+        routes = [registry.get(route_id) for route_id in members]
+        distances = [route.distance for route in routes]
+        travel_times = [route.travel_time for route in routes]
+        for d in range(len(forecasts[0].dates)):
+            demand = _member_rows([forecast.demand for forecast in forecasts], located, members, d)
+            hourly_fleet = None
+            if depot_fleet is not None:
+                members_buses = _member_rows(buses, located, members, d).sum(axis=0)
+                others = sum(planned[d].sum(axis=0) for planned in buses) - members_buses
+                hourly_fleet = depot_fleet - others
+            allocation = allocate_depot(demand, distances, travel_times, depot.fleet_size,
+                                        _member_rows(buses, located, members, d),
+                                        _member_rows(frequency, located, members, d),
+                                        hourly_fleet=hourly_fleet)
+            for m, route_id in enumerate(members):
+                f, r = located[route_id]
+                buses[f][d, r] = allocation.buses[m]
+                frequency[f][d, r] = allocation.frequency[m]
+
+    result = []
+    for forecast, planned, headway in zip(forecasts, buses, frequency):
+        distances = np.array([registry.distance(route_id) for route_id in forecast.route_ids],
+                             dtype=np.float64)[None, :, None]
+        result.append(replace(forecast, buses=planned, frequency=headway,
+                              cost=hourly_cost_array(planned, distances, headway),
+                              utilization=utilization_array(forecast.demand, planned, headway)))
+    return result
@@ -1,147 +1,88 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta, date
-import sqlite3
 import json
 import os
 import random
 import math
 
+import numpy as np
+
+import data_versions
+import metrics
+import demand_rollup
+import forecast_accuracy
+from bulk_writer import BulkWriter
+from db_pool import DB_PATH, close_pools, get_db, get_pool, init_app
+from demand_cube import MISSING, open_cube
+from daily_update_scheduler import TransportDataUpdater
+from depot_allocation import allocate_stored
+from event_stream import get_broadcaster
+from festival_calendar import TAMIL_NADU_FESTIVALS
+from forecast_horizon import DEFAULT_HORIZON_DAYS, MAX_HORIZON_DAYS, read_horizon
+from migrations import migrate
+from profiling import DEFAULT_SLOW_STAGE_SECONDS
+from response_cache import ResponseCache
+from route_registry import get_registry
+from scenarios import MAX_SCENARIOS, Scenario, evaluate_scenarios, scenario_engine, scenario_table
+from timetable import read_timetable
+
 app = Flask(__name__)
 CORS(app)
+init_app(app)
+metrics.init_app(app, 'enhanced')
+response_cache = ResponseCache()
+
+# Response cache TTLs (seconds); data version bumps invalidate sooner
+ROUTES_TTL = 3600
+SCHEDULE_TTL = 900
+FACTORS_TTL = 900
+DASHBOARD_TTL = 300
 
-# Tamil Nadu Festival Calendar
-TAMIL_NADU_FESTIVALS = {
-    '2025-09-01': {'name': 'Vinayaka Chaturthi', 'multiplier': 1.6, 'type': 'major'},
-    '2025-09-17': {'name': 'Onam', 'multiplier': 1.4, 'type': 'regional'},
-    '2025-10-02': {'name': 'Gandhi Jayanti', 'multiplier': 1.3, 'type': 'national'},
-    '2025-10-12': {'name': 'Vijaya Dashami', 'multiplier': 1.7, 'type': 'major'},
-    '2025-11-01': {'name': 'Diwali', 'multiplier': 1.8, 'type': 'major'},
-    '2025-11-15': {'name': 'Karthikai Deepam', 'multiplier': 1.5, 'type': 'regional'},
-    '2025-12-25': {'name': 'Christmas', 'multiplier': 1.4, 'type': 'national'},
-    '2026-01-14': {'name': 'Thai Pusam', 'multiplier': 1.6, 'type': 'regional'},
-    '2026-01-26': {'name': 'Republic Day', 'multiplier': 1.3, 'type': 'national'},
-}
+# Longest date range /api/demand-history serves
+MAX_HISTORY_DAYS = 1096
 
-# Market days
-MARKET_DAYS = {
-    'tp_pc': [1, 4],  # Tuesday, Friday
-    'tp_cb': [0, 2, 5],  # Monday, Wednesday, Saturday
-    'tp_sl': [2, 5]   # Wednesday, Saturday
-}
+# Fields of a schedule entry that /api/schedules can return
+SCHEDULE_FIELDS = ('hour', 'predicted_passengers', 'recommended_buses', 'frequency_minutes',
+                   'cost_per_hour', 'utilization_rate')
 
-def init_enhanced_db():
+def init_enhanced_db(db_path=DB_PATH):
     """Initialize enhanced database with prediction tables"""
-    conn = sqlite3.connect('transport_optimizer.db')
+    pool = get_pool(db_path)
+    conn = pool.acquire()
     cursor = conn.cursor()
     
-    # Routes table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS routes (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        distance INTEGER NOT NULL,
-        travel_time INTEGER NOT NULL,
-        current_buses INTEGER NOT NULL,
-        daily_passengers INTEGER NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Enhanced passenger demand
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS passenger_demand (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id TEXT NOT NULL,
-        hour INTEGER NOT NULL CHECK (hour >= 0 AND hour <= 23),
-        day_of_week INTEGER NOT NULL CHECK (day_of_week >= 0 AND day_of_week <= 6),
-        passenger_count INTEGER NOT NULL,
-        date_recorded DATE NOT NULL,
-        is_predicted BOOLEAN DEFAULT FALSE,
-        weather_factor REAL DEFAULT 1.0,
-        festival_factor REAL DEFAULT 1.0,
-        market_factor REAL DEFAULT 1.0,
-        confidence_score REAL DEFAULT 0.8,
-        FOREIGN KEY (route_id) REFERENCES routes (id)
-    )
-    """)
-    
-    # Daily schedule predictions
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS daily_schedule_predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id TEXT NOT NULL,
-        prediction_date DATE NOT NULL,
-        hour INTEGER NOT NULL,
-        predicted_passengers INTEGER NOT NULL,
-        recommended_buses INTEGER NOT NULL,
-        frequency_minutes INTEGER NOT NULL,
-        cost_per_hour REAL NOT NULL,
-        utilization_rate REAL NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (route_id) REFERENCES routes (id)
-    )
-    """)
-    
-    # External factors tracking
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS external_factors (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date_recorded DATE NOT NULL,
-        weather_condition TEXT,
-        temperature REAL,
-        rainfall REAL,
-        humidity REAL,
-        is_festival BOOLEAN DEFAULT FALSE,
-        festival_name TEXT,
-        festival_impact REAL DEFAULT 1.0,
-        is_market_day BOOLEAN DEFAULT FALSE,
-        day_type TEXT DEFAULT 'regular',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Insert route data
-    routes = [
-        ('tp_pc', 'Tiruppur to Pollachi', 85, 120, 12, 2800),
-        ('tp_cb', 'Tiruppur to Coimbatore', 65, 90, 18, 4200),
-        ('tp_sl', 'Tiruppur to Salem', 113, 150, 15, 3500)
-    ]
-    
-    cursor.executemany("""
-    INSERT OR REPLACE INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, routes)
-    
-    # Generate some initial sample data
-    generate_initial_data(cursor)
+    # Create or upgrade the schema
+    migrate(conn)
+
+    # Generate some initial sample data for the registered routes
+    generate_initial_data(cursor, get_registry(db_path))
+    demand_rollup.sync(conn)
+    forecast_accuracy.sync(conn)
     
     conn.commit()
-    conn.close()
+    open_cube(db_path).sync(conn)
+    pool.release(conn)
 
-def generate_initial_data(cursor):
+def generate_initial_data(cursor, registry):
     """Generate initial passenger demand data"""
-    base_patterns = {
-        'tp_pc': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
-        'tp_cb': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
-        'tp_sl': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55]
-    }
-    
-    # Generate data for last 30 days
-    for days_back in range(30):
-        target_date = date.today() - timedelta(days=days_back)
-        day_of_week = target_date.weekday()
-        
-        for route_id, pattern in base_patterns.items():
-            for hour, base_passengers in enumerate(pattern):
-                # Add variation
-                passengers = max(0, int(base_passengers * random.uniform(0.8, 1.2)))
-                
-                cursor.execute("""
-                INSERT OR REPLACE INTO passenger_demand 
-                (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """, (route_id, hour, day_of_week, passengers, target_date, False))
+    def sample_rows():
+        # Generate data for last 30 days
+        for days_back in range(30):
+            target_date = date.today() - timedelta(days=days_back)
+            day_of_week = target_date.weekday()
+            
+            for route in registry:
+                for hour, base_passengers in enumerate(route.profile(day_of_week)):
+                    # Add variation
+                    passengers = max(0, int(base_passengers * random.uniform(0.8, 1.2)))
+                    yield (route.id, hour, day_of_week, passengers, target_date, False)
+    
+    BulkWriter(cursor.connection).write("""
+    INSERT OR REPLACE INTO passenger_demand 
+    (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, sample_rows(), single_transaction=True)
 
 def get_weather_data():
     """Get simulated weather data"""
@@ -176,129 +117,56 @@ def is_festival_day(date_obj):
     date_str = date_obj.strftime('%Y-%m-%d')
     return date_str in TAMIL_NADU_FESTIVALS, TAMIL_NADU_FESTIVALS.get(date_str, {})
 
-def calculate_optimal_schedule(demand):
-    """Calculate optimal schedule based on demand"""
-    if demand == 0:
-        return 0, 120
-    elif demand <= 20:
-        return 1, 90
-    elif demand <= 45:
-        return 1, 60
-    elif demand <= 90:
-        return 2, 45
-    elif demand <= 135:
-        return 2, 30
-    elif demand <= 200:
-        return 3, 25
-    elif demand <= 300:
-        return 4, 20
-    elif demand <= 400:
-        return 5, 15
-    else:
-        buses = max(3, min(8, (demand + 44) // 45))
-        frequency = max(10, 60 // max(1, buses - 2))
-        return buses, frequency
-
-def calculate_hourly_cost(buses, distance, frequency):
-    """Calculate hourly operational cost"""
-    if buses == 0:
-        return 0
-    
-    fuel_per_km = 8.5
-    driver_per_hour = 120
-    maintenance_per_km = 3.2
-    
-    trips_per_hour = 60 / frequency if frequency > 0 else 0
-    fuel_cost = distance * fuel_per_km * trips_per_hour * buses
-    driver_cost = driver_per_hour * buses
-    maintenance_cost = distance * maintenance_per_km * trips_per_hour * buses
-    
-    return fuel_cost + driver_cost + maintenance_cost
-
 @app.route('/api/daily-update', methods=['POST'])
 def trigger_daily_update():
-    """Trigger daily prediction update"""
+    """Trigger daily prediction update
+    
+    Runs the scheduler's pipeline (TransportDataUpdater.predict_tomorrow_demand):
+    the smoothing-model baseline, optimized and depot-allocated schedules,
+    and predictions stored with their timetables in one transaction. The
+    multi-day horizon is refreshed after it.
+    """
+    database = current_app.config['DATABASE']
+    updater = TransportDataUpdater(db_path=database, pipeline='api',
+                                   slow_stage_seconds=current_app.config.get('SLOW_STAGE_SECONDS',
+                                                                             DEFAULT_SLOW_STAGE_SECONDS))
     try:
-        conn = sqlite3.connect('transport_optimizer.db')
-        cursor = conn.cursor()
-        
-        tomorrow = date.today() + timedelta(days=1)
-        tomorrow_weekday = tomorrow.weekday()
-        
-        weather_data = get_weather_data()
-        is_festival, festival_data = is_festival_day(tomorrow)
-        
-        # Store external factors
-        cursor.execute("""
-        INSERT OR REPLACE INTO external_factors 
-        (date_recorded, weather_condition, temperature, rainfall, humidity, 
-         is_festival, festival_name, festival_impact, day_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            tomorrow, weather_data['condition'], weather_data['temperature'],
-            weather_data['rainfall'], weather_data['humidity'], is_festival,
-            festival_data.get('name', ''), festival_data.get('multiplier', 1.0),
-            'festival' if is_festival else ('weekend' if tomorrow_weekday >= 5 else 'weekday')
-        ))
-        
-        routes = ['tp_pc', 'tp_cb', 'tp_sl']
-        base_patterns = {
-            'tp_pc': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
-            'tp_cb': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
-            'tp_sl': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55]
-        }
-        
-        for route_id in routes:
-            # Check market day
-            is_market = tomorrow_weekday in MARKET_DAYS.get(route_id, [])
-            market_factor = 1.3 if is_market else 1.0
+        with updater.profiler.run() as profile:
+            prediction = updater.predict_tomorrow_demand()
             
-            base_pattern = base_patterns[route_id]
-            
-            for hour, base_demand in enumerate(base_pattern):
-                # Apply factors
-                predicted_demand = base_demand
-                predicted_demand = int(predicted_demand * weather_data['weather_factor'])
-                predicted_demand = int(predicted_demand * festival_data.get('multiplier', 1.0))
-                predicted_demand = int(predicted_demand * market_factor)
-                predicted_demand = int(predicted_demand * random.uniform(0.9, 1.1))
-                predicted_demand = max(0, predicted_demand)
-                
-                # Calculate schedule
-                buses, frequency = calculate_optimal_schedule(predicted_demand)
-                distance = {'tp_pc': 85, 'tp_cb': 65, 'tp_sl': 113}[route_id]
-                cost = calculate_hourly_cost(buses, distance, frequency)
-                utilization = min(predicted_demand / (buses * 45), 1.0) if buses > 0 else 0
-                
-                # Store prediction
-                cursor.execute("""
-                INSERT OR REPLACE INTO daily_schedule_predictions
-                (route_id, prediction_date, hour, predicted_passengers, recommended_buses, 
-                 frequency_minutes, cost_per_hour, utilization_rate)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, tomorrow, hour, predicted_demand, buses, frequency, cost, utilization))
-        
-        conn.commit()
-        conn.close()
+            # The days after tomorrow, for GET /api/forecast; unchanged days are skipped
+            with updater.profiler.stage('horizon'):
+                horizon = updater.forecast_horizon(MAX_HORIZON_DAYS)
+            # Rollup and accuracy queues are drained here, so the GET endpoints stay read-only
+            with updater.profiler.stage('rollups'), updater.pool.connection() as conn:
+                demand_rollup.sync(conn)
+                forecast_accuracy.sync(conn)
+            response_cache.invalidate()
+            get_broadcaster(database).wake()
         
         return jsonify({
             'status': 'success',
             'message': 'Daily update completed',
             'data': {
-                'prediction_date': tomorrow.strftime('%Y-%m-%d'),
-                'weather_factor': weather_data['weather_factor'],
-                'is_festival': is_festival,
-                'festival_name': festival_data.get('name', '') if is_festival else None
-            }
+                'prediction_date': prediction['date'],
+                'weather_factor': prediction['weather_factor'],
+                'is_festival': prediction['festival'] is not None,
+                'festival_name': prediction['festival'],
+                'timetable': prediction['timetable'],
+                'horizon': {'days': horizon.days, 'regenerated': horizon.regenerated,
+                            'unchanged': horizon.unchanged}
+            },
+            'profile': profile.to_dict()
         })
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/next-day-schedule/<route_id>', methods=['GET'])
+@response_cache.cached(SCHEDULE_TTL, datasets=[data_versions.PREDICTIONS])
 def get_next_day_schedule(route_id):
     """Get tomorrow's recommended schedule"""
-    conn = sqlite3.connect('transport_optimizer.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     tomorrow = date.today() + timedelta(days=1)
@@ -312,7 +180,6 @@ def get_next_day_schedule(route_id):
     """, (route_id, tomorrow))
     
     schedule_data = cursor.fetchall()
-    conn.close()
     
     if not schedule_data:
         return jsonify({'error': 'No predictions found'}), 404
@@ -320,16 +187,9 @@ def get_next_day_schedule(route_id):
     schedule = []
     total_cost = 0
     
-    for hour, passengers, buses, frequency, cost, utilization in schedule_data:
-        schedule.append({
-            'hour': f"{hour:02d}:00",
-            'predicted_passengers': passengers,
-            'recommended_buses': buses,
-            'frequency_minutes': frequency,
-            'cost_per_hour': round(cost, 2),
-            'utilization_rate': round(utilization * 100, 1)
-        })
-        total_cost += cost
+    for row in schedule_data:
+        schedule.append(schedule_entry(*row))
+        total_cost += row[4]
     
     return jsonify({
         'route_id': route_id,
@@ -338,10 +198,232 @@ def get_next_day_schedule(route_id):
         'total_daily_cost': round(total_cost, 2)
     })
 
+def schedule_entry(hour, passengers, buses, frequency, cost, utilization):
+    """One hour of a schedule, formatted like /api/next-day-schedule"""
+    return {
+        'hour': f"{hour:02d}:00",
+        'predicted_passengers': passengers,
+        'recommended_buses': buses,
+        'frequency_minutes': frequency,
+        'cost_per_hour': round(cost, 2),
+        'utilization_rate': round(utilization * 100, 1)
+    }
+
+@app.route('/api/schedules', methods=['GET'])
+def get_schedules():
+    """Stream schedules for many routes from one query
+    
+    Query parameters: date (YYYY-MM-DD, default tomorrow), routes (comma
+    separated, default all) and fields (comma separated subset of
+    SCHEDULE_FIELDS, default all).
+    """
+    try:
+        target_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date() \
+            if 'date' in request.args else date.today() + timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or list(SCHEDULE_FIELDS)
+    unknown = [f for f in fields if f not in SCHEDULE_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    route_ids = [r for r in request.args.get('routes', '').split(',') if r]
+    
+    query = """
+    SELECT route_id, hour, predicted_passengers, recommended_buses, frequency_minutes,
+           cost_per_hour, utilization_rate
+    FROM daily_schedule_predictions
+    WHERE prediction_date = ?
+    """
+    params = [target_date]
+    if route_ids:
+        query += " AND route_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(route_ids))
+    query += " ORDER BY route_id, hour"
+    
+    cursor = get_db().execute(query, params)
+    
+    def route_json(route_id, entries, total_cost):
+        return json.dumps({
+            'route_id': route_id,
+            'schedule': entries,
+            'total_daily_cost': round(total_cost, 2)
+        })
+    
+    def generate():
+        # Rows arrive grouped by route; emit each route as soon as it is complete
+        yield f'{{"date": "{target_date.strftime("%Y-%m-%d")}", "fields": {json.dumps(fields)}, "schedules": ['
+        current_route, entries, total_cost, count = None, [], 0.0, 0
+        for route_id, *row in cursor:
+            if route_id != current_route:
+                if current_route is not None:
+                    yield (',' if count else '') + route_json(current_route, entries, total_cost)
+                    count += 1
+                current_route, entries, total_cost = route_id, [], 0.0
+            entry = schedule_entry(*row)
+            entries.append({field: entry[field] for field in fields})
+            total_cost += row[4]
+        if current_route is not None:
+            yield (',' if count else '') + route_json(current_route, entries, total_cost)
+            count += 1
+        yield f'], "route_count": {count}}}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    """Multi-day forecast for one route, starting tomorrow
+    
+    Read-only: the stored horizon is refreshed by the daily update (this
+    server's POST /api/daily-update or daily_update_scheduler.py). Days not
+    forecast yet are left out of the response.
+    """
+    route_id = request.args.get('route')
+    days = request.args.get('days', DEFAULT_HORIZON_DAYS, type=int)
+    
+    registry = get_registry(current_app.config['DATABASE'])
+    if not route_id:
+        return jsonify({'error': 'Route ID is required'}), 400
+    if route_id not in registry:
+        return jsonify({'error': 'Route not found'}), 404
+    if not 1 <= days <= MAX_HORIZON_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_HORIZON_DAYS}'}), 400
+    
+    start_date = date.today() + timedelta(days=1)
+    route = registry.get(route_id)
+    forecast = read_horizon(get_db(), route_id, start_date, days)
+    for day in forecast:
+        day_date = date.fromisoformat(day['date'])
+        is_festival, festival_data = is_festival_day(day_date)
+        day['festival'] = festival_data.get('name') if is_festival else None
+        day['is_market_day'] = day_date.weekday() in route.market_days
+    
+    return jsonify({
+        'route_id': route_id,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'days': days,
+        'available_days': len(forecast),
+        'forecast': forecast
+    })
+
+@app.route('/api/depot-allocation', methods=['GET'])
+@response_cache.cached(SCHEDULE_TTL, datasets=[data_versions.ROUTES, data_versions.PREDICTIONS])
+def get_depot_allocation():
+    """Shared-fleet bus allocation per depot, route and hour for a predicted date"""
+    registry = get_registry(current_app.config['DATABASE'])
+    depot_id = request.args.get('depot')
+    fleet_size = request.args.get('fleet', type=int)
+    
+    try:
+        day = date.fromisoformat(request.args.get('date', (date.today() + timedelta(days=1)).isoformat()))
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    if fleet_size is not None and fleet_size < 0:
+        return jsonify({'error': 'fleet must be a non-negative integer'}), 400
+    
+    if depot_id:
+        depot = registry.depot(depot_id)
+        if not depot:
+            return jsonify({'error': 'Depot not found'}), 404
+        depots = [depot]
+    else:
+        depots = registry.depots()
+    
+    conn = get_db()
+    allocations = []
+    for depot in depots:
+        allocation = allocate_stored(conn, registry, depot, day, fleet_size).to_dict()
+        allocation['name'] = depot.name
+        allocations.append(allocation)
+    
+    return jsonify({
+        'date': day.strftime('%Y-%m-%d'),
+        'depots': allocations
+    })
+
+@app.route('/api/timetable/<route_id>', methods=['GET'])
+@response_cache.cached(SCHEDULE_TTL, datasets=[data_versions.SCHEDULES])
+def get_timetable(route_id):
+    """Trips with departure times and vehicle blocks for a predicted date
+    
+    Read-only: timetables are written by the daily update together with the
+    predictions they come from.
+    """
+    registry = get_registry(current_app.config['DATABASE'])
+    if route_id not in registry:
+        return jsonify({'error': 'Route not found'}), 404
+    try:
+        day = date.fromisoformat(request.args.get('date', (date.today() + timedelta(days=1)).isoformat()))
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    
+    trips = read_timetable(get_db(), route_id, day)
+    if not trips:
+        return jsonify({'error': 'No timetable for this date'}), 404
+    
+    return jsonify({
+        'route_id': route_id,
+        'date': day.strftime('%Y-%m-%d'),
+        'vehicles': len({trip['block_id'] for trip in trips}),
+        'trips': trips
+    })
+
+@app.route('/api/scenarios', methods=['POST'])
+def evaluate_what_if():
+    """Compare cost, service and fleet use across many what-if parameter sets"""
+    data = request.get_json(silent=True) or {}
+    specs = data.get('scenarios')
+    route_ids = data.get('routes')
+    registry = get_registry(current_app.config['DATABASE'])
+    
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'scenarios must be a non-empty list'}), 400
+    if len(specs) > MAX_SCENARIOS:
+        return jsonify({'error': f'at most {MAX_SCENARIOS} scenarios per request'}), 400
+    if route_ids is not None and (not isinstance(route_ids, list) or
+                                  any(not isinstance(route_id, str) or route_id not in registry
+                                      for route_id in route_ids)):
+        return jsonify({'error': 'routes must be a list of known route ids'}), 400
+    try:
+        day = date.fromisoformat(str(data.get('date', (date.today() + timedelta(days=1)).isoformat())))
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    try:
+        scenarios = [Scenario.from_dict(spec, f'scenario {i + 1}') for i, spec in enumerate(specs)]
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    engine, fleet, travel_times = scenario_engine(registry, TAMIL_NADU_FESTIVALS, route_ids)
+    results = evaluate_scenarios(engine, fleet, travel_times, day, scenarios)
+    
+    return jsonify({
+        'date': day.strftime('%Y-%m-%d'),
+        'routes': engine.route_ids,
+        **scenario_table(results)
+    })
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events: a 'versions' snapshot, then an event per changed dataset
+    
+    Events are named after the dataset (predictions, actuals, schedules,
+    routes) and carry its new version, so dashboards refetch only that.
+    """
+    broadcaster = get_broadcaster(current_app.config['DATABASE'])
+    if not broadcaster.subscribe():
+        return jsonify({'error': 'Too many event stream subscribers'}), 503
+    
+    response = Response(broadcaster.stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(broadcaster.unsubscribe)
+    return response
+
 @app.route('/api/current-factors', methods=['GET'])
+@response_cache.cached(FACTORS_TTL, datasets=[data_versions.PREDICTIONS])
 def get_current_factors():
     """Get current external factors"""
-    conn = sqlite3.connect('transport_optimizer.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     tomorrow = date.today() + timedelta(days=1)
@@ -355,7 +437,6 @@ def get_current_factors():
     """, (tomorrow,))
     
     data = cursor.fetchone()
-    conn.close()
     
     if not data:
         # Generate current weather
@@ -382,57 +463,103 @@ def get_current_factors():
     })
 
 @app.route('/api/routes', methods=['GET'])
+@response_cache.cached(ROUTES_TTL, datasets=[data_versions.ROUTES])
 def get_routes():
     """Get all routes"""
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM routes")
-    routes = cursor.fetchall()
-    conn.close()
-    
-    route_list = []
-    for route in routes:
-        route_list.append({
-            'id': route[0],
-            'name': route[1],
-            'distance': route[2],
-            'travel_time': route[3],
-            'current_buses': route[4],
-            'daily_passengers': route[5]
-        })
+    registry = get_registry(current_app.config['DATABASE'])
+    route_list = [route.to_dict() for route in registry]
     
     return jsonify(route_list)
 
 @app.route('/api/passenger-demand/<route_id>', methods=['GET'])
 def get_passenger_demand(route_id):
     """Get passenger demand data"""
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-    SELECT hour, AVG(passenger_count) as avg_passengers
-    FROM passenger_demand 
-    WHERE route_id = ? AND date_recorded >= date('now', '-7 days')
-    GROUP BY hour
-    ORDER BY hour
-    """, (route_id,))
+    days = request.args.get('days', demand_rollup.DEFAULT_WINDOW_DAYS, type=int)
+    day_type = request.args.get('day_type', 'all')
     
-    demand_data = cursor.fetchall()
-    conn.close()
+    if days < 1:
+        return jsonify({'error': 'days must be a positive integer'}), 400
+    if day_type not in demand_rollup.DAY_TYPES:
+        return jsonify({'error': f"day_type must be one of {', '.join(demand_rollup.DAY_TYPES)}"}), 400
     
-    hourly_demand = [0] * 24
-    for hour, avg_passengers in demand_data:
-        hourly_demand[hour] = int(avg_passengers)
+    # Averages come from the running totals, not a scan of the raw rows
+    hourly_demand = demand_rollup.hourly_average(get_db(), route_id, days, day_type)
     
     return jsonify({
         'route_id': route_id,
+        'days': days,
+        'day_type': day_type,
         'hourly_demand': hourly_demand
     })
 
+@app.route('/api/demand-history/<route_id>', methods=['GET'])
+def get_demand_history(route_id):
+    """Daily actual and predicted totals plus average hourly demand over a date range"""
+    registry = get_registry(current_app.config['DATABASE'])
+    if route_id not in registry:
+        return jsonify({'error': 'Route not found'}), 404
+    try:
+        end = date.fromisoformat(request.args.get('end', date.today().isoformat()))
+        start = date.fromisoformat(request.args.get('start', (end - timedelta(days=27)).isoformat()))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+    if start > end or (end - start).days >= MAX_HISTORY_DAYS:
+        return jsonify({'error': f'start must be on or before end, at most {MAX_HISTORY_DAYS} days apart'}), 400
+    
+    # Slices of the memory-mapped cube instead of a scan of passenger_demand; the
+    # writers keep it synced, so this read takes no write lock
+    cube = open_cube(current_app.config['DATABASE'])
+    series = {}
+    for kind, predicted in (('actual', False), ('predicted', True)):
+        window = cube.route_window(route_id, start, end, predicted)
+        recorded = window != MISSING
+        passengers = np.where(recorded, window, 0)
+        days_recorded = recorded.sum(axis=0)
+        hourly = passengers.sum(axis=0) / np.maximum(days_recorded, 1)
+        series[kind] = {
+            'daily_totals': [int(total) if any_hour else None
+                             for total, any_hour in zip(passengers.sum(axis=1), recorded.any(axis=1))],
+            'hourly_average': [round(float(value), 1) if count else None
+                               for value, count in zip(hourly, days_recorded)]
+        }
+    
+    return jsonify({
+        'route_id': route_id,
+        'start': start.strftime('%Y-%m-%d'),
+        'end': end.strftime('%Y-%m-%d'),
+        'dates': [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)],
+        **series
+    })
+
+@app.route('/api/accuracy', methods=['GET'])
+def get_accuracy():
+    """Forecast error metrics (MAPE, bias, RMSE) per route, hour or day type"""
+    route_id = request.args.get('route')
+    group_by = request.args.get('group_by', 'route')
+    day_type = request.args.get('day_type')
+    
+    if group_by not in forecast_accuracy.GROUP_BY:
+        return jsonify({'error': f"group_by must be one of {', '.join(forecast_accuracy.GROUP_BY)}"}), 400
+    
+    groups = forecast_accuracy.accuracy_report(get_db(), route_id, group_by, day_type)
+    
+    return jsonify({
+        'route_id': route_id,
+        'group_by': group_by,
+        'day_type': day_type,
+        'variants': list(forecast_accuracy.VARIANTS),
+        'groups': groups
+    })
+
 @app.route('/api/dashboard-stats', methods=['GET'])
+@response_cache.cached(DASHBOARD_TTL, datasets=[data_versions.ROUTES])
 def get_dashboard_stats():
-    """Get dashboard statistics"""
-    conn = sqlite3.connect('transport_optimizer.db')
+    """Get dashboard statistics
+    
+    The body depends only on the routes table, so it carries no request
+    time; the ETag changes exactly when the figures do.
+    """
+    conn = get_db()
     cursor = conn.cursor()
     
     # Total routes
@@ -450,26 +577,31 @@ def get_dashboard_stats():
     # Estimated savings
     weekly_savings = 52500  # Based on optimization calculations
     
-    conn.close()
     
     return jsonify({
         'total_routes': total_routes,
         'total_buses': total_buses,
         'total_passengers': total_passengers,
-        'weekly_savings': weekly_savings,
-        'last_updated': datetime.now().isoformat()
+        'weekly_savings': weekly_savings
     })
 
 if __name__ == '__main__':
     # Initialize database
-    if not os.path.exists('transport_optimizer.db'):
+    if not os.path.exists(DB_PATH):
         print("🚌 Initializing Enhanced Transport Optimizer Database...")
         init_enhanced_db()
         print("✅ Database initialized with sample data")
     
+    # Catch the demand cube up with rows written while the server was down
+    with get_pool(DB_PATH).connection() as conn:
+        open_cube(DB_PATH).sync(conn)
+    
     print("🚀 Enhanced Transport Optimizer Server Starting...")
     print("📊 Features: Daily Updates, Festival Detection, Weather Integration")
     print("🌐 Server URL: http://localhost:5000")
-    print("📱 API Endpoints: /api/routes, /api/dashboard-stats, /api/daily-update")
+    print("📱 API Endpoints: /api/routes, /api/dashboard-stats, /api/daily-update, /api/schedules, /api/forecast, /api/accuracy, /api/depot-allocation, /api/timetable, /api/scenarios, /api/demand-history, /api/events, /metrics")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    try:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    finally:
+        close_pools()
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Tamil Nadu Transport Optimizer - Server-Sent Events
+Pushes data version changes to dashboards instead of having them poll
+
+The daily update, actuals ingestion and timetable generation bump their
+counters in data_versions, which may happen in another process. Each
+server process has one watcher thread per database. The watcher reads
+the counters once per poll interval, whatever the number of
+subscribers, and only while somebody is subscribed. A change wakes every
+subscriber through one shared condition. Each subscriber then sends a
+small event naming the dataset and its new version, and the dashboard
+fetches only what changed. Idle subscribers cost a blocked thread and
+a heartbeat comment every HEARTBEAT_SECONDS, nothing more.
+
+Writers in this process can call wake() after committing to skip the
+rest of the poll interval.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import data_versions
+from db_pool import DB_PATH, get_pool
+
+# Datasets pushed to subscribers; anything else in data_versions is internal
+EVENT_DATASETS = (data_versions.PREDICTIONS, data_versions.ACTUALS, data_versions.SCHEDULES,
+                  data_versions.ROUTES)
+
+POLL_SECONDS = 2.0
+HEARTBEAT_SECONDS = 25.0
+RETRY_MILLISECONDS = 5000
+MAX_SUBSCRIBERS = 1000
+
+
+def format_event(event: str, data: dict) -> str:
+    """One SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class VersionBroadcaster:
+    """Watches data_versions of one database and fans changes out to subscribers"""
+
+    def __init__(self, db_path: str = DB_PATH, poll_seconds: float = POLL_SECONDS,
+                 heartbeat_seconds: float = HEARTBEAT_SECONDS, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._condition = threading.Condition()
+        self._wake = threading.Event()
+        self._versions: Dict[str, int] = {}
+        self._sequence = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def _read_versions(self) -> Dict[str, int]:
+        with get_pool(self.db_path).connection() as conn:
+            versions = data_versions.get_versions(conn)
+        return {name: versions.get(name, 0) for name in EVENT_DATASETS}
+
+    def _publish(self, versions: Dict[str, int]):
+        with self._condition:
+            if versions != self._versions:
+                self._versions = versions
+                self._sequence += 1
+                self._condition.notify_all()
+
+    def _watch(self):
+        while True:
+            with self._condition:
+                while not self.subscribers:
+                    self._condition.wait()
+            try:
+                self._publish(self._read_versions())
+            except Exception as e:
+                logging.error(f"Event stream version poll failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def wake(self):
+        """Poll now instead of at the end of the interval"""
+        self._wake.set()
+
+    def subscribe(self) -> bool:
+        """Register a subscriber; False when the limit is reached"""
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            if not self.subscribers:
+                # The watcher pauses without subscribers, so catch up before the snapshot
+                self._versions = self._read_versions()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._watch, name='event-stream', daemon=True)
+                    self._thread.start()
+            self.subscribers += 1
+            self._condition.notify_all()
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def snapshot(self) -> Tuple[int, Dict[str, int]]:
+        with self._condition:
+            return self._sequence, self._versions
+
+    def wait(self, sequence: int, timeout: float) -> Tuple[int, Dict[str, int]]:
+        """Block until the versions move past sequence, or the timeout passes"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence != sequence, timeout)
+            return self._sequence, self._versions
+
+    def stream(self) -> Iterator[str]:
+        """SSE messages for one subscriber: a snapshot, then one event per changed dataset
+
+        The caller must have subscribed; the generator never ends on its own.
+        """
+        sequence, versions = self.snapshot()
+        yield f"retry: {RETRY_MILLISECONDS}\n"
+        yield format_event('versions', versions)
+        while True:
+            sequence, latest = self.wait(sequence, self.heartbeat_seconds)
+            changed = [name for name in EVENT_DATASETS if latest.get(name) != versions.get(name)]
+            for name in changed:
+                yield format_event(name, {'dataset': name, 'version': latest[name]})
+            if not changed:
+                yield ": heartbeat\n\n"  # keeps proxies open and notices closed connections
+            versions = latest
+
+
+_broadcasters: Dict[str, VersionBroadcaster] = {}
+_broadcasters_lock = threading.Lock()
+
+
+def get_broadcaster(db_path: str = DB_PATH) -> VersionBroadcaster:
+    """Get the process-wide broadcaster of a database file"""
+    key = os.path.abspath(db_path)
+    broadcaster = _broadcasters.get(key)
+    if broadcaster is None:
+        with _broadcasters_lock:
+            broadcaster = _broadcasters.get(key)
+            if broadcaster is None:
+                broadcaster = _broadcasters[key] = VersionBroadcaster(db_path)
+    return broadcaster
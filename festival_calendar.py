@@ -0,0 +1,25 @@
+"""
+Tamil Nadu Transport Optimizer - Festival Calendar
+Festival dates and their demand multipliers, shared by every component
+
+The API servers, the daily update scheduler, the backtest and the
+synthetic data generator all read this one calendar, so a festival added
+here changes live forecasts, backtests and generated history alike.
+Keys are ISO dates; 'multiplier' scales the demand of the whole day.
+"""
+
+# Tamil Nadu Festival Calendar
+TAMIL_NADU_FESTIVALS = {
+    '2025-09-01': {'name': 'Vinayaka Chaturthi', 'multiplier': 1.6, 'type': 'major'},
+    '2025-09-17': {'name': 'Onam', 'multiplier': 1.4, 'type': 'regional'},
+    '2025-10-02': {'name': 'Gandhi Jayanti', 'multiplier': 1.3, 'type': 'national'},
+    '2025-10-12': {'name': 'Vijaya Dashami', 'multiplier': 1.7, 'type': 'major'},
+    '2025-11-01': {'name': 'Diwali', 'multiplier': 1.8, 'type': 'major'},
+    '2025-11-15': {'name': 'Karthikai Deepam', 'multiplier': 1.5, 'type': 'regional'},
+    '2025-12-25': {'name': 'Christmas', 'multiplier': 1.4, 'type': 'national'},
+    '2026-01-14': {'name': 'Thai Pusam', 'multiplier': 1.6, 'type': 'regional'},
+    '2026-01-26': {'name': 'Republic Day', 'multiplier': 1.3, 'type': 'national'},
+    '2026-02-16': {'name': 'Maha Shivratri', 'multiplier': 1.5, 'type': 'major'},
+    '2026-03-14': {'name': 'Holi', 'multiplier': 1.4, 'type': 'national'},
+    '2026-04-14': {'name': 'Tamil New Year', 'multiplier': 1.7, 'type': 'regional'},
+}
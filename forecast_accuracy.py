@@ -0,0 +1,166 @@
+"""
+Tamil Nadu Transport Optimizer - Forecast Accuracy Tracker
+Running MAPE, bias and RMSE of predictions against actuals
+
+forecast_accuracy holds error sums per route, hour, day type (weekday,
+weekend, festival) and variant, so any grouping of the metrics is a small
+aggregate over at most 24 x 3 rows per route. Besides the forecast as
+stored, two counterfactual variants divide out the weather and festival
+multipliers, which shows whether those adjustments reduce the error.
+
+When an actual row lands, a trigger queues its route/date/hour in
+forecast_accuracy_pending; sync(), run by the writers of actuals and the
+daily update, scores the queued cells against the matching predicted rows. Each scored cell is kept in forecast_errors so a
+corrected actual replaces its old contribution instead of adding another.
+The tables and triggers are created by migration 10.
+"""
+
+import math
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+VARIANTS = ('forecast', 'without_weather', 'without_festival')
+GROUP_BY = ('route', 'hour', 'day_type')
+
+_METRIC_COLUMNS = ('samples', 'pct_samples', 'error_sum', 'abs_error_sum',
+                   'abs_pct_error_sum', 'sq_error_sum')
+
+
+def day_type_of(day_text: str, festival_factor: float) -> str:
+    if festival_factor > 1.0:
+        return 'festival'
+    return 'weekend' if date.fromisoformat(day_text).weekday() >= 5 else 'weekday'
+
+
+def _contributions(actual: int, predicted: int, weather_factor: float,
+                   festival_factor: float) -> Dict[str, Tuple[float, ...]]:
+    """Metric increments of one scored cell for each variant"""
+    candidates = {
+        'forecast': predicted,
+        'without_weather': predicted / weather_factor if weather_factor else predicted,
+        'without_festival': predicted / festival_factor if festival_factor else predicted
+    }
+    result = {}
+    for variant, value in candidates.items():
+        error = value - actual
+        pct = abs(error) / actual if actual > 0 else 0.0
+        result[variant] = (1, 1 if actual > 0 else 0, error, abs(error), pct, error * error)
+    return result
+
+
+def sync(conn: sqlite3.Connection) -> int:
+    """Score queued actuals against their predictions
+
+    Joins the caller's transaction if one is open; otherwise takes the
+    write lock and commits. Returns the number of cells scored.
+    """
+    if conn.execute("SELECT 1 FROM forecast_accuracy_pending LIMIT 1").fetchone() is None:
+        return 0
+
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("""
+        SELECT q.route_id, q.date_recorded, q.hour,
+               a.passenger_count, p.passenger_count, p.weather_factor, p.festival_factor,
+               e.day_type, e.actual, e.predicted, e.weather_factor, e.festival_factor
+        FROM forecast_accuracy_pending q
+        JOIN passenger_demand a
+          ON a.route_id = q.route_id AND a.date_recorded = q.date_recorded
+         AND a.hour = q.hour AND a.is_predicted = 0
+        JOIN passenger_demand p
+          ON p.route_id = q.route_id AND p.date_recorded = q.date_recorded
+         AND p.hour = q.hour AND p.is_predicted = 1
+        LEFT JOIN forecast_errors e
+          ON e.route_id = q.route_id AND e.date_recorded = q.date_recorded AND e.hour = q.hour
+        """).fetchall()
+
+        deltas: Dict[Tuple[str, int, str, str], List[float]] = defaultdict(lambda: [0.0] * 6)
+        scored = []
+        for (route_id, day_text, hour, actual, predicted, weather, festival,
+             old_day_type, old_actual, old_predicted, old_weather, old_festival) in rows:
+            weather = weather or 1.0
+            festival = festival or 1.0
+            day_type = day_type_of(day_text, festival)
+
+            if old_day_type is not None:
+                for variant, values in _contributions(old_actual, old_predicted,
+                                                      old_weather, old_festival).items():
+                    totals = deltas[(route_id, hour, old_day_type, variant)]
+                    for i, value in enumerate(values):
+                        totals[i] -= value
+            for variant, values in _contributions(actual, predicted, weather, festival).items():
+                totals = deltas[(route_id, hour, day_type, variant)]
+                for i, value in enumerate(values):
+                    totals[i] += value
+            scored.append((route_id, day_text, hour, day_type, actual, predicted, weather, festival))
+
+        conn.executemany("""
+        INSERT INTO forecast_accuracy
+        (route_id, hour, day_type, variant, samples, pct_samples, error_sum, abs_error_sum,
+         abs_pct_error_sum, sq_error_sum)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(route_id, hour, day_type, variant) DO UPDATE SET
+            samples = samples + excluded.samples,
+            pct_samples = pct_samples + excluded.pct_samples,
+            error_sum = error_sum + excluded.error_sum,
+            abs_error_sum = abs_error_sum + excluded.abs_error_sum,
+            abs_pct_error_sum = abs_pct_error_sum + excluded.abs_pct_error_sum,
+            sq_error_sum = sq_error_sum + excluded.sq_error_sum
+        """, [key + tuple(values) for key, values in deltas.items()])
+        conn.executemany("""
+        INSERT OR REPLACE INTO forecast_errors
+        (route_id, date_recorded, hour, day_type, actual, predicted, weather_factor, festival_factor)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, scored)
+
+        # Actuals without a prediction have nothing to score
+        conn.execute("DELETE FROM forecast_accuracy_pending")
+        if own_transaction:
+            conn.commit()
+    except Exception:
+        if own_transaction:
+            conn.rollback()
+        raise
+    return len(scored)
+
+
+def _metrics(samples, pct_samples, error_sum, abs_error_sum, abs_pct_error_sum, sq_error_sum) -> dict:
+    if not samples:
+        return {'samples': 0, 'mape': None, 'bias': None, 'rmse': None}
+    return {
+        'samples': int(samples),
+        'mape': round(abs_pct_error_sum / pct_samples * 100, 2) if pct_samples else None,
+        'bias': round(error_sum / samples, 2),
+        'rmse': round(math.sqrt(max(sq_error_sum, 0) / samples), 2)
+    }
+
+
+def accuracy_report(conn: sqlite3.Connection, route_id: Optional[str] = None,
+                    group_by: str = 'route', day_type: Optional[str] = None) -> List[dict]:
+    """Metrics for every variant, grouped by route, hour or day type
+
+    Read-only: cells are scored by the writers' sync().
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
+    group_column = {'route': 'route_id', 'hour': 'hour', 'day_type': 'day_type'}[group_by]
+    sums = ', '.join(f"SUM({column})" for column in _METRIC_COLUMNS)
+    query = f"SELECT {group_column}, variant, {sums} FROM forecast_accuracy WHERE 1 = 1"
+    params = []
+    if route_id:
+        query += " AND route_id = ?"
+        params.append(route_id)
+    if day_type:
+        query += " AND day_type = ?"
+        params.append(day_type)
+    query += f" GROUP BY {group_column}, variant ORDER BY {group_column}"
+
+    groups: Dict[object, dict] = {}
+    for key, variant, *values in conn.execute(query, params):
+        groups.setdefault(key, {group_by: key})[variant] = _metrics(*values)
+    return list(groups.values())
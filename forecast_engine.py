@@ -0,0 +1,244 @@
+"""
+Tamil Nadu Transport Optimizer - Vectorized Forecast Engine
+Computes the full day x route x hour demand, schedule and cost matrices in one pass
+
+Base demand patterns, market days, festival and weather multipliers are held
+as NumPy arrays, so a forecast for thousands of routes and several days is a
+handful of array operations instead of a nested Python loop per cell. The
+multipliers are applied in the same order, with the same truncation after
+each step, as the per-cell reference implementation in
+TransportDataUpdater.predict_tomorrow_demand, so results match exactly for
+the same variation draws.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BUS_CAPACITY = 45
+MARKET_MULTIPLIER = 1.3
+
+# Cost parameters (rupees)
+FUEL_PER_KM = 8.5
+DRIVER_PER_HOUR = 120
+MAINTENANCE_PER_KM = 3.2
+
+# Demand ladder used by calculate_optimal_schedule: upper bound -> (buses, frequency)
+SCHEDULE_BOUNDS = np.array([0, 20, 45, 90, 135, 200, 300, 400])
+SCHEDULE_BUSES = np.array([0, 1, 1, 2, 2, 3, 4, 5])
+SCHEDULE_FREQUENCY = np.array([120, 90, 60, 45, 30, 25, 20, 15])
+
+WEEKDAY, WEEKEND = 0, 1
+
+
+def schedule_arrays(demand: np.ndarray, bounds: np.ndarray = SCHEDULE_BOUNDS,
+                    bus_ladder: np.ndarray = SCHEDULE_BUSES,
+                    frequency_ladder: np.ndarray = SCHEDULE_FREQUENCY,
+                    max_buses: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized calculate_optimal_schedule: buses and frequency for every cell
+
+    The ladder arguments default to calculate_optimal_schedule's thresholds;
+    backtests pass alternatives.
+    """
+    demand = np.asarray(demand, dtype=np.int64)
+    bounds = np.asarray(bounds)
+    band = np.searchsorted(bounds, demand, side='left')
+    peak = band >= len(bounds)
+    band = np.minimum(band, len(bounds) - 1)
+
+    buses = np.asarray(bus_ladder)[band]
+    frequency = np.asarray(frequency_ladder)[band]
+
+    # Above the top bound: scale buses with demand, shorten the headway
+    peak_buses = np.clip((demand + BUS_CAPACITY - 1) // BUS_CAPACITY, 3, max_buses)
+    peak_frequency = np.maximum(10, 60 // np.maximum(1, peak_buses - 2))
+    buses = np.where(peak, peak_buses, buses)
+    frequency = np.where(peak, peak_frequency, frequency)
+    return buses, frequency
+
+
+def hourly_cost_array(buses: np.ndarray, distance: np.ndarray, frequency: np.ndarray,
+                      fuel_per_km: float = FUEL_PER_KM,
+                      driver_per_hour: float = DRIVER_PER_HOUR,
+                      maintenance_per_km: float = MAINTENANCE_PER_KM) -> np.ndarray:
+    """Vectorized calculate_hourly_cost; distance broadcasts against buses"""
+    buses = np.asarray(buses, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+    frequency = np.asarray(frequency, dtype=np.float64)
+
+    with np.errstate(divide='ignore'):
+        trips_per_hour = np.where(frequency > 0, 60 / frequency, 0.0)
+    fuel_cost = distance * fuel_per_km * trips_per_hour * buses
+    driver_cost = driver_per_hour * buses
+    maintenance_cost = distance * maintenance_per_km * trips_per_hour * buses
+    return np.where(buses > 0, fuel_cost + driver_cost + maintenance_cost, 0.0)
+
+
+def seats_array(buses: np.ndarray, frequency: np.ndarray, capacity=BUS_CAPACITY) -> np.ndarray:
+    """Seats offered per hour in each direction
+
+    Every departure is one bus of `capacity` seats and a terminal dispatches
+    every frequency minutes while buses run, so an hour offers
+    60 / frequency * capacity seats. The optimizer, the timetable and the
+    simulator all use this definition.
+    """
+    frequency = np.asarray(frequency, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        departures = np.where(frequency > 0, 60 / frequency, 0.0)
+    return np.where(np.asarray(buses) > 0, departures * capacity, 0.0)
+
+
+def utilization_array(demand: np.ndarray, buses: np.ndarray, frequency: np.ndarray,
+                      capacity: int = BUS_CAPACITY) -> np.ndarray:
+    """Share of offered seats used, capped at 1.0 (0 where no bus runs)"""
+    seats = seats_array(buses, frequency, capacity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.minimum(demand / seats, 1.0)
+    return np.where(seats > 0, ratio, 0.0)
+
+
+@dataclass
+class Forecast:
+    """Demand and schedule matrices, indexed [day, route, hour]"""
+    dates: List[date]
+    route_ids: List[str]
+    demand: np.ndarray
+    buses: np.ndarray
+    frequency: np.ndarray
+    cost: np.ndarray
+    utilization: np.ndarray
+    weather_factors: np.ndarray
+    festival_factors: np.ndarray
+    market_factors: np.ndarray
+
+    def _keys(self) -> Tuple[List[str], List[date], List[int], List[int]]:
+        """Route id, date, weekday and hour columns in cell order"""
+        days, routes = len(self.dates), len(self.route_ids)
+        route_col = np.tile(np.repeat(np.arange(routes), 24), days)
+        day_col = np.repeat(np.arange(days), routes * 24)
+        hour_col = np.tile(np.arange(24), days * routes)
+        route_ids = [self.route_ids[i] for i in route_col.tolist()]
+        dates = [self.dates[i] for i in day_col.tolist()]
+        weekdays = [d.weekday() for d in dates]
+        return route_ids, dates, weekdays, hour_col.tolist()
+
+    def schedule_rows(self) -> Iterator[tuple]:
+        """Rows for daily_schedule_predictions"""
+        route_ids, dates, _, hours = self._keys()
+        return zip(route_ids, dates, hours,
+                   self.demand.ravel().tolist(), self.buses.ravel().tolist(),
+                   self.frequency.ravel().tolist(), self.cost.ravel().tolist(),
+                   self.utilization.ravel().tolist())
+
+    def demand_rows(self, confidence: Sequence[float]) -> Iterator[tuple]:
+        """Predicted rows for passenger_demand; confidence is given per day"""
+        route_ids, dates, weekdays, hours = self._keys()
+        cells = len(self.route_ids) * 24
+        weather = np.repeat(self.weather_factors, cells).tolist()
+        festival = np.repeat(self.festival_factors, cells).tolist()
+        market = np.repeat(self.market_factors, 24, axis=1).ravel().tolist()
+        confidence = np.repeat(np.asarray(confidence, dtype=np.float64), cells).tolist()
+        return zip(route_ids, hours, weekdays, self.demand.ravel().tolist(), dates,
+                   [True] * len(hours), weather, festival, market, confidence)
+
+
+class ForecastEngine:
+    """Holds per-route demand inputs as arrays and forecasts all routes at once"""
+
+    def __init__(self, route_ids: Sequence[str], weekday_patterns: np.ndarray,
+                 weekend_patterns: np.ndarray, distances: Sequence[float],
+                 market_days: Dict[str, Iterable[int]],
+                 festivals: Dict[str, dict], market_multiplier: float = MARKET_MULTIPLIER):
+        self.route_ids = list(route_ids)
+        self.route_index = {route_id: i for i, route_id in enumerate(self.route_ids)}
+        # patterns[route, day_type, hour]
+        self.patterns = np.stack([np.asarray(weekday_patterns, dtype=np.int64),
+                                  np.asarray(weekend_patterns, dtype=np.int64)], axis=1)
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.market_mask = np.zeros((len(self.route_ids), 7), dtype=bool)
+        for route_id, days in market_days.items():
+            if route_id in self.route_index:
+                self.market_mask[self.route_index[route_id], list(days)] = True
+        self.festivals = festivals
+        self.market_multiplier = market_multiplier
+
+    def festival_factors(self, dates: Sequence[date]) -> np.ndarray:
+        """Festival multiplier for each date (1.0 on regular days)"""
+        return np.array([self.festivals.get(d.strftime('%Y-%m-%d'), {}).get('multiplier', 1.0)
+                         for d in dates], dtype=np.float64)
+
+    def market_factors(self, dates: Sequence[date]) -> np.ndarray:
+        """Market multiplier per [day, route]"""
+        weekdays = [d.weekday() for d in dates]
+        return np.where(self.market_mask[:, weekdays].T, self.market_multiplier, 1.0)
+
+    def base_demand(self, dates: Sequence[date]) -> np.ndarray:
+        """Base hourly pattern per [day, route, hour] for each date's day type"""
+        day_types = np.array([WEEKEND if d.weekday() >= 5 else WEEKDAY for d in dates])
+        return self.patterns[:, day_types, :].transpose(1, 0, 2)
+
+    def demand_matrix(self, dates: Sequence[date], weather_factors: Sequence[float],
+                      festival_factors: Optional[Sequence[float]] = None,
+                      variation: Optional[np.ndarray] = None,
+                      variation_range: Tuple[float, float] = (0.85, 1.15),
+                      rng: Optional[np.random.Generator] = None,
+                      base: Optional[np.ndarray] = None,
+                      market_factors: Optional[np.ndarray] = None) -> np.ndarray:
+        """Predicted passengers per [day, route, hour]
+
+        Each multiplier is followed by truncation to whole passengers, exactly
+        like the per-cell loop. Pass `variation` to use fixed draws; otherwise
+        they are sampled uniformly from `variation_range`. `base` replaces the
+        calendar profiles (e.g. with a fitted model's forecast) and
+        `market_factors` the market-day calendar.
+        """
+        weather = np.asarray(weather_factors, dtype=np.float64)[:, None, None]
+        if festival_factors is None:
+            festival_factors = self.festival_factors(dates)
+        festival = np.asarray(festival_factors, dtype=np.float64)[:, None, None]
+        if market_factors is None:
+            market_factors = self.market_factors(dates)
+        market = np.asarray(market_factors, dtype=np.float64)[:, :, None]
+
+        shape = (len(dates), len(self.route_ids), 24)
+        if variation is None:
+            rng = rng or np.random.default_rng()
+            variation = rng.uniform(variation_range[0], variation_range[1], size=shape)
+
+        if base is None:
+            base = self.base_demand(dates)
+        demand = np.asarray(base, dtype=np.float64)
+        demand = np.floor(demand * weather)
+        demand = np.floor(demand * festival)
+        demand = np.floor(demand * market)
+        demand = np.floor(demand * variation)
+        return np.maximum(demand, 0).astype(np.int64)
+
+    def forecast(self, dates: Sequence[date], weather_factors: Sequence[float],
+                 festival_factors: Optional[Sequence[float]] = None, **kwargs) -> Forecast:
+        """Demand, schedule, cost and utilization for every route, hour and date"""
+        dates = list(dates)
+        if festival_factors is None:
+            festival_factors = self.festival_factors(dates)
+        market_factors = kwargs.pop('market_factors', None)
+        if market_factors is None:
+            market_factors = self.market_factors(dates)
+        demand = self.demand_matrix(dates, weather_factors, festival_factors,
+                                    market_factors=market_factors, **kwargs)
+        buses, frequency = schedule_arrays(demand)
+        cost = hourly_cost_array(buses, self.distances[None, :, None], frequency)
+
+        return Forecast(
+            dates=dates,
+            route_ids=self.route_ids,
+            demand=demand,
+            buses=buses,
+            frequency=frequency,
+            cost=cost,
+            utilization=utilization_array(demand, buses, frequency),
+            weather_factors=np.asarray(weather_factors, dtype=np.float64),
+            festival_factors=np.asarray(festival_factors, dtype=np.float64),
+            market_factors=np.asarray(market_factors, dtype=np.float64)
+        )
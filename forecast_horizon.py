@@ -0,0 +1,223 @@
+"""
+Tamil Nadu Transport Optimizer - Multi-Day Forecast Horizon
+Rolling 14-30 day demand and schedule forecasts for depot planning
+
+All days of the horizon are forecast in one batched pass of the vectorized
+engine, using the festival and market calendars. Beyond tomorrow there is
+no weather forecast, so horizon days use a neutral weather factor unless
+one is supplied, and no random variation: they are expected values.
+
+forecast_inputs keeps a hash of the inputs behind every stored route/day
+forecast. A refresh recomputes the hashes first and only regenerates and
+rewrites the route/days whose inputs changed, together with the other
+routes of the same depot, which share its fleet. Days written by the daily
+update (which has a real weather forecast) are never overwritten here.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import data_versions
+from bulk_writer import BulkWriter
+from depot_allocation import allocate_forecasts
+from forecast_engine import MARKET_MULTIPLIER
+from route_registry import RouteRegistry
+from schedule_optimizer import optimize_forecasts
+
+# Bump when the forecasting logic changes so every stored day is regenerated
+MODEL_VERSION = 'engine-v3'
+
+MAX_HORIZON_DAYS = 30
+DEFAULT_HORIZON_DAYS = 14
+
+SOURCE_DAILY = 'daily'
+SOURCE_HORIZON = 'horizon'
+
+
+@dataclass
+class HorizonResult:
+    start_date: date
+    days: int
+    regenerated: int
+    unchanged: int
+
+
+def horizon_confidence(days_ahead: int, is_festival: bool) -> float:
+    """Confidence decays with lead time; festival days are less certain"""
+    base = 0.6 if is_festival else 0.8
+    return max(0.5, round(base - 0.01 * (days_ahead - 1), 2))
+
+
+def record_daily_inputs(conn, route_ids: Sequence[str], prediction_date: date,
+                        weather_factor: float, festival_multiplier: float):
+    """Mark a date as forecast by the daily update so horizon runs leave it alone"""
+    input_hash = _hash(f"{MODEL_VERSION}|daily|{weather_factor}|{festival_multiplier}")
+    conn.executemany("""
+    INSERT OR REPLACE INTO forecast_inputs (route_id, prediction_date, input_hash, source)
+    VALUES (?, ?, ?, ?)
+    """, [(route_id, prediction_date, input_hash, SOURCE_DAILY) for route_id in route_ids])
+
+
+def _hash(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class HorizonForecaster:
+    """Batched multi-day forecasts over all registered routes"""
+
+    def __init__(self, registry: RouteRegistry, festivals: Dict[str, dict],
+                 market_multiplier: float = MARKET_MULTIPLIER, depot_fleet: Optional[int] = None):
+        self.registry = registry
+        self.festivals = festivals
+        self.market_multiplier = market_multiplier
+        self.depot_fleet = depot_fleet
+
+    def input_hashes(self, dates: Sequence[date], weather_factors: Sequence[float]) -> Dict[Tuple[str, date], str]:
+        """Hash of everything that determines each route/day forecast"""
+        engine = self.registry.forecast_engine(self.festivals, self.market_multiplier)
+        festival = engine.festival_factors(dates)
+        market = engine.market_factors(dates)
+
+        # Per route, the inputs that do not depend on the date
+        route_keys = {}
+        for route in self.registry:
+            depot = self.registry.depot(route.depot_id) if route.depot_id else None
+            fleet = f"{route.current_buses}|{depot.fleet_size if depot else None}"
+            route_keys[route.id] = (
+                _hash(f"{route.distance}|{fleet}|{route.weekday_profile}"),
+                _hash(f"{route.distance}|{fleet}|{route.weekend_profile}")
+            )
+
+        hashes = {}
+        for d, target_date in enumerate(dates):
+            day_inputs = (f"{MODEL_VERSION}|{festival[d]}|{weather_factors[d]}|{self.market_multiplier}"
+                          f"|{self.depot_fleet}")
+            weekend = target_date.weekday() >= 5
+            for r, route_id in enumerate(engine.route_ids):
+                profile_key = route_keys[route_id][1 if weekend else 0]
+                hashes[(route_id, target_date)] = _hash(f"{profile_key}|{market[d, r]}|{day_inputs}")
+        return hashes
+
+    def stale_cells(self, conn, hashes: Dict[Tuple[str, date], str],
+                    start: date, end: date) -> Set[Tuple[str, date]]:
+        """Route/days with no stored forecast or a horizon forecast from other inputs"""
+        stored = {}
+        for route_id, prediction_date, input_hash, source in conn.execute("""
+        SELECT route_id, prediction_date, input_hash, source
+        FROM forecast_inputs
+        WHERE prediction_date BETWEEN ? AND ?
+        """, (start, end)):
+            stored[(route_id, date.fromisoformat(prediction_date))] = (input_hash, source)
+
+        stale = set()
+        for key, input_hash in hashes.items():
+            previous = stored.get(key)
+            if previous is None or (previous[1] == SOURCE_HORIZON and previous[0] != input_hash):
+                stale.add(key)
+
+        # Routes of a depot share one fleet, so a change on one route can move
+        # buses on the others: regenerate the whole depot day
+        for route_id, day in list(stale):
+            route = self.registry.get(route_id)
+            depot = self.registry.depot(route.depot_id) if route and route.depot_id else None
+            for partner in depot.route_ids if depot else ():
+                previous = stored.get((partner, day))
+                if (partner, day) in hashes and (previous is None or previous[1] == SOURCE_HORIZON):
+                    stale.add((partner, day))
+        return stale
+
+    def refresh(self, conn, days: int = DEFAULT_HORIZON_DAYS, start: Optional[date] = None,
+                weather_factors: Optional[Dict[date, float]] = None) -> HorizonResult:
+        """Forecast `days` days from `start` (default tomorrow), writing only changed days
+
+        Runs in the caller's transaction on `conn`; the caller commits.
+        """
+        days = max(1, min(days, MAX_HORIZON_DAYS))
+        start = start or date.today() + timedelta(days=1)
+        dates = [start + timedelta(days=offset) for offset in range(days)]
+        weather_factors = weather_factors or {}
+        weather = [weather_factors.get(d, 1.0) for d in dates]
+
+        hashes = self.input_hashes(dates, weather)
+        stale = self.stale_cells(conn, hashes, dates[0], dates[-1])
+        if not stale:
+            return HorizonResult(start, days, 0, len(hashes))
+
+        engine = self.registry.forecast_engine(self.festivals, self.market_multiplier)
+        festival = engine.festival_factors(dates)
+        forecast = engine.forecast(dates, weather, festival,
+                                   variation=np.ones((len(dates), len(engine.route_ids), 24)))
+        forecast, = allocate_forecasts(optimize_forecasts([forecast], self.registry, self.depot_fleet),
+                                       self.registry, self.depot_fleet)
+
+        # Keep only the rows of stale route/days; cells are ordered [day, route, hour]
+        keep = np.array([(route_id, d) in stale for d in dates for route_id in engine.route_ids])
+        keep = np.repeat(keep, 24)
+        confidence = [horizon_confidence((d - date.today()).days, festival[offset] > 1.0)
+                      for offset, d in enumerate(dates)]
+
+        schedule_rows = [row for row, wanted in zip(forecast.schedule_rows(), keep) if wanted]
+        demand_rows = [row for row, wanted in zip(forecast.demand_rows(confidence), keep) if wanted]
+
+        writer = BulkWriter(conn)
+        writer.write("""
+        INSERT OR REPLACE INTO daily_schedule_predictions
+        (route_id, prediction_date, hour, predicted_passengers, recommended_buses,
+         frequency_minutes, cost_per_hour, utilization_rate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, schedule_rows, single_transaction=True)
+        writer.write("""
+        INSERT OR REPLACE INTO passenger_demand
+        (route_id, hour, day_of_week, passenger_count, date_recorded,
+         is_predicted, weather_factor, festival_factor, market_factor, confidence_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, demand_rows, single_transaction=True)
+        conn.executemany("""
+        INSERT OR REPLACE INTO forecast_inputs (route_id, prediction_date, input_hash, source)
+        VALUES (?, ?, ?, ?)
+        """, [(route_id, d, hashes[(route_id, d)], SOURCE_HORIZON) for route_id, d in stale])
+        data_versions.bump_version(conn, data_versions.PREDICTIONS)
+
+        logging.info(f"Horizon forecast {dates[0]}..{dates[-1]}: regenerated {len(stale)} route-days, "
+                     f"{len(hashes) - len(stale)} unchanged")
+        return HorizonResult(start, days, len(stale), len(hashes) - len(stale))
+
+
+def read_horizon(conn, route_id: str, start: date, days: int) -> List[dict]:
+    """Stored daily totals and hourly demand for one route over a date range"""
+    end = start + timedelta(days=days - 1)
+    by_date: Dict[str, dict] = {}
+    for prediction_date, hour, passengers, buses, cost in conn.execute("""
+    SELECT prediction_date, hour, predicted_passengers, recommended_buses, cost_per_hour
+    FROM daily_schedule_predictions
+    WHERE route_id = ? AND prediction_date BETWEEN ? AND ?
+    ORDER BY prediction_date, hour
+    """, (route_id, start, end)):
+        day = by_date.setdefault(prediction_date, {
+            'date': prediction_date,
+            'hourly_demand': [0] * 24,
+            'hourly_buses': [0] * 24,
+            'daily_cost': 0.0
+        })
+        day['hourly_demand'][hour] = passengers
+        day['hourly_buses'][hour] = buses
+        day['daily_cost'] += cost
+
+    result = []
+    for day in by_date.values():
+        demand = day['hourly_demand']
+        peak_hour = int(np.argmax(demand))
+        day.update({
+            'total_passengers': sum(demand),
+            'peak_hour': f"{peak_hour:02d}:00",
+            'peak_passengers': demand[peak_hour],
+            'max_buses': max(day['hourly_buses']),
+            'daily_cost': round(day['daily_cost'], 2)
+        })
+        result.append(day)
+    return result
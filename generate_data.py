@@ -1,70 +1,97 @@
 
-import sqlite3
 import random
 from datetime import datetime, timedelta
 import json
 
-def generate_realistic_data():
+import demand_rollup
+from bulk_writer import BulkWriter
+from db_pool import DB_PATH, get_pool
+from route_registry import get_registry
+
+# Variation observed on each route; base demand profiles come from the route registry
+ROUTE_VARIATION = {
+    'tp_pc': {  # Tiruppur to Pollachi - Industrial + Agricultural route
+        'seasonal_variation': 0.15,  # 15% seasonal variation
+        'special_events': {
+            'festival_days': 1.5,  # 50% increase on festival days
+            'market_days': 1.3     # 30% increase on market days
+        }
+    },
+    'tp_cb': {  # Tiruppur to Coimbatore - Major commercial route
+        'seasonal_variation': 0.12,
+        'special_events': {
+            'festival_days': 1.6,
+            'market_days': 1.4
+        }
+    },
+    'tp_sl': {  # Tiruppur to Salem - Mixed commercial/industrial route
+        'seasonal_variation': 0.18,
+        'special_events': {
+            'festival_days': 1.4,
+            'market_days': 1.25
+        }
+    }
+}
+
+DEFAULT_VARIATION = {
+    'seasonal_variation': 0.15,
+    'special_events': {
+        'festival_days': 1.5,
+        'market_days': 1.3
+    }
+}
+
+def generate_realistic_data(db_path=DB_PATH):
     """
     Generate realistic passenger demand data for the Tamil Nadu transport routes
     """
-    conn = sqlite3.connect('transport_optimizer.db')
+    pool = get_pool(db_path)
+    conn = pool.acquire()
     cursor = conn.cursor()
-
-    # Route patterns based on real-world observations
-    # Peak patterns: morning rush (7-9 AM), evening rush (5-7 PM)
-    route_patterns = {
-        'tp_pc': {  # Tiruppur to Pollachi - Industrial + Agricultural route
-            'base_pattern': [45, 35, 25, 20, 30, 85, 180, 450, 380, 220, 180, 160, 140, 120, 110, 95, 280, 520, 420, 290, 180, 120, 80, 60],
-            'weekend_factor': 0.6,  # 60% of weekday demand on weekends
-            'seasonal_variation': 0.15,  # 15% seasonal variation
-            'special_events': {
-                'festival_days': 1.5,  # 50% increase on festival days
-                'market_days': 1.3     # 30% increase on market days
-            }
-        },
-        'tp_cb': {  # Tiruppur to Coimbatore - Major commercial route
-            'base_pattern': [60, 45, 30, 25, 40, 120, 250, 680, 540, 320, 260, 220, 190, 170, 150, 130, 380, 720, 600, 420, 260, 180, 110, 85],
-            'weekend_factor': 0.7,  # 70% of weekday demand
-            'seasonal_variation': 0.12,
-            'special_events': {
-                'festival_days': 1.6,
-                'market_days': 1.4
-            }
-        },
-        'tp_sl': {  # Tiruppur to Salem - Mixed commercial/industrial route
-            'base_pattern': [50, 40, 28, 22, 35, 100, 210, 520, 450, 280, 230, 190, 170, 150, 130, 115, 340, 580, 480, 350, 220, 150, 95, 70],
-            'weekend_factor': 0.65,
-            'seasonal_variation': 0.18,
-            'special_events': {
-                'festival_days': 1.4,
-                'market_days': 1.25
-            }
-        }
-    }
+    registry = get_registry(db_path)
 
     # Generate data for the last 90 days
     end_date = datetime.now()
     start_date = end_date - timedelta(days=90)
 
-    # Clear existing data
-    cursor.execute("DELETE FROM passenger_demand")
+    writer = BulkWriter(conn)
+
+    with writer.relaxed_sync():
+        # Clear existing data
+        cursor.execute("DELETE FROM passenger_demand")
 
+        writer.write("""
+        INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
+        VALUES (?, ?, ?, ?, ?)
+        """, demand_rows(registry, start_date, end_date))
+
+        # Generate some sample optimization results
+        writer.write("""
+        INSERT INTO optimization_results 
+        (route_id, optimization_date, current_cost, optimized_cost, cost_savings, fuel_savings, recommendations)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, sample_optimization_rows(registry.route_ids()))
+
+        demand_rollup.sync(conn)
+
+    pool.release(conn)
+
+    print(f"✅ Generated realistic passenger data for {(end_date - start_date).days + 1} days")
+
+def demand_rows(registry, start_date, end_date):
+    """Yield one passenger_demand row per route, day and hour"""
     current_date = start_date
     while current_date <= end_date:
         day_of_week = current_date.weekday()  # 0 = Monday, 6 = Sunday
-        is_weekend = day_of_week >= 5  # Saturday and Sunday
 
-        for route_id, pattern_data in route_patterns.items():
-            base_pattern = pattern_data['base_pattern']
-            weekend_factor = pattern_data['weekend_factor']
+        for route in registry:
+            # Weekday or weekend profile for the day
+            base_pattern = route.profile(day_of_week)
+            pattern_data = ROUTE_VARIATION.get(route.id, DEFAULT_VARIATION)
             seasonal_variation = pattern_data['seasonal_variation']
 
             for hour, base_passengers in enumerate(base_pattern):
-                # Apply weekend reduction
                 passengers = base_passengers
-                if is_weekend:
-                    passengers = int(passengers * weekend_factor)
 
                 # Add seasonal variation
                 seasonal_factor = 1 + (random.random() - 0.5) * seasonal_variation
@@ -84,28 +111,13 @@ def generate_realistic_data():
                 # Ensure non-negative
                 passengers = max(0, passengers)
 
-                # Insert into database
-                cursor.execute("""
-                INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
-                VALUES (?, ?, ?, ?, ?)
-                """, (route_id, hour, day_of_week, passengers, current_date.date()))
+                yield (route.id, hour, day_of_week, passengers, current_date.date())
 
         current_date += timedelta(days=1)
 
-    conn.commit()
-
-    # Generate some sample optimization results
-    generate_sample_optimization_results(cursor)
-    conn.commit()
-    conn.close()
-
-    print(f"✅ Generated realistic passenger data for {(end_date - start_date).days + 1} days")
-
-def generate_sample_optimization_results(cursor):
+def sample_optimization_rows(routes):
     """Generate sample optimization results for demonstration"""
 
-    routes = ['tp_pc', 'tp_cb', 'tp_sl']
-
     # Generate results for last 30 days
     for days_back in range(30):
         date = datetime.now() - timedelta(days=days_back)
@@ -141,11 +153,7 @@ def generate_sample_optimization_results(cursor):
                     'buses_needed': buses
                 })
 
-            cursor.execute("""
-            INSERT INTO optimization_results 
-            (route_id, optimization_date, current_cost, optimized_cost, cost_savings, fuel_savings, recommendations)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (route_id, date.date(), base_cost, optimized_cost, cost_savings, fuel_savings, json.dumps(recommendations)))
+            yield (route_id, date.date(), base_cost, optimized_cost, cost_savings, fuel_savings, json.dumps(recommendations))
 
 if __name__ == '__main__':
     print("🚌 Generating realistic transport data...")
@@ -0,0 +1,276 @@
+"""
+Tamil Nadu Transport Optimizer - Runtime Metrics
+Request, SQLite and daily update timings in the Prometheus text format
+
+Counters and histograms live in per-thread shards: a thread only ever
+writes to its own shard, so recording a value takes no lock. A scrape of
+/metrics sums the shards of all threads; shards of threads that have
+exited are folded into one retired shard, so the thread-per-request dev
+server does not grow the list without bound. SQLite statements are timed
+by the pooled connections (TimedConnection) and labelled by operation
+and table rather than by SQL text, which keeps the series count bounded.
+"""
+
+import bisect
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# Live threads with a shard before a registration folds the exited ones
+FOLD_THRESHOLD = 64
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    kind: str                   # counter or histogram
+    help: str
+    labels: Tuple[str, ...]
+    buckets: Tuple[float, ...] = ()
+
+
+HTTP_REQUESTS = Metric('transport_http_requests_total', 'counter', 'HTTP requests handled',
+                       ('app', 'method', 'endpoint', 'status'))
+HTTP_LATENCY = Metric('transport_http_request_duration_seconds', 'histogram', 'HTTP request latency',
+                      ('app', 'method', 'endpoint'), LATENCY_BUCKETS)
+HTTP_RESPONSE_SIZE = Metric('transport_http_response_size_bytes', 'histogram', 'HTTP response body size',
+                            ('app', 'method', 'endpoint'), SIZE_BUCKETS)
+SQL_DURATION = Metric('transport_sqlite_statement_duration_seconds', 'histogram',
+                      'SQLite statement execution time', ('operation', 'table'), SQL_BUCKETS)
+STAGE_DURATION = Metric('transport_daily_update_stage_duration_seconds', 'histogram',
+                        'Daily update stage duration', ('pipeline', 'stage'), STAGE_BUCKETS)
+
+METRICS = (HTTP_REQUESTS, HTTP_LATENCY, HTTP_RESPONSE_SIZE, SQL_DURATION, STAGE_DURATION)
+
+
+def _merge(totals: dict, shard: dict):
+    """Add one shard's values into totals"""
+    for key, value in shard.copy().items():
+        if isinstance(value, list):
+            cells = totals.get(key)
+            if cells is None:
+                totals[key] = list(value)
+            else:
+                for i, cell in enumerate(value):
+                    cells[i] += cell
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms with lock-free recording"""
+
+    def __init__(self, metrics: Sequence[Metric] = METRICS):
+        self.metrics = {metric.name: metric for metric in metrics}
+        self._local = threading.local()
+        self._threads: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._threads) >= FOLD_THRESHOLD:
+                    self._fold_exited()
+                self._threads.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_exited(self):
+        """Merge the shards of exited threads into the retired shard (lock held)"""
+        live = []
+        for thread, shard in self._threads:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._threads = live
+
+    def inc(self, metric: Metric, labels: Tuple[str, ...], amount: float = 1):
+        shard = self._shard()
+        key = (metric.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, metric: Metric, labels: Tuple[str, ...], value: float):
+        shard = self._shard()
+        key = (metric.name, labels)
+        cells = shard.get(key)
+        if cells is None:
+            # Per-bucket counts, the +Inf overflow, then the running sum
+            cells = shard[key] = [0] * (len(metric.buckets) + 2)
+        cells[bisect.bisect_left(metric.buckets, value)] += 1
+        cells[-1] += value
+
+    def collect(self) -> Dict[tuple, object]:
+        """Totals across all threads, keyed by (metric name, label values)"""
+        with self._lock:
+            self._fold_exited()
+            totals: dict = {}
+            _merge(totals, self._retired)
+            for _, shard in self._threads:
+                _merge(totals, shard)
+        return totals
+
+    def render(self) -> str:
+        """Everything recorded so far, in the Prometheus text exposition format"""
+        totals = self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            series = sorted((labels, value) for (name, labels), value in totals.items() if name == metric.name)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in series:
+                if metric.kind == 'counter':
+                    lines.append(f"{metric.name}{_labels(metric.labels, labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labels, labels, le)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labels, labels)} {float(value[-1])}")
+                lines.append(f"{metric.name}_count{_labels(metric.labels, labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# SQLite statement timing
+
+_OPERATION = re.compile(r'^\s*(\w+)')
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:OR\s+\w+\s+)?(?:IF\s+(?:NOT\s+)?EXISTS\s+)?'
+                    r'(?!ON\b)(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def statement_labels(sql: str) -> Tuple[str, str]:
+    """(operation, table) labels for a statement, e.g. ('SELECT', 'passenger_demand')"""
+    operation = _OPERATION.match(sql)
+    table = _TABLE.search(sql)
+    return (operation.group(1).upper() if operation else '',
+            table.group(1) if table else '')
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records the execution time of each statement"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            registry.observe(SQL_DURATION, statement_labels(sql), time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            registry.observe(SQL_DURATION, statement_labels(sql), time.perf_counter() - started)
+
+    def executescript(self, script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            registry.observe(SQL_DURATION, ('SCRIPT', ''), time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, shortcut executes and commits are timed"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            registry.observe(SQL_DURATION, ('COMMIT', ''), time.perf_counter() - started)
+
+
+# Flask integration
+
+def init_app(app, name: str):
+    """Time every request of a Flask app and serve the registry at /metrics"""
+    # Imported here so pooled connections (which use TimedConnection) don't require flask
+    from flask import Response, g, request
+
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        rule = request.url_rule
+        labels = (name, request.method, rule.rule if rule is not None else '<unmatched>')
+        registry.observe(HTTP_LATENCY, labels, time.perf_counter() - started)
+        # Streamed bodies have no size yet, and measuring one would buffer it
+        size = None if response.is_streamed else response.calculate_content_length()
+        if size is not None:
+            registry.observe(HTTP_RESPONSE_SIZE, labels, size)
+        registry.inc(HTTP_REQUESTS, labels + (str(response.status_code),))
+        return response
+
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(registry.render(), content_type=CONTENT_TYPE))
+
+
+def serve(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics from a background thread, for processes without a Flask app"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
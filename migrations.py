@@ -0,0 +1,613 @@
+"""
+Tamil Nadu Transport Optimizer - Schema Migrations
+Versioned, forward-only schema upgrades tracked with PRAGMA user_version
+
+Each migration runs once, inside its own transaction, and bumps the
+database's user_version so it is never applied again. New migrations are
+appended to MIGRATIONS with the next version number. A migration carries
+its own SQL instead of calling the modules that use its tables, so later
+changes to those modules never change what an old migration does.
+"""
+
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """List the column names of a table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _baseline_schema(conn: sqlite3.Connection):
+    """Create the core tables and bring legacy tables up to the enhanced layout"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS routes (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        distance INTEGER NOT NULL,
+        travel_time INTEGER NOT NULL,
+        current_buses INTEGER NOT NULL,
+        daily_passengers INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS passenger_demand (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL CHECK (hour >= 0 AND hour <= 23),
+        day_of_week INTEGER NOT NULL CHECK (day_of_week >= 0 AND day_of_week <= 6),
+        passenger_count INTEGER NOT NULL,
+        date_recorded DATE NOT NULL,
+        is_predicted BOOLEAN DEFAULT FALSE,
+        weather_factor REAL DEFAULT 1.0,
+        festival_factor REAL DEFAULT 1.0,
+        market_factor REAL DEFAULT 1.0,
+        confidence_score REAL DEFAULT 0.8,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    )
+    """)
+
+    # Databases created by backend_server.py lack the prediction columns
+    existing = _table_columns(conn, 'passenger_demand')
+    for column, definition in (
+        ('is_predicted', 'BOOLEAN DEFAULT FALSE'),
+        ('weather_factor', 'REAL DEFAULT 1.0'),
+        ('festival_factor', 'REAL DEFAULT 1.0'),
+        ('market_factor', 'REAL DEFAULT 1.0'),
+        ('confidence_score', 'REAL DEFAULT 0.8'),
+    ):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE passenger_demand ADD COLUMN {column} {definition}")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_schedule_predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id TEXT NOT NULL,
+        prediction_date DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        predicted_passengers INTEGER NOT NULL,
+        recommended_buses INTEGER NOT NULL,
+        frequency_minutes INTEGER NOT NULL,
+        cost_per_hour REAL NOT NULL,
+        utilization_rate REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS external_factors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date_recorded DATE NOT NULL,
+        weather_condition TEXT,
+        temperature REAL,
+        rainfall REAL,
+        humidity REAL,
+        is_festival BOOLEAN DEFAULT FALSE,
+        festival_name TEXT,
+        festival_impact REAL DEFAULT 1.0,
+        is_market_day BOOLEAN DEFAULT FALSE,
+        day_type TEXT DEFAULT 'regular',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bus_schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id TEXT NOT NULL,
+        departure_time TIME NOT NULL,
+        frequency_minutes INTEGER NOT NULL,
+        is_peak_hour BOOLEAN DEFAULT FALSE,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS optimization_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id TEXT NOT NULL,
+        optimization_date DATE NOT NULL,
+        current_cost REAL NOT NULL,
+        optimized_cost REAL NOT NULL,
+        cost_savings REAL NOT NULL,
+        fuel_savings REAL NOT NULL,
+        recommendations TEXT NOT NULL,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    )
+    """)
+
+
+def _uniqueness_keys(conn: sqlite3.Connection):
+    """Deduplicate demand and prediction rows, then enforce their natural keys"""
+    conn.execute("UPDATE passenger_demand SET is_predicted = 0 WHERE is_predicted IS NULL")
+
+    # Keep the most recently written row for every key
+    removed = conn.execute("""
+    DELETE FROM passenger_demand
+    WHERE id NOT IN (
+        SELECT MAX(id) FROM passenger_demand
+        GROUP BY route_id, date_recorded, hour, is_predicted
+    )
+    """).rowcount
+    if removed:
+        logging.info(f"Removed {removed} duplicate passenger_demand rows")
+
+    removed = conn.execute("""
+    DELETE FROM daily_schedule_predictions
+    WHERE id NOT IN (
+        SELECT MAX(id) FROM daily_schedule_predictions
+        GROUP BY route_id, prediction_date, hour
+    )
+    """).rowcount
+    if removed:
+        logging.info(f"Removed {removed} duplicate daily_schedule_predictions rows")
+
+    conn.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_passenger_demand_key
+    ON passenger_demand (route_id, date_recorded, hour, is_predicted)
+    """)
+    conn.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_schedule_predictions_key
+    ON daily_schedule_predictions (route_id, prediction_date, hour)
+    """)
+
+
+def _covering_indexes(conn: sqlite3.Connection):
+    """Add covering indexes for the dashboard and API hot paths"""
+    # Hourly demand averages: route + date range, grouped by hour
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_passenger_demand_route_date_cover
+    ON passenger_demand (route_id, date_recorded, hour, is_predicted, passenger_count)
+    """)
+
+    # Next-day schedule: route + prediction date, ordered by hour
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_schedule_predictions_cover
+    ON daily_schedule_predictions (route_id, prediction_date, hour, predicted_passengers,
+                                   recommended_buses, frequency_minutes, cost_per_hour,
+                                   utilization_rate)
+    """)
+
+    # Current factors: latest row for a date
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_external_factors_date
+    ON external_factors (date_recorded, created_at)
+    """)
+
+    # Schedule history and weekly savings
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_optimization_results_route_date
+    ON optimization_results (route_id, optimization_date)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_optimization_results_date_savings
+    ON optimization_results (optimization_date, cost_savings)
+    """)
+
+
+# Seed data for the route registry tables: the three original Tiruppur routes
+SEED_ROUTES = [
+    ('tp_pc', 'Tiruppur to Pollachi', 85, 120, 12, 2800),
+    ('tp_cb', 'Tiruppur to Coimbatore', 65, 90, 18, 4200),
+    ('tp_sl', 'Tiruppur to Salem', 113, 150, 15, 3500)
+]
+
+SEED_DEMAND_PROFILES = {
+    'tp_pc': {
+        'weekday': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
+        'weekend': [25, 18, 12, 8, 15, 35, 85, 200, 180, 120, 100, 90, 80, 70, 65, 55, 130, 250, 200, 140, 85, 55, 35, 28]
+    },
+    'tp_cb': {
+        'weekday': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
+        'weekend': [35, 25, 18, 15, 22, 55, 120, 350, 280, 180, 150, 130, 115, 105, 95, 80, 200, 380, 320, 220, 135, 90, 55, 42]
+    },
+    'tp_sl': {
+        'weekday': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55],
+        'weekend': [28, 22, 16, 12, 20, 45, 105, 260, 220, 150, 125, 110, 95, 85, 75, 65, 170, 300, 240, 175, 110, 75, 45, 35]
+    }
+}
+
+SEED_MARKET_DAYS = {
+    'tp_pc': [1, 4],  # Tuesday, Friday
+    'tp_cb': [0, 2, 5],  # Monday, Wednesday, Saturday
+    'tp_sl': [2, 5]   # Wednesday, Saturday
+}
+
+
+def _route_registry_tables(conn: sqlite3.Connection):
+    """Move route profiles and market days into tables, with change tracking"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS route_demand_profiles (
+        route_id TEXT NOT NULL,
+        day_type TEXT NOT NULL CHECK (day_type IN ('weekday', 'weekend')),
+        hour INTEGER NOT NULL CHECK (hour >= 0 AND hour <= 23),
+        passengers INTEGER NOT NULL,
+        PRIMARY KEY (route_id, day_type, hour),
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS route_market_days (
+        route_id TEXT NOT NULL,
+        day_of_week INTEGER NOT NULL CHECK (day_of_week >= 0 AND day_of_week <= 6),
+        PRIMARY KEY (route_id, day_of_week),
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('routes', 0)")
+
+    # Any change to route data invalidates in-memory registries
+    for table in ('routes', 'route_demand_profiles', 'route_market_days'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'routes';
+            END
+            """)
+
+    conn.executemany("""
+    INSERT OR IGNORE INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, SEED_ROUTES)
+    conn.executemany("""
+    INSERT OR IGNORE INTO route_demand_profiles (route_id, day_type, hour, passengers)
+    VALUES (?, ?, ?, ?)
+    """, [(route_id, day_type, hour, passengers)
+          for route_id, profiles in SEED_DEMAND_PROFILES.items()
+          for day_type, pattern in profiles.items()
+          for hour, passengers in enumerate(pattern)])
+    conn.executemany("""
+    INSERT OR IGNORE INTO route_market_days (route_id, day_of_week) VALUES (?, ?)
+    """, [(route_id, day) for route_id, days in SEED_MARKET_DAYS.items() for day in days])
+
+
+def _ingestion_watermarks(conn: sqlite3.Connection):
+    """Per-route high-water mark for incremental actuals ingestion"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+        route_id TEXT PRIMARY KEY,
+        last_date DATE NOT NULL,
+        last_hour INTEGER NOT NULL CHECK (last_hour >= 0 AND last_hour <= 23),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+
+    # Start from the latest actual hour already recorded for each route
+    conn.execute("""
+    INSERT OR IGNORE INTO ingestion_watermarks (route_id, last_date, last_hour)
+    SELECT pd.route_id, pd.date_recorded, MAX(pd.hour)
+    FROM passenger_demand pd
+    JOIN (
+        SELECT route_id, MAX(date_recorded) AS last_date
+        FROM passenger_demand
+        WHERE is_predicted = 0
+        GROUP BY route_id
+    ) latest ON latest.route_id = pd.route_id AND latest.last_date = pd.date_recorded
+    WHERE pd.is_predicted = 0
+    GROUP BY pd.route_id, pd.date_recorded
+    """)
+
+
+def _demand_rollup(conn: sqlite3.Connection):
+    """Running hourly demand totals, built from the actuals already recorded"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS demand_rollup (
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        date_recorded DATE NOT NULL,
+        is_weekend BOOLEAN NOT NULL,
+        passenger_sum INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL,
+        cum_sum INTEGER NOT NULL,
+        cum_count INTEGER NOT NULL,
+        cum_weekend_sum INTEGER NOT NULL,
+        cum_weekend_count INTEGER NOT NULL,
+        PRIMARY KEY (route_id, hour, date_recorded)
+    ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS demand_rollup_dirty (
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        since DATE NOT NULL,
+        PRIMARY KEY (route_id, hour)
+    ) WITHOUT ROWID
+    """)
+
+    mark_dirty = """
+    INSERT INTO demand_rollup_dirty (route_id, hour, since)
+    VALUES ({row}.route_id, {row}.hour, {row}.date_recorded)
+    ON CONFLICT(route_id, hour) DO UPDATE SET since = MIN(since, excluded.since);
+    """
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_insert_rollup
+    AFTER INSERT ON passenger_demand WHEN NEW.is_predicted = 0
+    BEGIN
+        {mark_dirty.format(row='NEW')}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_delete_rollup
+    AFTER DELETE ON passenger_demand WHEN OLD.is_predicted = 0
+    BEGIN
+        {mark_dirty.format(row='OLD')}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_update_rollup
+    AFTER UPDATE ON passenger_demand WHEN OLD.is_predicted = 0 OR NEW.is_predicted = 0
+    BEGIN
+        {mark_dirty.format(row='OLD')}
+        {mark_dirty.format(row='NEW')}
+    END
+    """)
+
+    # Every series from its first date, so nothing is left dirty
+    conn.execute("DELETE FROM demand_rollup")
+    conn.execute("""
+    INSERT INTO demand_rollup
+    (route_id, hour, date_recorded, is_weekend, passenger_sum, sample_count,
+     cum_sum, cum_count, cum_weekend_sum, cum_weekend_count)
+    SELECT route_id, hour, date_recorded, is_weekend, passenger_sum, sample_count,
+           SUM(passenger_sum) OVER running,
+           SUM(sample_count) OVER running,
+           SUM(CASE WHEN is_weekend THEN passenger_sum ELSE 0 END) OVER running,
+           SUM(CASE WHEN is_weekend THEN sample_count ELSE 0 END) OVER running
+    FROM (
+        SELECT route_id, hour, date_recorded,
+               strftime('%w', date_recorded) IN ('0', '6') AS is_weekend,
+               SUM(passenger_count) AS passenger_sum,
+               COUNT(*) AS sample_count
+        FROM passenger_demand
+        WHERE is_predicted = 0
+        GROUP BY route_id, hour, date_recorded
+    )
+    WINDOW running AS (PARTITION BY route_id, hour ORDER BY date_recorded)
+    """)
+    conn.execute("DELETE FROM demand_rollup_dirty")
+
+
+def _schedule_date_index(conn: sqlite3.Connection):
+    """Date-first covering index for reading one day's schedules across routes"""
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_schedule_predictions_date_cover
+    ON daily_schedule_predictions (prediction_date, route_id, hour, predicted_passengers,
+                                   recommended_buses, frequency_minutes, cost_per_hour,
+                                   utilization_rate)
+    """)
+
+
+def _forecast_inputs(conn: sqlite3.Connection):
+    """Input hashes of stored forecasts, so horizon runs can skip unchanged days"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_inputs (
+        prediction_date DATE NOT NULL,
+        route_id TEXT NOT NULL,
+        input_hash TEXT NOT NULL,
+        source TEXT NOT NULL CHECK (source IN ('daily', 'horizon')),
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (prediction_date, route_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _demand_model_state(conn: sqlite3.Connection):
+    """Persisted per-route exponential smoothing state"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS demand_model_state (
+        route_id TEXT PRIMARY KEY,
+        level REAL NOT NULL,
+        trend REAL NOT NULL,
+        seasonal BLOB NOT NULL,
+        last_step INTEGER,
+        observations INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _forecast_accuracy(conn: sqlite3.Connection):
+    """Running forecast error metrics, with the predictions already recorded queued for scoring"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_accuracy (
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        day_type TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        samples INTEGER NOT NULL DEFAULT 0,
+        pct_samples INTEGER NOT NULL DEFAULT 0,
+        error_sum REAL NOT NULL DEFAULT 0,
+        abs_error_sum REAL NOT NULL DEFAULT 0,
+        abs_pct_error_sum REAL NOT NULL DEFAULT 0,
+        sq_error_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (route_id, hour, day_type, variant)
+    ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_errors (
+        route_id TEXT NOT NULL,
+        date_recorded DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        day_type TEXT NOT NULL,
+        actual INTEGER NOT NULL,
+        predicted INTEGER NOT NULL,
+        weather_factor REAL NOT NULL,
+        festival_factor REAL NOT NULL,
+        PRIMARY KEY (route_id, date_recorded, hour)
+    ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_accuracy_pending (
+        route_id TEXT NOT NULL,
+        date_recorded DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        PRIMARY KEY (route_id, date_recorded, hour)
+    ) WITHOUT ROWID
+    """)
+
+    for event in ('INSERT', 'UPDATE'):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_{event.lower()}_accuracy
+        AFTER {event} ON passenger_demand WHEN NEW.is_predicted = 0
+        BEGIN
+            INSERT OR IGNORE INTO forecast_accuracy_pending (route_id, date_recorded, hour)
+            VALUES (NEW.route_id, NEW.date_recorded, NEW.hour);
+        END
+        """)
+
+    # Scored by forecast_accuracy.sync(), which actuals ingestion and the daily update run
+    conn.execute("""
+    INSERT OR IGNORE INTO forecast_accuracy_pending (route_id, date_recorded, hour)
+    SELECT a.route_id, a.date_recorded, a.hour
+    FROM passenger_demand a
+    JOIN passenger_demand p
+      ON p.route_id = a.route_id AND p.date_recorded = a.date_recorded
+     AND p.hour = a.hour AND p.is_predicted = 1
+    WHERE a.is_predicted = 0
+    """)
+
+
+# Seed depot: the three Tiruppur routes share one depot's pooled fleet
+SEED_DEPOTS = [
+    ('tp_depot', 'Tiruppur Depot', 45)
+]
+
+SEED_ROUTE_DEPOTS = {
+    'tp_pc': 'tp_depot',
+    'tp_cb': 'tp_depot',
+    'tp_sl': 'tp_depot'
+}
+
+
+def _depots(conn: sqlite3.Connection):
+    """Depots with a shared fleet, and the depot each route runs from"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS depots (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        fleet_size INTEGER NOT NULL CHECK (fleet_size >= 0)
+    )
+    """)
+    if 'depot_id' not in _table_columns(conn, 'routes'):
+        conn.execute("ALTER TABLE routes ADD COLUMN depot_id TEXT REFERENCES depots (id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_routes_depot ON routes (depot_id)")
+
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_depots_{event.lower()}_version
+        AFTER {event} ON depots
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'routes';
+        END
+        """)
+
+    conn.executemany("INSERT OR IGNORE INTO depots (id, name, fleet_size) VALUES (?, ?, ?)", SEED_DEPOTS)
+    conn.executemany("""
+    UPDATE routes SET depot_id = ? WHERE id = ? AND depot_id IS NULL
+    """, [(depot_id, route_id) for route_id, depot_id in SEED_ROUTE_DEPOTS.items()])
+
+
+def _trip_timetables(conn: sqlite3.Connection):
+    """Dated, directional trips with vehicle blocks in bus_schedules"""
+    existing = _table_columns(conn, 'bus_schedules')
+    for column, definition in (
+        ('service_date', 'DATE'),
+        ('direction', 'TEXT'),
+        ('arrival_time', 'TIME'),
+        ('block_id', 'INTEGER'),
+    ):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE bus_schedules ADD COLUMN {column} {definition}")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS ix_bus_schedules_route_date
+    ON bus_schedules (route_id, service_date, departure_time)
+    """)
+
+
+def _demand_cube_rewrites(conn: sqlite3.Connection):
+    """Count deletes and in-place updates of passenger_demand, which the demand cube cannot append"""
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('demand_rewrites', 0)")
+    for event in ('UPDATE', 'DELETE'):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_{event.lower()}_cube
+        AFTER {event} ON passenger_demand
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'demand_rewrites';
+        END
+        """)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'Baseline schema', _baseline_schema),
+    (2, 'Unique keys for passenger_demand and daily_schedule_predictions', _uniqueness_keys),
+    (3, 'Covering indexes for hot queries', _covering_indexes),
+    (4, 'Route registry tables and data version counters', _route_registry_tables),
+    (5, 'Ingestion watermarks for incremental actuals', _ingestion_watermarks),
+    (6, 'Rolling hourly demand rollup', _demand_rollup),
+    (7, 'Date-first covering index for batch schedule reads', _schedule_date_index),
+    (8, 'Forecast input hashes for incremental horizon forecasts', _forecast_inputs),
+    (9, 'Exponential smoothing model state', _demand_model_state),
+    (10, 'Forecast accuracy tracking', _forecast_accuracy),
+    (11, 'Depots and shared route fleets', _depots),
+    (12, 'Trip timetables and vehicle blocks', _trip_timetables),
+    (13, 'Rewrite counter for the demand cube', _demand_cube_rewrites),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Read the schema version stored in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply all pending migrations and return the resulting schema version"""
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+
+        logging.info(f"Applying schema migration {target}: {description}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock in case another process migrated first
+            if get_schema_version(conn) >= target:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    conn.execute("PRAGMA optimize")
+    return get_schema_version(conn)
@@ -0,0 +1,163 @@
+"""
+Tamil Nadu Transport Optimizer - Daily Update Profiling
+Wall and CPU time per stage and per route, with an optional cProfile capture
+
+A StageProfiler follows one daily update run at a time. Stages nest, so
+the forecast step inside predictions is recorded as
+'predictions.forecast'. Each stage records its wall time and the CPU
+time of the calling thread. When the run ends, one JSON record with every
+stage and the slowest routes is written to the log. A stage that takes
+longer than the slow-stage threshold is logged as a warning as soon as
+it ends. Stage durations also feed the /metrics histograms, including
+stages that run outside a profiled run, such as the periodic actuals
+ingestion.
+
+With a profile path set, the whole run is also captured with cProfile.
+The binary stats are written to that path for pstats or snakeviz, and
+the top functions by cumulative time are logged. Work done in worker
+processes is not part of the capture.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+DEFAULT_SLOW_STAGE_SECONDS = 60.0
+
+# Routes and functions listed in the logged summaries
+TOP_ROUTES = 10
+TOP_FUNCTIONS = 25
+
+
+@dataclass
+class StageTiming:
+    name: str
+    wall_seconds: float
+    cpu_seconds: float
+    failed: bool = False
+
+
+@dataclass
+class ProfileReport:
+    pipeline: str
+    started_at: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    stages: List[StageTiming] = field(default_factory=list)
+    routes: Dict[str, List[float]] = field(default_factory=dict)  # route_id -> [wall, cpu]
+    slow_stages: List[str] = field(default_factory=list)
+    profile_path: Optional[str] = None
+
+    def slowest_routes(self, count: int = TOP_ROUTES) -> List[Tuple[str, float, float]]:
+        """(route_id, wall, cpu) of the routes with the most wall time"""
+        ranked = sorted(self.routes.items(), key=lambda item: item[1][0], reverse=True)
+        return [(route_id, wall, cpu) for route_id, (wall, cpu) in ranked[:count]]
+
+    def to_dict(self) -> dict:
+        return {
+            'pipeline': self.pipeline,
+            'started_at': self.started_at,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'stages': [asdict(stage) for stage in self.stages],
+            'routes': {
+                'count': len(self.routes),
+                'wall_seconds': round(sum(wall for wall, _ in self.routes.values()), 3),
+                'cpu_seconds': round(sum(cpu for _, cpu in self.routes.values()), 3),
+                'slowest': [{'route_id': route_id, 'wall_seconds': round(wall, 4), 'cpu_seconds': round(cpu, 4)}
+                            for route_id, wall, cpu in self.slowest_routes()]
+            },
+            'slow_stages': self.slow_stages,
+            'profile_path': self.profile_path
+        }
+
+
+class StageProfiler:
+    """Stage and route timings for one pipeline; one run at a time"""
+
+    def __init__(self, pipeline: str, slow_stage_seconds: float = DEFAULT_SLOW_STAGE_SECONDS,
+                 profile_path: Optional[str] = None):
+        self.pipeline = pipeline
+        self.slow_stage_seconds = slow_stage_seconds
+        self.profile_path = profile_path
+        self.report: Optional[ProfileReport] = None
+        self._stack: List[str] = []
+
+    @contextmanager
+    def run(self) -> Iterator[ProfileReport]:
+        """Profile one run; the report is complete and logged when the block exits"""
+        report = self.report = ProfileReport(self.pipeline, datetime.now().isoformat(timespec='seconds'),
+                                             profile_path=self.profile_path)
+        self._stack = []
+        profiler = cProfile.Profile() if self.profile_path else None
+        wall, cpu = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield report
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            report.wall_seconds = time.perf_counter() - wall
+            report.cpu_seconds = time.thread_time() - cpu
+            self.report = None
+            if profiler is not None:
+                self._save_profile(profiler)
+            logging.info(f"Daily update profile: {json.dumps(report.to_dict())}")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage, nested under any stage already open"""
+        self._stack.append(name)
+        timing = StageTiming('.'.join(self._stack), 0.0, 0.0, failed=True)
+        report = self.report
+        if report is not None:
+            report.stages.append(timing)  # in start order, so parents precede their stages
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+            timing.failed = False
+        finally:
+            self._stack.pop()
+            timing.wall_seconds = round(time.perf_counter() - wall, 4)
+            timing.cpu_seconds = round(time.thread_time() - cpu, 4)
+            path = timing.name
+            metrics.registry.observe(metrics.STAGE_DURATION, (self.pipeline, path), timing.wall_seconds)
+            if report is not None:
+                if timing.wall_seconds > self.slow_stage_seconds:
+                    report.slow_stages.append(path)
+                    logging.warning(f"Slow {self.pipeline} stage {path}: {timing.wall_seconds:.2f}s "
+                                    f"(threshold {self.slow_stage_seconds:g}s)")
+
+    @contextmanager
+    def route(self, route_id: str) -> Iterator[None]:
+        """Time the work for one route inside the current stage"""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_route(route_id, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add_route(self, route_id: str, wall_seconds: float, cpu_seconds: float):
+        """Add time spent on a route, e.g. as measured in a worker process"""
+        if self.report is None:
+            return
+        totals = self.report.routes.setdefault(route_id, [0.0, 0.0])
+        totals[0] += wall_seconds
+        totals[1] += cpu_seconds
+
+    def _save_profile(self, profiler: cProfile.Profile):
+        profiler.dump_stats(self.profile_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        logging.info(f"cProfile of the {self.pipeline} daily update written to {self.profile_path}\n"
+                     f"{summary.getvalue()}")
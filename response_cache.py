@@ -0,0 +1,125 @@
+"""
+Tamil Nadu Transport Optimizer - API Response Cache
+Bounded LRU cache of rendered JSON responses with TTLs and strong ETags
+
+Read-heavy endpoints are wrapped with ResponseCache.cached(). A cached body
+is served until its TTL expires, the cache is invalidated, or one of the
+data versions it was rendered from changes (so writes made by the daily
+update scheduler in another process are picked up on the next request).
+Every response carries a strong ETag; a matching If-None-Match gets a
+304 Not Modified without a body.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from functools import wraps
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+from flask import current_app, make_response, request
+
+import data_versions
+from db_pool import get_db
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    mimetype: str
+    etag: str
+    expires_at: float
+    versions: Tuple[int, ...]
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong validator derived from the response bytes"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered responses keyed by endpoint and query"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, versions: Tuple[int, ...]) -> Optional[CacheEntry]:
+        """Fresh entry for key, or None if missing, expired or stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic() or entry.versions != versions:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """Drop all entries, or only those of one endpoint"""
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == endpoint]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def cached(self, ttl: float, datasets: Sequence[str] = ()):
+        """Cache a view's 200 responses for ttl seconds
+
+        datasets names the data_versions counters the response depends on;
+        a bump of any of them makes the cached body stale.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                versions = ()
+                if datasets:
+                    current = data_versions.get_versions(get_db())
+                    versions = tuple(current.get(name, 0) for name in datasets)
+
+                # Several endpoints answer for "tomorrow", so the date is part of the key
+                key = (request.endpoint, request.full_path, date.today())
+                entry = self.get(key, versions)
+                status = 'HIT'
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    entry = CacheEntry(body, response.mimetype, compute_etag(body),
+                                       time.monotonic() + ttl, versions)
+                    self.put(key, entry)
+                    status = 'MISS'
+
+                response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+                response.set_etag(entry.etag)
+                # Clients may keep the body but must revalidate it with the ETag
+                response.headers['Cache-Control'] = 'no-cache'
+                response.headers['X-Cache'] = status
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
@@ -0,0 +1,230 @@
+"""
+Tamil Nadu Transport Optimizer - Route Registry
+In-memory index of routes, distances, demand profiles and market days
+
+Route data lives in the routes, route_demand_profiles and route_market_days
+tables. The registry loads it once into a compact index (dict lookups plus
+NumPy arrays for the forecast engine) and reloads it when the 'routes' data
+version changes, so adding a route needs no code change.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import data_versions
+from db_pool import DB_PATH, get_pool
+from forecast_engine import ForecastEngine, MARKET_MULTIPLIER
+
+CHECK_INTERVAL_SECONDS = 5.0
+
+# Forecast engines kept per index, least recently used dropped first
+MAX_CACHED_ENGINES = 8
+
+
+@dataclass(frozen=True)
+class Route:
+    index: int
+    id: str
+    name: str
+    distance: int
+    travel_time: int
+    current_buses: int
+    daily_passengers: int
+    weekday_profile: Tuple[int, ...]
+    weekend_profile: Tuple[int, ...]
+    market_days: FrozenSet[int]
+    depot_id: Optional[str] = None
+
+    def profile(self, day_of_week: int) -> Tuple[int, ...]:
+        """Hourly base demand for a day of the week"""
+        return self.weekend_profile if day_of_week >= 5 else self.weekday_profile
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'distance': self.distance,
+            'travel_time': self.travel_time,
+            'current_buses': self.current_buses,
+            'daily_passengers': self.daily_passengers,
+            'depot_id': self.depot_id
+        }
+
+
+@dataclass(frozen=True)
+class Depot:
+    id: str
+    name: str
+    fleet_size: int
+    route_ids: Tuple[str, ...]
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'fleet_size': self.fleet_size,
+            'route_ids': list(self.route_ids)
+        }
+
+
+@dataclass
+class RouteIndex:
+    """Immutable snapshot of all routes at one data version"""
+    version: int
+    routes: List[Route]
+    by_id: Dict[str, Route]
+    weekday_patterns: np.ndarray
+    weekend_patterns: np.ndarray
+    distances: np.ndarray
+    depots: Dict[str, Depot] = field(default_factory=dict)
+    _engines: 'OrderedDict[tuple, ForecastEngine]' = field(default_factory=OrderedDict)
+
+    @property
+    def route_ids(self) -> List[str]:
+        return [route.id for route in self.routes]
+
+    @property
+    def market_days(self) -> Dict[str, FrozenSet[int]]:
+        return {route.id: route.market_days for route in self.routes}
+
+
+def load_index(conn, version: int) -> RouteIndex:
+    """Build a RouteIndex from the registry tables"""
+    profiles: Dict[Tuple[str, str], List[int]] = {}
+    for route_id, day_type, hour, passengers in conn.execute("""
+    SELECT route_id, day_type, hour, passengers FROM route_demand_profiles
+    """):
+        profiles.setdefault((route_id, day_type), [0] * 24)[hour] = passengers
+
+    market_days: Dict[str, set] = {}
+    for route_id, day_of_week in conn.execute("SELECT route_id, day_of_week FROM route_market_days"):
+        market_days.setdefault(route_id, set()).add(day_of_week)
+
+    routes = []
+    for i, row in enumerate(conn.execute("""
+    SELECT id, name, distance, travel_time, current_buses, daily_passengers, depot_id
+    FROM routes ORDER BY id
+    """)):
+        route_id = row[0]
+        weekday = profiles.get((route_id, 'weekday'), [0] * 24)
+        weekend = profiles.get((route_id, 'weekend'), weekday)
+        routes.append(Route(i, *row[:6], tuple(weekday), tuple(weekend),
+                            frozenset(market_days.get(route_id, ())), row[6]))
+
+    depots = {}
+    for depot_id, name, fleet_size in conn.execute("SELECT id, name, fleet_size FROM depots ORDER BY id"):
+        depots[depot_id] = Depot(depot_id, name, fleet_size,
+                                 tuple(route.id for route in routes if route.depot_id == depot_id))
+
+    return RouteIndex(
+        version=version,
+        routes=routes,
+        by_id={route.id: route for route in routes},
+        weekday_patterns=np.array([r.weekday_profile for r in routes], dtype=np.int64).reshape(-1, 24),
+        weekend_patterns=np.array([r.weekend_profile for r in routes], dtype=np.int64).reshape(-1, 24),
+        distances=np.array([r.distance for r in routes], dtype=np.float64),
+        depots=depots
+    )
+
+
+class RouteRegistry:
+    """Route lookups backed by the database, refreshed when route data changes"""
+
+    def __init__(self, db_path: str = DB_PATH, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.pool = get_pool(db_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index: Optional[RouteIndex] = None
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> RouteIndex:
+        """Reload the index if the routes data version has moved"""
+        with self._lock:
+            with self.pool.connection() as conn:
+                version = data_versions.get_version(conn, data_versions.ROUTES)
+                if force or self._index is None or version != self._index.version:
+                    self._index = load_index(conn, version)
+            self._checked_at = time.monotonic()
+            return self._index
+
+    @property
+    def index(self) -> RouteIndex:
+        """Current snapshot; checks the data version at most every check_interval"""
+        index = self._index
+        if index is None or time.monotonic() - self._checked_at >= self.check_interval:
+            index = self.refresh()
+        return index
+
+    def __iter__(self) -> Iterator[Route]:
+        return iter(self.index.routes)
+
+    def __len__(self) -> int:
+        return len(self.index.routes)
+
+    def __contains__(self, route_id: str) -> bool:
+        return route_id in self.index.by_id
+
+    def get(self, route_id: str) -> Optional[Route]:
+        return self.index.by_id.get(route_id)
+
+    def route_ids(self) -> List[str]:
+        return self.index.route_ids
+
+    def depots(self) -> List[Depot]:
+        return list(self.index.depots.values())
+
+    def depot(self, depot_id: str) -> Optional[Depot]:
+        return self.index.depots.get(depot_id)
+
+    def distance(self, route_id: str, default: int = 85) -> int:
+        route = self.get(route_id)
+        return route.distance if route else default
+
+    def forecast_engine(self, festivals: Dict[str, dict],
+                        market_multiplier: float = MARKET_MULTIPLIER) -> ForecastEngine:
+        """Forecast engine over all registered routes, cached per data version and calendar"""
+        index = self.index
+        key = (calendar_key(festivals), market_multiplier)
+        with self._lock:
+            engine = index._engines.get(key)
+            if engine is not None:
+                index._engines.move_to_end(key)
+                return engine
+        # The engine keeps its own copy, so later edits to the caller's dict can't go stale
+        engine = ForecastEngine(index.route_ids, index.weekday_patterns, index.weekend_patterns,
+                                index.distances, index.market_days,
+                                {day: dict(info) for day, info in festivals.items()},
+                                market_multiplier=market_multiplier)
+        with self._lock:
+            index._engines[key] = engine
+            while len(index._engines) > MAX_CACHED_ENGINES:
+                index._engines.popitem(last=False)
+        return engine
+
+
+def calendar_key(festivals: Dict[str, dict]) -> tuple:
+    """Hashable, order-independent form of a festival calendar"""
+    return tuple(sorted((day, tuple(sorted(info.items()))) for day, info in festivals.items()))
+
+
+_registries: Dict[str, RouteRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(db_path: str = DB_PATH) -> RouteRegistry:
+    """Get the process-wide registry for a database file"""
+    key = os.path.abspath(db_path)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = RouteRegistry(db_path)
+                _registries[key] = registry
+    return registry
@@ -0,0 +1,190 @@
+"""
+Tamil Nadu Transport Optimizer - What-If Scenario Evaluation
+Costs many parameter sets over the route x hour demand matrix in one pass
+
+A scenario overrides any of the cost coefficients, demand multipliers
+(weather, festival, market, overall), the seats per bus or the service
+headway thresholds. Scenarios are stacked along the leading axis of the
+forecast engine's demand matrix, in place of days. The same vectorized
+demand, schedule and cost steps then run for all of them at once.
+Schedules follow the optimizer's rules: the longest headway that seats the
+demand within the service level, run with the buses that headway needs and
+capped at the route fleet. Depot fleet sharing is not modelled here.
+"""
+
+import math
+from dataclasses import asdict, dataclass, fields
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from forecast_engine import (BUS_CAPACITY, DRIVER_PER_HOUR, FUEL_PER_KM, MAINTENANCE_PER_KM,
+                             MARKET_MULTIPLIER, ForecastEngine, seats_array)
+from route_registry import RouteRegistry
+from schedule_optimizer import (DEFAULT_SERVICE_HOURS, PEAK_MAX_HEADWAY, SERVICE_BOUNDS, SERVICE_MAX_HEADWAY,
+                                cap_buses, schedule_cells)
+from timetable import cycle_minutes
+
+MAX_SCENARIOS = 5000
+
+# Scenarios evaluated per array pass, to bound memory on large networks
+SCENARIO_CHUNK = 256
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str = 'baseline'
+    fuel_per_km: float = FUEL_PER_KM
+    driver_per_hour: float = DRIVER_PER_HOUR
+    maintenance_per_km: float = MAINTENANCE_PER_KM
+    demand_multiplier: float = 1.0
+    weather_factor: float = 1.0
+    festival_multiplier: Optional[float] = None  # None: the festival calendar for the date
+    market_multiplier: float = MARKET_MULTIPLIER
+    bus_capacity: int = BUS_CAPACITY
+    threshold_scale: float = 1.0                 # scales the demand bands of the headway ladder
+
+    @classmethod
+    def from_dict(cls, spec: dict, default_name: str = 'scenario') -> 'Scenario':
+        """Validated scenario from a JSON object; raises ValueError"""
+        if not isinstance(spec, dict):
+            raise ValueError('each scenario must be an object')
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(spec) - known)
+        if unknown:
+            raise ValueError(f"unknown scenario fields: {', '.join(unknown)}")
+
+        values = {'name': str(spec.get('name', default_name))}
+        for key, value in spec.items():
+            if key == 'name' or (key == 'festival_multiplier' and value is None):
+                continue
+            if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+                    or value <= 0):
+                raise ValueError(f"{key} must be a positive number")
+            if key == 'bus_capacity':
+                capacity = int(value)
+                if capacity != value or capacity < 1:
+                    raise ValueError("bus_capacity must be a whole number of seats, at least 1")
+                values[key] = capacity
+            else:
+                values[key] = float(value)
+        return cls(**values)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    total_cost: float
+    cost_change_pct: float
+    passengers: int
+    unserved: int
+    unserved_pct: float
+    bus_hours: int
+    peak_buses: int
+    utilization_pct: float
+    cost_per_passenger: float
+
+
+def scenario_engine(registry: RouteRegistry, festivals: Dict[str, dict],
+                    route_ids: Optional[Sequence[str]] = None):
+    """Forecast engine, route fleets and travel times for all routes, or for the given ones"""
+    if route_ids is None:
+        routes = list(registry)
+        engine = registry.forecast_engine(festivals)
+    else:
+        routes = [registry.get(route_id) for route_id in route_ids]
+        engine = ForecastEngine([r.id for r in routes], [r.weekday_profile for r in routes],
+                                [r.weekend_profile for r in routes], [r.distance for r in routes],
+                                {r.id: r.market_days for r in routes}, festivals)
+    return (engine, np.array([route.current_buses for route in routes], dtype=np.int64),
+            np.array([route.travel_time for route in routes], dtype=np.int64))
+
+
+def _column(scenarios: Sequence[Scenario], name: str) -> np.ndarray:
+    return np.array([getattr(s, name) for s in scenarios], dtype=np.float64)
+
+
+def evaluate_chunk(engine: ForecastEngine, fleet: np.ndarray, travel_times: np.ndarray, day: date,
+                   scenarios: Sequence[Scenario]) -> Dict[str, np.ndarray]:
+    """Per-scenario totals for one batch of scenarios"""
+    count = len(scenarios)
+    calendar_festival = engine.festival_factors([day])[0]
+    festival = np.array([calendar_festival if s.festival_multiplier is None else s.festival_multiplier
+                         for s in scenarios])
+    market_day = engine.market_factors([day])[0] > 1.0
+    market = np.where(market_day[None, :], _column(scenarios, 'market_multiplier')[:, None], 1.0)
+    variation = np.broadcast_to(_column(scenarios, 'demand_multiplier')[:, None, None],
+                                (count, len(engine.route_ids), 24))
+
+    # Scenarios take the place of days: demand[scenario, route, hour]
+    demand = engine.demand_matrix([day] * count, _column(scenarios, 'weather_factor'), festival,
+                                  variation=variation, market_factors=market)
+
+    capacity = _column(scenarios, 'bus_capacity')[:, None, None]
+    scale = _column(scenarios, 'threshold_scale')[:, None, None]
+    band = np.zeros(demand.shape, dtype=np.int64)
+    for bound in SERVICE_BOUNDS:
+        band += demand > bound * scale
+    longest = np.where(band >= len(SERVICE_BOUNDS), PEAK_MAX_HEADWAY,
+                       SERVICE_MAX_HEADWAY[np.minimum(band, len(SERVICE_BOUNDS) - 1)])
+
+    in_service = np.zeros(24, dtype=bool)
+    in_service[list(DEFAULT_SERVICE_HOURS)] = True
+    runs = in_service[None, None, :] | (demand > 0)
+    cycle = np.array([cycle_minutes(t) for t in travel_times], dtype=np.int64)[None, :, None]
+    buses, frequency = schedule_cells(demand, cycle, longest, runs, capacity=capacity)
+    buses, frequency = cap_buses(buses, frequency, cycle, fleet[None, :, None])
+
+    per_km = (_column(scenarios, 'fuel_per_km') + _column(scenarios, 'maintenance_per_km'))[:, None, None]
+    driver = _column(scenarios, 'driver_per_hour')[:, None, None]
+    cost = buses * (driver + engine.distances[None, :, None] * per_km * 60 / frequency)
+
+    seats = np.floor(seats_array(buses, frequency, capacity))
+    served = np.minimum(demand, seats)
+    return {
+        'total_cost': cost.sum(axis=(1, 2)),
+        'passengers': demand.sum(axis=(1, 2)),
+        'unserved': (demand - served).sum(axis=(1, 2)),
+        'served': served.sum(axis=(1, 2)),
+        'seats': seats.sum(axis=(1, 2)),
+        'bus_hours': buses.sum(axis=(1, 2)),
+        'peak_buses': buses.sum(axis=1).max(axis=1)
+    }
+
+
+def evaluate_scenarios(engine: ForecastEngine, fleet: Sequence[int], travel_times: Sequence[int],
+                       day: date, scenarios: Sequence[Scenario]) -> List[ScenarioResult]:
+    """Evaluate a baseline plus every scenario; cost changes are relative to the baseline"""
+    fleet = np.asarray(fleet, dtype=np.int64)
+    travel_times = np.asarray(travel_times, dtype=np.int64)
+    everything = [Scenario()] + list(scenarios)
+    chunks = [evaluate_chunk(engine, fleet, travel_times, day, everything[i:i + SCENARIO_CHUNK])
+              for i in range(0, len(everything), SCENARIO_CHUNK)]
+    totals = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    baseline_cost = totals['total_cost'][0]
+    results = []
+    for i, scenario in enumerate(everything):
+        passengers = int(totals['passengers'][i])
+        cost = float(totals['total_cost'][i])
+        results.append(ScenarioResult(
+            name=scenario.name,
+            total_cost=round(cost, 2),
+            cost_change_pct=round(float((cost - baseline_cost) / baseline_cost * 100), 2) if baseline_cost else 0.0,
+            passengers=passengers,
+            unserved=int(totals['unserved'][i]),
+            unserved_pct=round(float(totals['unserved'][i] / passengers * 100), 2) if passengers else 0.0,
+            bus_hours=int(totals['bus_hours'][i]),
+            peak_buses=int(totals['peak_buses'][i]),
+            utilization_pct=(round(float(totals['served'][i] / totals['seats'][i] * 100), 2)
+                             if totals['seats'][i] else 0.0),
+            cost_per_passenger=round(cost / passengers, 2) if passengers else 0.0
+        ))
+    return results
+
+
+def scenario_table(results: Sequence[ScenarioResult]) -> dict:
+    """Baseline row plus scenario rows, as returned by the API"""
+    rows = [asdict(result) for result in results]
+    return {'baseline': rows[0], 'scenarios': rows[1:]}
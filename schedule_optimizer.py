@@ -0,0 +1,249 @@
+"""
+Tamil Nadu Transport Optimizer - Fleet-Constrained Schedule Optimizer
+Chooses buses and headway per route-hour at minimum operating cost
+
+A terminal dispatches one bus every headway minutes, so an hour offers
+60 / headway * BUS_CAPACITY seats in each direction (seats_array, the
+capacity the timetable and the simulator work with too). Keeping a headway
+takes every bus that is out on its cycle, ceil(cycle / headway) buses with
+cycle = 2 x (travel_time + layover).
+
+Model, per route r and hour h, with demand d:
+
+    minimize    sum calculate_hourly_cost(buses, distance, headway)
+    subject to  60 / headway * BUS_CAPACITY >= d   (capacity)
+                headway <= max_headway(d)          (minimum service level)
+                headway >= min_headway             (terminal dispatch limit)
+                buses >= ceil(cycle / headway)     (buses to keep the headway)
+                buses >= min_buses in service hours and whenever d > 0
+                buses <= routes.current_buses      (route fleet)
+                sum over routes of buses <= fleet  (depot fleet, per hour)
+
+Cost falls as the headway grows, directly and through the buses a headway
+needs, so without fleet limits each cell's optimum is the longest
+whole-minute headway that seats its demand within the service level, run
+with the buses that headway needs. Demand beyond what min_headway seats is
+left unserved. A route fleet cap stretches the headway to the shortest one
+the capped buses can keep. When the depot fleet binds in an hour, buses are
+withdrawn one at a time from the route that loses the fewest seated
+passengers; ties keep each route's last bus, then drop the costlier one.
+Headways are whole minutes, so seated passengers do not fall evenly with
+each bus withdrawn and the withdrawal is greedy rather than exact.
+"""
+
+import heapq
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from forecast_engine import (BUS_CAPACITY, DRIVER_PER_HOUR, FUEL_PER_KM, MAINTENANCE_PER_KM,
+                             SCHEDULE_BOUNDS, SCHEDULE_FREQUENCY, Forecast, hourly_cost_array,
+                             seats_array, utilization_array)
+from route_registry import RouteRegistry
+from timetable import DEFAULT_LAYOVER_MINUTES, cycle_minutes
+
+# Longest acceptable headway for a demand band (the ladder's frequencies)
+SERVICE_BOUNDS = SCHEDULE_BOUNDS
+SERVICE_MAX_HEADWAY = SCHEDULE_FREQUENCY
+PEAK_MAX_HEADWAY = 10
+
+# Shortest headway a terminal dispatches at
+MIN_HEADWAY = 5
+
+DEFAULT_SERVICE_HOURS = tuple(range(5, 23))
+
+
+@dataclass(frozen=True)
+class ServiceLevel:
+    min_buses: int = 1
+    service_hours: Sequence[int] = DEFAULT_SERVICE_HOURS
+    bounds: np.ndarray = field(default_factory=lambda: SERVICE_BOUNDS)
+    max_headway: np.ndarray = field(default_factory=lambda: SERVICE_MAX_HEADWAY)
+    peak_headway: int = PEAK_MAX_HEADWAY
+    min_headway: int = MIN_HEADWAY
+
+
+@dataclass
+class ScheduleSolution:
+    buses: np.ndarray          # [..., route, hour]
+    frequency: np.ndarray
+    cost: np.ndarray
+    utilization: np.ndarray
+    unserved: np.ndarray       # passengers the scheduled departures cannot seat
+    fleet_limited: np.ndarray  # cells where a fleet cap removed buses
+
+    @property
+    def total_cost(self) -> float:
+        return float(self.cost.sum())
+
+
+def max_headway(demand: np.ndarray, service: ServiceLevel) -> np.ndarray:
+    """Longest headway the service level allows for each demand"""
+    band = np.searchsorted(service.bounds, demand, side='left')
+    peak = band >= len(service.bounds)
+    headway = np.asarray(service.max_headway)[np.minimum(band, len(service.bounds) - 1)]
+    return np.where(peak, service.peak_headway, headway)
+
+
+def seating_headway(demand: np.ndarray, longest: np.ndarray, shortest: int,
+                    capacity=BUS_CAPACITY) -> np.ndarray:
+    """Longest whole-minute headway up to `longest` that seats the demand, never below `shortest`"""
+    demand = np.asarray(demand, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        fits = np.floor(60 * capacity / demand)
+    return np.maximum(np.minimum(longest, fits), shortest).astype(np.int64)
+
+
+def fleet_headway(cycle: np.ndarray, buses: np.ndarray) -> np.ndarray:
+    """Shortest headway `buses` vehicles keep on a cycle (0 where there are none)"""
+    buses = np.asarray(buses, dtype=np.int64)
+    return np.where(buses > 0, -(-np.asarray(cycle, dtype=np.int64) // np.maximum(buses, 1)), 0)
+
+
+def schedule_cells(demand: np.ndarray, cycle: np.ndarray, longest: np.ndarray, runs: np.ndarray,
+                   service: ServiceLevel = ServiceLevel(),
+                   capacity=BUS_CAPACITY) -> Tuple[np.ndarray, np.ndarray]:
+    """Uncapped optimum: buses and headway of every cell
+
+    longest is the service level's headway for each cell and runs marks the
+    cells that must have service; all arguments broadcast.
+    """
+    frequency = seating_headway(demand, longest, service.min_headway, capacity)
+    needed = np.maximum(-(-np.asarray(cycle, dtype=np.int64) // frequency), service.min_buses)
+    return np.where(runs, needed, 0), frequency
+
+
+def cap_buses(buses: np.ndarray, frequency: np.ndarray, cycle: np.ndarray,
+              route_fleet: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Buses held to route_fleet, at the shortest headway the capped buses keep"""
+    capped = buses > route_fleet
+    frequency = np.where(capped & (route_fleet > 0), fleet_headway(cycle, route_fleet), frequency)
+    return np.minimum(buses, route_fleet), frequency
+
+
+def seated_passengers(demand: np.ndarray, buses: np.ndarray, frequency: np.ndarray,
+                      capacity=BUS_CAPACITY) -> np.ndarray:
+    """Passengers the scheduled departures seat"""
+    return np.minimum(demand, np.floor(seats_array(buses, frequency, capacity))).astype(np.int64)
+
+
+def withdraw_buses(demand: np.ndarray, buses: np.ndarray, frequency: np.ndarray,
+                   cycle: np.ndarray, distances: np.ndarray, fleet: int,
+                   fuel_per_km: float = FUEL_PER_KM, driver_per_hour: float = DRIVER_PER_HOUR,
+                   maintenance_per_km: float = MAINTENANCE_PER_KM) -> Tuple[np.ndarray, np.ndarray]:
+    """Withdraw buses until at most `fleet` run, each time from the route that loses fewest seats
+
+    All arguments are per route for one hour. A route left with fewer buses
+    runs the shortest headway they keep, or its own headway if that is longer.
+    """
+    buses = np.asarray(buses, dtype=np.int64).copy()
+    frequency = np.asarray(frequency, dtype=np.int64).copy()
+    planned = frequency.copy()
+
+    def fewer(route: int) -> Tuple[int, int]:
+        count = int(buses[route]) - 1
+        return count, max(int(planned[route]), -(-int(cycle[route]) // count)) if count else int(planned[route])
+
+    def seated(route: int, count: int, headway: int) -> int:
+        return int(seated_passengers(demand[route], count, headway))
+
+    def cost(route: int, count: int, headway: int) -> float:
+        return float(hourly_cost_array(count, distances[route], headway, fuel_per_km, driver_per_hour,
+                                       maintenance_per_km))
+
+    def key(route: int) -> tuple:
+        count, headway = fewer(route)
+        lost = seated(route, buses[route], frequency[route]) - seated(route, count, headway)
+        saving = cost(route, buses[route], frequency[route]) - cost(route, count, headway)
+        return lost, count == 0, -saving, route
+
+    heap = [key(route) for route in np.nonzero(buses > 0)[0].tolist()]
+    heapq.heapify(heap)
+    for _ in range(int(buses.sum()) - fleet):
+        route = heapq.heappop(heap)[-1]
+        buses[route], frequency[route] = fewer(route)
+        if buses[route] > 0:
+            heapq.heappush(heap, key(route))
+    return buses, frequency
+
+
+def optimize_schedule(demand: np.ndarray, distances: Sequence[float], travel_times: Sequence[int],
+                      route_fleet: Optional[Sequence[int]] = None,
+                      depot_fleet: Optional[int] = None,
+                      service: ServiceLevel = ServiceLevel(),
+                      layover: int = DEFAULT_LAYOVER_MINUTES,
+                      fuel_per_km: float = FUEL_PER_KM, driver_per_hour: float = DRIVER_PER_HOUR,
+                      maintenance_per_km: float = MAINTENANCE_PER_KM) -> ScheduleSolution:
+    """Minimum-cost buses and headway for demand shaped [route, hour] or [day, route, hour]
+
+    The depot fleet limit applies per day and hour across all routes given.
+    """
+    demand = np.asarray(demand, dtype=np.int64)
+    squeeze = demand.ndim == 2
+    if squeeze:
+        demand = demand[None]
+    days, routes, _ = demand.shape
+    distances = np.asarray(distances, dtype=np.float64)[None, :, None]
+    cycle = np.array([cycle_minutes(t, layover) for t in travel_times], dtype=np.int64)[None, :, None]
+
+    in_service = np.zeros(24, dtype=bool)
+    in_service[list(service.service_hours)] = True
+    runs = in_service[None, None, :] | (demand > 0)
+    buses, frequency = schedule_cells(demand, cycle, max_headway(demand, service), runs, service)
+
+    wanted = buses
+    if route_fleet is not None:
+        buses, frequency = cap_buses(buses, frequency, cycle,
+                                     np.asarray(route_fleet, dtype=np.int64)[None, :, None])
+    if depot_fleet is not None:
+        for d in range(days):
+            for hour in np.nonzero(buses[d].sum(axis=0) > depot_fleet)[0]:
+                buses[d, :, hour], frequency[d, :, hour] = withdraw_buses(
+                    demand[d, :, hour], buses[d, :, hour], frequency[d, :, hour], cycle[0, :, 0],
+                    distances[0, :, 0], depot_fleet, fuel_per_km, driver_per_hour, maintenance_per_km)
+
+    cost = hourly_cost_array(buses, distances, frequency, fuel_per_km, driver_per_hour,
+                             maintenance_per_km)
+    solution = ScheduleSolution(
+        buses=buses,
+        frequency=frequency,
+        cost=cost,
+        utilization=utilization_array(demand, buses, frequency),
+        unserved=demand - seated_passengers(demand, buses, frequency),
+        fleet_limited=buses < wanted
+    )
+    if squeeze:
+        solution = ScheduleSolution(*(value[0] for value in vars(solution).values()))
+    return solution
+
+
+def optimize_forecasts(forecasts: List[Forecast], registry: RouteRegistry,
+                       depot_fleet: Optional[int] = None,
+                       service: ServiceLevel = ServiceLevel()) -> List[Forecast]:
+    """Replace the ladder schedules of forecasts (same dates) with optimized ones
+
+    Forecasts for separate route shards are solved together so the depot
+    fleet limit sees every route. Each route's fleet is its current_buses
+    and its cycle comes from its travel_time.
+    """
+    if not forecasts:
+        return forecasts
+    route_ids = [route_id for forecast in forecasts for route_id in forecast.route_ids]
+    demand = np.concatenate([forecast.demand for forecast in forecasts], axis=1)
+    routes = [registry.get(route_id) for route_id in route_ids]
+    solution = optimize_schedule(demand, [route.distance for route in routes],
+                                 [route.travel_time for route in routes],
+                                 [route.current_buses for route in routes], depot_fleet, service)
+
+    result = []
+    start = 0
+    for forecast in forecasts:
+        part = slice(start, start + len(forecast.route_ids))
+        start = part.stop
+        result.append(replace(forecast,
+                              buses=solution.buses[:, part],
+                              frequency=solution.frequency[:, part],
+                              cost=solution.cost[:, part],
+                              utilization=solution.utilization[:, part]))
+    return result
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Tamil Nadu Transport Optimizer - Discrete-Event Service Simulation
+Checks whether a route-day schedule carries its demand without queues building up
+
+Passengers arrive at the origin terminal as a Poisson process that follows
+the hourly demand curve. Buses are dispatched at the timetable departures
+(see timetable.departure_minutes) from a fleet of the planned peak bus
+count. Each bus seats BUS_CAPACITY, boards the queue first come first
+served and is back for another departure after a round trip of
+2 x (travel_time + layover). With no bus free, a departure waits for the
+next one that returns, so a fleet too small for the headways shows up as
+delays and longer queues.
+
+The event loop is heap-based: departures and vehicle returns are events.
+Passenger arrivals are one sorted array per replication, and each
+departure takes the waiting slice of it. Monte Carlo runs spread the
+replications over worker processes. Every replication draws from its own
+child of a SeedSequence, so results depend on the seed and not on the
+worker count.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db_pool import DB_PATH, close_pools, get_pool
+from forecast_engine import BUS_CAPACITY, schedule_arrays
+from route_registry import RouteRegistry, get_registry
+from timetable import DEFAULT_LAYOVER_MINUTES, cycle_minutes, departure_minutes
+
+DEFAULT_REPLICATIONS = 200
+DEFAULT_REPLICATIONS_PER_TASK = 25
+DEFAULT_SEED = 42
+
+SCHEDULES = ('stored', 'ladder')
+
+# Event kinds; at equal times a returning bus is free before the departure
+_RETURN, _DEPART = 0, 1
+
+SCALAR_METRICS = ('passengers', 'boarded', 'stranded', 'denied_boardings', 'departures',
+                  'cancelled_departures', 'mean_wait', 'p95_wait', 'max_wait', 'mean_load_factor',
+                  'peak_load_factor', 'mean_delay', 'max_delay')
+
+
+@dataclass
+class RouteDayPlan:
+    """Demand and schedule of one route-day"""
+    route_id: str
+    service_date: date
+    demand: np.ndarray        # expected arrivals per hour
+    buses: np.ndarray
+    frequency: np.ndarray
+    travel_time: int
+    fleet: int
+    layover: int = DEFAULT_LAYOVER_MINUTES
+    capacity: int = BUS_CAPACITY
+
+
+@dataclass
+class SimulationSummary:
+    route_id: str
+    service_date: str
+    replications: int
+    fleet: int
+    metrics: Dict[str, Dict[str, float]]     # metric -> mean, p5, p95 over replications
+    hourly_wait: List[Optional[float]]       # mean wait (minutes) by arrival hour
+    hourly_load_factor: List[Optional[float]]
+    hourly_denied: List[float]
+
+
+def simulate_day(plan: RouteDayPlan, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """One replication; scalar metrics plus per-hour arrays"""
+    counts = rng.poisson(np.maximum(plan.demand, 0))
+    arrivals = np.sort(np.repeat(np.arange(24), counts) * 60 + rng.random(int(counts.sum())) * 60)
+
+    events = [(minute, _DEPART, i, hour)
+              for i, (minute, hour, _) in enumerate(departure_minutes(plan.buses, plan.frequency))]
+    heapq.heapify(events)
+    sequence = len(events)
+    round_trip = cycle_minutes(plan.travel_time, plan.layover)
+
+    idle = plan.fleet
+    pending = deque()
+    head = 0
+    waits, wait_hours = [], []
+    loads = []
+    delays = []
+    load_sum, load_count, denied = np.zeros(24), np.zeros(24), np.zeros(24)
+
+    while events:
+        now, kind, _, hour = heapq.heappop(events)
+        if kind == _RETURN:
+            idle += 1
+            if not pending:
+                continue
+            scheduled, hour = pending.popleft()
+        elif idle == 0:
+            pending.append((now, hour))
+            continue
+        else:
+            scheduled = now
+
+        idle -= 1
+        waiting = int(np.searchsorted(arrivals, now, side='right')) - head
+        boarding = min(plan.capacity, waiting)
+        waits.append(now - arrivals[head:head + boarding])
+        wait_hours.append(arrivals[head:head + boarding] // 60)
+        head += boarding
+
+        load = boarding / plan.capacity
+        loads.append(load)
+        delays.append(now - scheduled)
+        load_sum[hour] += load
+        load_count[hour] += 1
+        denied[hour] += waiting - boarding
+
+        heapq.heappush(events, (now + round_trip, _RETURN, sequence, -1))
+        sequence += 1
+
+    wait = np.concatenate(waits) if waits else np.zeros(0)
+    wait_hour = np.concatenate(wait_hours).astype(np.int64) if wait_hours else np.zeros(0, dtype=np.int64)
+    boarded_by_hour = np.bincount(wait_hour, minlength=24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hourly_wait = np.bincount(wait_hour, weights=wait, minlength=24) / boarded_by_hour
+        hourly_load = load_sum / load_count
+
+    return {
+        'passengers': len(arrivals),
+        'boarded': head,
+        'stranded': len(arrivals) - head,
+        'denied_boardings': int(denied.sum()),
+        'departures': len(loads),
+        'cancelled_departures': len(pending),
+        'mean_wait': float(wait.mean()) if wait.size else 0.0,
+        'p95_wait': float(np.percentile(wait, 95)) if wait.size else 0.0,
+        'max_wait': float(wait.max()) if wait.size else 0.0,
+        'mean_load_factor': float(np.mean(loads)) if loads else 0.0,
+        'peak_load_factor': float(np.max(loads)) if loads else 0.0,
+        'mean_delay': float(np.mean(delays)) if delays else 0.0,
+        'max_delay': float(np.max(delays)) if delays else 0.0,
+        'hourly_wait': hourly_wait,
+        'hourly_load_factor': hourly_load,
+        'hourly_denied': denied
+    }
+
+
+def _run_replications(task: Tuple[RouteDayPlan, List[np.random.SeedSequence]]) -> List[Dict[str, np.ndarray]]:
+    plan, seeds = task
+    return [simulate_day(plan, np.random.default_rng(seed)) for seed in seeds]
+
+
+def summarize(plan: RouteDayPlan, results: List[Dict[str, np.ndarray]]) -> SimulationSummary:
+    metrics = {}
+    for name in SCALAR_METRICS:
+        values = np.array([result[name] for result in results], dtype=np.float64)
+        metrics[name] = {
+            'mean': round(float(values.mean()), 3),
+            'p5': round(float(np.percentile(values, 5)), 3),
+            'p95': round(float(np.percentile(values, 95)), 3)
+        }
+
+    def hourly(name: str) -> List[Optional[float]]:
+        stacked = np.stack([result[name] for result in results])
+        observed = (~np.isnan(stacked)).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            means = np.nansum(stacked, axis=0) / observed
+        return [round(float(value), 3) if count else None for value, count in zip(means, observed)]
+
+    return SimulationSummary(
+        route_id=plan.route_id,
+        service_date=plan.service_date.strftime('%Y-%m-%d'),
+        replications=len(results),
+        fleet=plan.fleet,
+        metrics=metrics,
+        hourly_wait=hourly('hourly_wait'),
+        hourly_load_factor=hourly('hourly_load_factor'),
+        hourly_denied=[round(float(value), 3) for value in np.mean([r['hourly_denied'] for r in results], axis=0)]
+    )
+
+
+def run_monte_carlo(plans: Sequence[RouteDayPlan], replications: int = DEFAULT_REPLICATIONS,
+                    seed: int = DEFAULT_SEED, workers: Optional[int] = None,
+                    replications_per_task: int = DEFAULT_REPLICATIONS_PER_TASK) -> List[SimulationSummary]:
+    """Simulate every plan `replications` times, spread over worker processes"""
+    started = time.perf_counter()
+    tasks, owners = [], []
+    for p, (plan, plan_seed) in enumerate(zip(plans, np.random.SeedSequence(seed).spawn(len(plans)))):
+        seeds = plan_seed.spawn(replications)
+        for i in range(0, replications, replications_per_task):
+            tasks.append((plan, seeds[i:i + replications_per_task]))
+            owners.append(p)
+
+    results: List[List[Dict[str, np.ndarray]]] = [[] for _ in plans]
+    if workers == 1:
+        batches = map(_run_replications, tasks)
+        for p, batch in zip(owners, batches):
+            results[p].extend(batch)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=close_pools) as executor:
+            for p, batch in zip(owners, executor.map(_run_replications, tasks)):
+                results[p].extend(batch)
+
+    logging.info(f"Simulated {len(plans)} route-days x {replications} replications "
+                 f"in {time.perf_counter() - started:.2f}s")
+    return [summarize(plan, plan_results) for plan, plan_results in zip(plans, results)]
+
+
+def load_plans(conn, registry: RouteRegistry, service_date: date,
+               route_ids: Optional[Sequence[str]] = None, schedule: str = 'stored',
+               fleet: Optional[int] = None, layover: int = DEFAULT_LAYOVER_MINUTES) -> List[RouteDayPlan]:
+    """Plans from the stored predictions of a date
+
+    schedule='ladder' swaps the stored buses and headways for
+    calculate_optimal_schedule's ladder on the same demand.
+    """
+    if schedule not in SCHEDULES:
+        raise ValueError(f"schedule must be one of {', '.join(SCHEDULES)}")
+
+    stored: Dict[str, np.ndarray] = {}
+    for route_id, hour, passengers, buses, frequency in conn.execute("""
+    SELECT route_id, hour, predicted_passengers, recommended_buses, frequency_minutes
+    FROM daily_schedule_predictions
+    WHERE prediction_date = ?
+    """, (service_date,)):
+        stored.setdefault(route_id, np.zeros((3, 24), dtype=np.int64))[:, hour] = (passengers, buses, frequency)
+
+    plans = []
+    for route_id in (route_ids or registry.route_ids()):
+        route = registry.get(route_id)
+        if route is None or route_id not in stored:
+            continue
+        demand, buses, frequency = stored[route_id]
+        if schedule == 'ladder':
+            buses, frequency = schedule_arrays(demand)
+        plans.append(RouteDayPlan(route_id, service_date, demand, buses, frequency, route.travel_time,
+                                  int(buses.max()) if fleet is None else fleet, layover))
+    return plans
+
+
+def format_table(summaries: Sequence[SimulationSummary]) -> str:
+    """Fixed-width table of replication means"""
+    columns = [('passengers', 'Passengers', '{:,.0f}'), ('mean_wait', 'Wait (min)', '{:.1f}'),
+               ('p95_wait', 'P95 wait', '{:.1f}'), ('denied_boardings', 'Denied', '{:,.0f}'),
+               ('stranded', 'Stranded', '{:,.0f}'), ('mean_load_factor', 'Load', '{:.2f}'),
+               ('mean_delay', 'Delay (min)', '{:.1f}')]
+    header = ['Route', 'Fleet'] + [title for _, title, _ in columns]
+    rows = [[s.route_id, str(s.fleet)] + [fmt.format(s.metrics[key]['mean']) for key, _, fmt in columns]
+            for s in summaries]
+    widths = [max(len(title), *(len(row[i]) for row in rows)) for i, title in enumerate(header)]
+    lines = ['  '.join(title.ljust(w) for title, w in zip(header, widths))]
+    lines.append('  '.join('-' * w for w in widths))
+    lines.extend('  '.join(value.ljust(w) for value, w in zip(row, widths)) for row in rows)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate predicted route-day schedules against their demand')
+    parser.add_argument('--date', help='service date (YYYY-MM-DD, default: tomorrow)')
+    parser.add_argument('--route', action='append', help='route id (repeatable, default: all routes)')
+    parser.add_argument('--schedule', choices=SCHEDULES, default='stored',
+                        help='stored predictions, or the threshold ladder on the same demand')
+    parser.add_argument('--fleet', type=int, default=None, help='vehicles per route (default: planned peak buses)')
+    parser.add_argument('--layover', type=int, default=DEFAULT_LAYOVER_MINUTES)
+    parser.add_argument('--replications', type=int, default=DEFAULT_REPLICATIONS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--json', action='store_true', help='print the summaries as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service_date = (datetime.strptime(args.date, '%Y-%m-%d').date() if args.date
+                    else date.today() + timedelta(days=1))
+
+    with get_pool(args.db).connection() as conn:
+        plans = load_plans(conn, get_registry(args.db), service_date, args.route, args.schedule,
+                           args.fleet, args.layover)
+    if not plans:
+        raise SystemExit(f"No predicted schedules for {service_date}; run the daily update first")
+
+    summaries = run_monte_carlo(plans, args.replications, args.seed, args.workers)
+
+    if args.json:
+        print(json.dumps([asdict(s) for s in summaries], indent=2))
+    else:
+        print(f"🚌 Simulation {service_date} ({args.schedule} schedule, {args.replications} replications)")
+        print(format_table(summaries))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Tamil Nadu Transport Optimizer - Seasonal Exponential Smoothing
+Per-route Holt-Winters demand model with hour-of-week seasonality
+
+Each route keeps a compact state: a level, a damped trend and 168 seasonal
+indices (24 hours x 7 days, multiplicative). Every new actual hourly count
+updates the state in O(1), and the state is persisted in
+demand_model_state, so the nightly forecast never refits from history.
+
+A new route's state is seeded from its registry demand profiles (with the
+market-day uplift folded into the seasonal indices), so before any actuals
+arrive the model forecasts exactly the calendar baseline. The first update
+then replays the route's recorded actuals once to warm it up. Given a
+demand cube, new actuals are read from its memory-mapped arrays instead of
+passenger_demand.
+"""
+
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from demand_cube import MISSING, DemandCube
+from forecast_engine import MARKET_MULTIPLIER
+from route_registry import Route, RouteRegistry
+
+SEASON_LENGTH = 24 * 7
+
+MIN_SEASONAL = 1e-3
+MIN_LEVEL = 1e-6
+
+
+@dataclass(frozen=True)
+class SmoothingParams:
+    alpha: float = 0.1    # level
+    beta: float = 0.01    # trend
+    gamma: float = 0.2    # seasonal indices (each sees one observation a week)
+    phi: float = 0.98     # trend damping per hour
+
+
+DEFAULT_PARAMS = SmoothingParams()
+
+
+def hour_step(day: date, hour: int) -> int:
+    """Absolute hour number, so gaps between observations are measurable"""
+    return day.toordinal() * 24 + hour
+
+
+def season_slot(day: date, hour: int) -> int:
+    """Hour-of-week index, Monday 00:00 = 0"""
+    return day.weekday() * 24 + hour
+
+
+def damped_sum(phi: float, steps):
+    """phi + phi^2 + ... + phi^steps (vectorized over steps)"""
+    if phi == 1.0:
+        return np.asarray(steps, dtype=np.float64)
+    return phi * (1 - np.power(phi, steps)) / (1 - phi)
+
+
+@dataclass
+class RouteModelState:
+    route_id: str
+    level: float
+    trend: float
+    seasonal: np.ndarray
+    last_step: Optional[int] = None
+    observations: int = 0
+
+    def update(self, step: int, slot: int, value: float, params: SmoothingParams = DEFAULT_PARAMS):
+        """Fold one actual observation into the state"""
+        gap = 1 if self.last_step is None else step - self.last_step
+        if gap <= 0:
+            return  # Already seen; late corrections are not replayed
+
+        # Advance level and trend over any hours without observations
+        level = self.level + self.trend * float(damped_sum(params.phi, gap))
+        trend = self.trend * params.phi ** gap
+
+        seasonal = max(self.seasonal[slot], MIN_SEASONAL)
+        new_level = max(params.alpha * (value / seasonal) + (1 - params.alpha) * level, MIN_LEVEL)
+        self.trend = params.beta * (new_level - self.level) + (1 - params.beta) * trend
+        self.seasonal[slot] = params.gamma * (value / new_level) + (1 - params.gamma) * seasonal
+        self.level = new_level
+        self.last_step = step
+        self.observations += 1
+
+
+def initial_state(route: Route, market_multiplier: float = MARKET_MULTIPLIER) -> RouteModelState:
+    """State that reproduces the route's calendar profiles"""
+    week = np.array([route.profile(day) for day in range(7)], dtype=np.float64)
+    for day in route.market_days:
+        week[day] *= market_multiplier
+    level = float(week.mean()) or MIN_LEVEL
+    return RouteModelState(route.id, level, 0.0, (week / level).ravel())
+
+
+class SmoothingForecaster:
+    """Loads, updates, persists and forecasts the per-route smoothing states"""
+
+    def __init__(self, registry: RouteRegistry, params: SmoothingParams = DEFAULT_PARAMS,
+                 market_multiplier: float = MARKET_MULTIPLIER, cube: Optional[DemandCube] = None):
+        self.registry = registry
+        self.params = params
+        self.market_multiplier = market_multiplier
+        self.cube = cube  # synced by the caller
+
+    def load_states(self, conn) -> Dict[str, RouteModelState]:
+        """Persisted states, with fresh ones for routes that have none yet"""
+        states = {}
+        for route_id, level, trend, seasonal, last_step, observations in conn.execute("""
+        SELECT route_id, level, trend, seasonal, last_step, observations FROM demand_model_state
+        """):
+            states[route_id] = RouteModelState(route_id, level, trend,
+                                               np.frombuffer(seasonal, dtype=np.float64).copy(),
+                                               last_step, observations)
+        for route in self.registry:
+            if route.id not in states:
+                states[route.id] = initial_state(route, self.market_multiplier)
+        return states
+
+    def save_states(self, conn, states: Iterable[RouteModelState]):
+        conn.executemany("""
+        INSERT OR REPLACE INTO demand_model_state
+        (route_id, level, trend, seasonal, last_step, observations, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, [(state.route_id, state.level, state.trend, state.seasonal.astype(np.float64).tobytes(),
+               state.last_step, state.observations) for state in states])
+
+    def new_actuals(self, conn, state: RouteModelState) -> List[Tuple[date, int, int]]:
+        """Actuals recorded from the day of the state's last observation, oldest first"""
+        since = date.min if state.last_step is None else date.fromordinal(state.last_step // 24)
+        if self.cube is not None:
+            return self.cube_actuals(state.route_id, since)
+        return [(date.fromisoformat(day), hour, passengers) for day, hour, passengers in conn.execute("""
+        SELECT date_recorded, hour, passenger_count
+        FROM passenger_demand
+        WHERE route_id = ? AND is_predicted = 0 AND date_recorded >= ?
+        ORDER BY date_recorded, hour
+        """, (state.route_id, since.isoformat()))]
+
+    def cube_actuals(self, route_id: str, since: date) -> List[Tuple[date, int, int]]:
+        stored = self.cube.stored_range()
+        if stored is None or stored[1] < since:
+            return []
+        start = max(since, stored[0])
+        window = self.cube.route_window(route_id, start, stored[1])
+        days, hours = np.nonzero(window != MISSING)
+        return [(start + timedelta(days=int(d)), int(h), int(window[d, h])) for d, h in zip(days, hours)]
+
+    def update(self, conn, route_timer: Optional[Callable[[str], ContextManager]] = None) -> int:
+        """Apply every actual observation newer than each route's state
+
+        Runs in the caller's transaction; returns the number of observations.
+        route_timer, if given, is entered around each route's work.
+        """
+        states = self.load_states(conn)
+        applied = 0
+        changed = []
+        for route in self.registry:
+            state = states[route.id]
+            before = state.observations
+            with route_timer(route.id) if route_timer else nullcontext():
+                for day, hour, passengers in self.new_actuals(conn, state):
+                    state.update(hour_step(day, hour), season_slot(day, hour), passengers, self.params)
+            if state.observations != before:
+                applied += state.observations - before
+                changed.append(state)
+            elif state.last_step is None:
+                changed.append(state)  # Persist the seeded state
+
+        self.save_states(conn, changed)
+        if applied:
+            logging.info(f"Smoothing model: applied {applied} observations to {len(changed)} routes")
+        return applied
+
+    def base_demand(self, conn, dates: Sequence[date],
+                    route_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Model forecast per [day, route, hour], routes in registry order by default"""
+        states = self.load_states(conn)
+        route_ids = list(route_ids) if route_ids is not None else self.registry.route_ids()
+        return forecast_states([states[r] for r in route_ids], dates, self.params)
+
+
+def forecast_states(states: Sequence[RouteModelState], dates: Sequence[date],
+                    params: SmoothingParams = DEFAULT_PARAMS, now_step: Optional[int] = None) -> np.ndarray:
+    """Forecast per [day, route, hour] from one state per route
+
+    States without observations are projected from now_step (default: the
+    current hour).
+    """
+    if now_step is None:
+        now_step = hour_step(datetime.now().date(), datetime.now().hour)
+
+    level = np.array([state.level for state in states])
+    trend = np.array([state.trend for state in states])
+    seasonal = np.stack([state.seasonal for state in states]) if states else np.zeros((0, SEASON_LENGTH))
+    last_step = np.array([state.last_step if state.last_step is not None else now_step
+                          for state in states])
+
+    steps = np.array([[hour_step(d, h) for h in range(24)] for d in dates])    # [day, hour]
+    slots = np.array([[season_slot(d, h) for h in range(24)] for d in dates])  # [day, hour]
+
+    ahead = np.maximum(steps[:, None, :] - last_step[None, :, None], 1)        # [day, route, hour]
+    trended = level[None, :, None] + trend[None, :, None] * damped_sum(params.phi, ahead)
+    forecast = np.maximum(trended, 0) * seasonal[:, slots].transpose(1, 0, 2)
+    return np.maximum(forecast, 0)
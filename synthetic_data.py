@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Tamil Nadu Transport Optimizer - Synthetic Network Generator
+Builds large route networks and years of hourly demand for load testing
+
+Every random draw is a NumPy array operation. Routes get a daily ridership,
+a morning and an evening peak of random height, position and width, a
+flatter weekend profile, a distance, a fleet and a depot. About a third of
+the routes have a weekly market day. Hourly demand for each route and day is
+
+    profile (weekday or weekend) x seasonal wave x festival uplift
+        x market-day uplift x day noise x hour noise
+
+Festivals follow the month and day of the Tamil Nadu festival calendar in
+every generated year. Some route-days also get a random special-event
+spike, like generate_data.py.
+
+Demand is generated for ROUTE_CHUNK routes at a time, so memory stays
+bounded whatever the network size. By default it goes into passenger_demand
+(target 'sqlite', through the usual triggers), like real actuals. Target
+'cube' writes it only into the memory-mapped demand cube. That skips the
+SQLite inserts, about a microsecond per row plus trigger work, and suits
+very large load-test histories (5,000 routes over 3 years are 131 million
+hours). But the rollups, the accuracy tracker and every query of
+passenger_demand never see that history, and a cube rebuild drops it.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+import demand_rollup
+import forecast_accuracy
+from bulk_writer import BulkWriter
+from db_pool import get_pool
+from demand_cube import cube_path, open_cube
+from festival_calendar import TAMIL_NADU_FESTIVALS
+from forecast_engine import BUS_CAPACITY
+
+TARGETS = ('sqlite', 'cube')
+TARGET_NAMES = {'sqlite': 'passenger_demand', 'cube': 'the demand cube'}
+
+DEFAULT_SEED = 42
+DEFAULT_ROUTES_PER_DEPOT = 40
+
+# Routes generated per pass; bounds memory at about 50 MB per pass for 3 years
+ROUTE_CHUNK = 256
+
+# Rows per executemany batch for the sqlite target
+SQLITE_CHUNK_ROWS = 50000
+
+SPECIAL_EVENT_RATE = 0.05
+
+HOURS = np.arange(24)
+
+
+@dataclass
+class SyntheticNetwork:
+    """Route attributes, one array entry per route"""
+    route_ids: List[str]
+    distance: np.ndarray
+    travel_time: np.ndarray
+    current_buses: np.ndarray
+    daily_passengers: np.ndarray
+    weekday: np.ndarray               # [route, hour]
+    weekend: np.ndarray
+    market_day: np.ndarray            # day of week, -1 without a market
+    market_multiplier: np.ndarray
+    seasonal_amplitude: np.ndarray
+    seasonal_phase: np.ndarray
+    festival_sensitivity: np.ndarray
+    depot: np.ndarray                 # depot number of each route
+
+    def __len__(self) -> int:
+        return len(self.route_ids)
+
+
+@dataclass
+class GenerationSummary:
+    db_path: str
+    target: str
+    routes: int
+    depots: int
+    start: str
+    end: str
+    days: int
+    hours_generated: int
+    passengers: int
+    seconds: float
+
+    @property
+    def hours_per_second(self) -> float:
+        return self.hours_generated / self.seconds if self.seconds > 0 else float(self.hours_generated)
+
+
+def _bump(center: np.ndarray, width: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * ((HOURS[None, :] - center[:, None]) / width[:, None]) ** 2)
+
+
+def generate_network(routes: int, rng: np.random.Generator,
+                     routes_per_depot: int = DEFAULT_ROUTES_PER_DEPOT) -> SyntheticNetwork:
+    """Random routes with realistic peak shapes"""
+    daily = np.clip(rng.lognormal(np.log(2500), 0.6, routes), 300, 20000)
+
+    shape = (rng.uniform(0.03, 0.08, routes)[:, None]
+             + rng.uniform(0.6, 1.0, routes)[:, None] * _bump(rng.uniform(7, 9, routes), rng.uniform(0.8, 1.8, routes))
+             + rng.uniform(0.6, 1.0, routes)[:, None] * _bump(rng.uniform(17, 19, routes), rng.uniform(0.8, 1.8, routes))
+             + rng.uniform(0.25, 0.45, routes)[:, None] * _bump(np.full(routes, 12.5), np.full(routes, 3.0)))
+    weekday = shape / shape.sum(axis=1, keepdims=True) * daily[:, None]
+
+    # Weekends: less travel overall and flatter peaks
+    flatten = rng.uniform(0.2, 0.5, routes)[:, None]
+    weekend = (rng.uniform(0.55, 1.05, routes)[:, None]
+               * (weekday * (1 - flatten) + weekday.mean(axis=1, keepdims=True) * flatten))
+
+    distance = rng.integers(10, 151, routes)
+    travel_time = np.rint(distance / rng.uniform(35, 50, routes) * 60).astype(np.int64)
+    current_buses = np.maximum(2, np.ceil(weekday.max(axis=1) / BUS_CAPACITY * 1.5)).astype(np.int64)
+
+    width = len(str(routes))
+    return SyntheticNetwork(
+        route_ids=[f"syn_{i + 1:0{width}d}" for i in range(routes)],
+        distance=distance,
+        travel_time=travel_time,
+        current_buses=current_buses,
+        daily_passengers=np.rint(daily).astype(np.int64),
+        weekday=np.rint(weekday).astype(np.int64),
+        weekend=np.rint(weekend).astype(np.int64),
+        market_day=np.where(rng.random(routes) < 0.3, rng.integers(0, 7, routes), -1),
+        market_multiplier=rng.uniform(1.2, 1.4, routes),
+        seasonal_amplitude=rng.uniform(0.05, 0.2, routes),
+        seasonal_phase=rng.uniform(0, 2 * np.pi, routes),
+        festival_sensitivity=rng.uniform(0.7, 1.2, routes),
+        depot=np.arange(routes) // max(1, routes_per_depot)
+    )
+
+
+def festival_factors(dates: Sequence[date], festivals: Dict[str, dict] = TAMIL_NADU_FESTIVALS) -> np.ndarray:
+    """Festival multiplier per date, repeating the calendar's month and day every year"""
+    by_day = {date.fromisoformat(day).strftime('%m-%d'): info['multiplier'] for day, info in festivals.items()}
+    return np.array([by_day.get(day.strftime('%m-%d'), 1.0) for day in dates])
+
+
+def demand_chunk(network: SyntheticNetwork, rows: slice, dates: Sequence[date],
+                 festival: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Passengers per [route, day, hour] for a slice of the network's routes"""
+    routes = len(range(*rows.indices(len(network))))
+    days = len(dates)
+    weekday_of = np.array([day.weekday() for day in dates])
+    day_of_year = np.array([day.timetuple().tm_yday for day in dates])
+
+    weekend = weekday_of >= 5
+    profile = np.where(weekend[None, :, None], network.weekend[rows, None, :],
+                       network.weekday[rows, None, :]).astype(np.float32)
+
+    day_factor = 1 + network.seasonal_amplitude[rows, None] * np.sin(
+        2 * np.pi * day_of_year[None, :] / 365.25 + network.seasonal_phase[rows, None])
+    day_factor *= 1 + (festival[None, :] - 1) * network.festival_sensitivity[rows, None]
+    market = network.market_day[rows, None] == weekday_of[None, :]
+    day_factor *= np.where(market, network.market_multiplier[rows, None], 1.0)
+    day_factor *= rng.lognormal(0.0, 0.08, (routes, days))
+    special = rng.random((routes, days)) < SPECIAL_EVENT_RATE
+    day_factor *= np.where(special, rng.uniform(1.25, 1.6, (routes, days)), 1.0)
+
+    hour_noise = rng.uniform(0.8, 1.2, (routes, days, 24)).astype(np.float32)
+    demand = profile * day_factor[:, :, None].astype(np.float32) * hour_noise
+    return np.rint(demand).astype(np.int32)
+
+
+def write_network(conn, network: SyntheticNetwork):
+    """Replace the database's routes, profiles, market days and depots with the network"""
+    for table in ('route_market_days', 'route_demand_profiles', 'routes', 'depots'):
+        conn.execute(f"DELETE FROM {table}")
+
+    depots = int(network.depot.max()) + 1 if len(network) else 0
+    fleets = np.bincount(network.depot, weights=network.current_buses, minlength=depots)
+    conn.executemany("INSERT INTO depots (id, name, fleet_size) VALUES (?, ?, ?)",
+                     [(f"syn_depot_{d + 1}", f"Synthetic Depot {d + 1}", int(fleets[d] * 0.85))
+                      for d in range(depots)])
+    conn.executemany("""
+    INSERT INTO routes (id, name, distance, travel_time, current_buses, daily_passengers, depot_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(route_id, f"Synthetic Route {r + 1}", int(network.distance[r]), int(network.travel_time[r]),
+           int(network.current_buses[r]), int(network.daily_passengers[r]),
+           f"syn_depot_{network.depot[r] + 1}") for r, route_id in enumerate(network.route_ids)])
+    conn.executemany("""
+    INSERT INTO route_demand_profiles (route_id, day_type, hour, passengers) VALUES (?, ?, ?, ?)
+    """, [(route_id, day_type, hour, int(profile[r, hour]))
+          for day_type, profile in (('weekday', network.weekday), ('weekend', network.weekend))
+          for r, route_id in enumerate(network.route_ids) for hour in range(24)])
+    conn.executemany("INSERT INTO route_market_days (route_id, day_of_week) VALUES (?, ?)",
+                     [(route_id, int(network.market_day[r])) for r, route_id in enumerate(network.route_ids)
+                      if network.market_day[r] >= 0])
+    conn.commit()
+
+
+def demand_chunks(network: SyntheticNetwork, dates: Sequence[date], festival: np.ndarray,
+                  seeds: Sequence[np.random.SeedSequence]) -> Iterator[tuple]:
+    """(route slice, demand) for ROUTE_CHUNK routes at a time; chunk c draws from seeds[c]"""
+    for c, seed in enumerate(seeds):
+        rows = slice(c * ROUTE_CHUNK, min((c + 1) * ROUTE_CHUNK, len(network)))
+        yield rows, demand_chunk(network, rows, dates, festival, np.random.default_rng(seed))
+        logging.info(f"Generated routes {rows.start + 1}-{rows.stop} of {len(network)}")
+
+
+def demand_rows(route_ids: Sequence[str], dates: Sequence[date], demand: np.ndarray) -> Iterator[tuple]:
+    """passenger_demand rows of one chunk, route by route"""
+    day_text = [day.isoformat() for day in dates]
+    weekday_of = [day.weekday() for day in dates]
+    for r, route_id in enumerate(route_ids):
+        counts = demand[r].tolist()
+        for d, day in enumerate(day_text):
+            for hour, passengers in enumerate(counts[d]):
+                yield (route_id, hour, weekday_of[d], passengers, day)
+
+
+def prepare_database(db_path: str, overwrite: bool = False):
+    """Start from an empty database file and cube"""
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(f"{db_path} exists; pass --overwrite to replace it")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    if os.path.isdir(cube_path(db_path)):
+        if not overwrite:
+            raise FileExistsError(f"{cube_path(db_path)} exists; pass --overwrite to replace it")
+        shutil.rmtree(cube_path(db_path))
+
+
+def generate(db_path: str, routes: int, days: int, seed: int = DEFAULT_SEED, target: str = 'sqlite',
+             end: Optional[date] = None, routes_per_depot: int = DEFAULT_ROUTES_PER_DEPOT,
+             overwrite: bool = False) -> GenerationSummary:
+    """Build a new database with a synthetic network and its demand history"""
+    if target not in TARGETS:
+        raise ValueError(f"target must be one of {', '.join(TARGETS)}")
+    if target == 'cube':
+        logging.warning(f"Generating into the demand cube only: {db_path} will have no passenger_demand "
+                        f"history for the SQLite endpoints, and a cube rebuild will drop it")
+    started = time.perf_counter()
+    end = end or date.today() - timedelta(days=1)
+    dates = [end - timedelta(days=days - 1 - i) for i in range(days)]
+
+    prepare_database(db_path, overwrite)
+    network_seed, *chunk_seeds = np.random.SeedSequence(seed).spawn(1 + -(-routes // ROUTE_CHUNK))
+    network = generate_network(routes, np.random.default_rng(network_seed), routes_per_depot)
+    festival = festival_factors(dates)
+
+    passengers = 0
+    with get_pool(db_path).connection() as conn:
+        write_network(conn, network)
+        chunks = demand_chunks(network, dates, festival, chunk_seeds)
+        if target == 'cube':
+            with open_cube(db_path).bulk_load(conn, network.route_ids, dates[0], dates[-1]) as \
+                    (array, cube_rows, first):
+                for rows, demand in chunks:
+                    array[cube_rows[rows], first:first + days] = demand
+                    passengers += int(demand.sum(dtype=np.int64))
+        else:
+            writer = BulkWriter(conn, SQLITE_CHUNK_ROWS)
+            with writer.relaxed_sync():
+                for rows, demand in chunks:
+                    writer.write("""
+                    INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
+                    VALUES (?, ?, ?, ?, ?)
+                    """, demand_rows(network.route_ids[rows], dates, demand))
+                    passengers += int(demand.sum(dtype=np.int64))
+                demand_rollup.sync(conn)
+                forecast_accuracy.sync(conn)
+
+    return GenerationSummary(
+        db_path=db_path,
+        target=target,
+        routes=routes,
+        depots=int(network.depot.max()) + 1 if routes else 0,
+        start=dates[0].isoformat(),
+        end=dates[-1].isoformat(),
+        days=days,
+        hours_generated=routes * days * 24,
+        passengers=passengers,
+        seconds=time.perf_counter() - started
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic route network and demand history')
+    parser.add_argument('--routes', type=int, default=100)
+    parser.add_argument('--years', type=float, default=1.0, help='history length in years')
+    parser.add_argument('--days', type=int, default=None, help='history length in days (overrides --years)')
+    parser.add_argument('--end', help='last generated date (YYYY-MM-DD, default: yesterday)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--target', choices=TARGETS, default='sqlite',
+                        help='passenger_demand rows (default), or the demand cube only: much faster, but '
+                             'invisible to SQLite queries and dropped by a cube rebuild')
+    parser.add_argument('--routes-per-depot', type=int, default=DEFAULT_ROUTES_PER_DEPOT)
+    parser.add_argument('--db', default='synthetic_transport.db', help='database file to create')
+    parser.add_argument('--overwrite', action='store_true', help='replace an existing database and cube')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    days = args.days if args.days is not None else round(args.years * 365)
+    if args.routes < 1 or days < 1:
+        parser.error('routes and history length must be positive')
+    end = date.fromisoformat(args.end) if args.end else None
+
+    try:
+        summary = generate(args.db, args.routes, days, args.seed, args.target, end,
+                           args.routes_per_depot, args.overwrite)
+    except FileExistsError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps({**asdict(summary), 'hours_per_second': round(summary.hours_per_second)}, indent=2))
+    else:
+        print(f"✅ {summary.routes} routes in {summary.depots} depots, {summary.start}..{summary.end} "
+              f"({summary.days} days) into {TARGET_NAMES[summary.target]}")
+        print(f"   {summary.hours_generated:,} route-hours, {summary.passengers:,} passengers "
+              f"in {summary.seconds:.1f}s ({summary.hours_per_second:,.0f} hours/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,9 @@ import requests
 import sqlite3
 import sys
 import os
-from datetime import datetime, date
+import shutil
+import tempfile
+from datetime import datetime, date, timedelta
 import json
 
 class SystemTester:
@@ -16,6 +18,7 @@ class SystemTester:
         self.api_base = 'http://localhost:5000/api'
         self.db_path = 'transport_optimizer.db'
         self.test_results = []
+        self.shared_copy = None
     
     def test_database_connection(self):
         """Test database connectivity"""
@@ -69,24 +72,52 @@ class SystemTester:
         return success
     
     def test_prediction_system(self):
-        """Test prediction generation"""
-        try:
-            response = requests.post(f"{self.api_base}/daily-update", timeout=30)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'success':
-                    self.log_success("Prediction system working")
-                    return True
-                else:
-                    self.log_error("Prediction system returned error")
-                    return False
-            else:
+        """Test that POST /api/daily-update stores the scheduler pipeline's predictions"""
+        path = None
+        try:
+            import numpy as np
+            from daily_update_scheduler import TransportDataUpdater
+            
+            response = requests.post(f"{self.api_base}/daily-update", timeout=60)
+            if response.status_code != 200 or response.json().get('status') != 'success':
                 self.log_error(f"Prediction system test failed with status {response.status_code}")
                 return False
-                
+            data = response.json()['data']
+            
+            # Replay the pipeline on a copy: the smoothing baseline has no random variation
+            path = self.database_copy()
+            updater = TransportDataUpdater(db_path=path)
+            tomorrow = date.fromisoformat(data['prediction_date'])
+            festival = updater.get_festival_data(tomorrow).impact_multiplier
+            forecast = updater.engine.forecast([tomorrow], [data['weather_factor']], [festival],
+                                               **updater.forecast_options([tomorrow]))
+            expected, = updater.plan_schedules([forecast])
+            
+            stored = np.zeros((2, len(expected.route_ids), 24), dtype=np.int64)
+            rows = {route_id: r for r, route_id in enumerate(expected.route_ids)}
+            conn = sqlite3.connect(path)
+            try:
+                for route_id, hour, passengers, buses in conn.execute("""
+                SELECT route_id, hour, predicted_passengers, recommended_buses
+                FROM daily_schedule_predictions WHERE prediction_date = ?
+                """, (tomorrow,)):
+                    if route_id in rows:
+                        stored[:, rows[route_id], hour] = (passengers, buses)
+            finally:
+                conn.close()
+            if not (np.array_equal(stored[0], expected.demand[0]) and np.array_equal(stored[1], expected.buses[0])):
+                self.log_error("Daily update predictions differ from the scheduler's pipeline")
+                return False
+            
+            self.log_success("Daily update endpoint stores the scheduler pipeline's predictions")
+            return True
+            
         except Exception as e:
             self.log_error(f"Prediction system test failed: {e}")
             return False
+        finally:
+            if path:
+                self.remove_copy(path)
     
     def test_weather_simulation(self):
         """Test weather data simulation"""
@@ -94,7 +125,7 @@ class SystemTester:
             # Import weather function from scheduler
             from daily_update_scheduler import TransportDataUpdater
             
-            updater = TransportDataUpdater()
+            updater = TransportDataUpdater(db_path=self.read_only_copy())
             weather_data = updater.get_weather_data_free_api()
             
             if weather_data.temperature > 0 and weather_data.weather_factor > 0:
@@ -113,7 +144,7 @@ class SystemTester:
         try:
             from daily_update_scheduler import TransportDataUpdater
             
-            updater = TransportDataUpdater()
+            updater = TransportDataUpdater(db_path=self.read_only_copy())
             festival_data = updater.get_festival_data(date.today())
             
             self.log_success(f"Festival detection working: {festival_data.name or 'No festival today'}")
@@ -128,7 +159,7 @@ class SystemTester:
         try:
             from daily_update_scheduler import TransportDataUpdater
             
-            updater = TransportDataUpdater()
+            updater = TransportDataUpdater(db_path=self.read_only_copy())
             
             # Test various demand levels
             test_cases = [0, 50, 150, 300, 500]
@@ -147,6 +178,1046 @@ class SystemTester:
             self.log_error(f"Schedule optimization test failed: {e}")
             return False
     
+    def test_forecast_engine_equivalence(self):
+        """Test vectorized forecast engine against the per-cell reference"""
+        try:
+            import numpy as np
+            from datetime import timedelta
+            from daily_update_scheduler import TransportDataUpdater
+            from forecast_engine import schedule_arrays
+            
+            updater = TransportDataUpdater(db_path=self.read_only_copy())
+            engine = updater.engine
+            dates = [date.today() + timedelta(days=offset) for offset in range(14)]
+            weather = np.random.default_rng(7).uniform(0.9, 2.0, len(dates))
+            festival = np.random.default_rng(8).choice([1.0, 1.4, 1.8], len(dates))
+            variation = np.random.default_rng(9).uniform(0.85, 1.15, (len(dates), len(engine.route_ids), 24))
+            
+            forecast = engine.forecast(dates, weather, festival, variation=variation)
+            
+            for d, target_date in enumerate(dates):
+                for r, route_id in enumerate(engine.route_ids):
+                    distance = updater.get_route_distance(route_id)
+                    for hour in range(24):
+                        demand = updater.predict_cell_demand(route_id, hour, target_date, weather[d],
+                                                             festival[d], variation[d, r, hour])
+                        buses, frequency = updater.calculate_optimal_schedule(demand)
+                        cost = updater.calculate_hourly_cost(buses, distance, frequency)
+                        
+                        if (forecast.demand[d, r, hour] != demand or forecast.buses[d, r, hour] != buses
+                                or forecast.frequency[d, r, hour] != frequency
+                                or forecast.cost[d, r, hour] != cost):
+                            self.log_error(f"Forecast engine mismatch for {route_id} {target_date} {hour:02d}:00")
+                            return False
+            
+            # Schedule ladder across the whole demand range
+            demand_range = np.arange(0, 1000)
+            buses, frequency = schedule_arrays(demand_range)
+            for demand in demand_range:
+                if (buses[demand], frequency[demand]) != updater.calculate_optimal_schedule(int(demand)):
+                    self.log_error(f"Vectorized schedule mismatch for demand {demand}")
+                    return False
+            
+            self.log_success("Forecast engine matches per-cell reference")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Forecast engine test failed: {e}")
+            return False
+    
+    def test_depot_fleet_caps(self):
+        """Test that planned schedules respect route, depot and overall fleet limits"""
+        try:
+            import numpy as np
+            from datetime import timedelta
+            from daily_update_scheduler import TransportDataUpdater
+            from depot_allocation import allocate_depot
+            from schedule_optimizer import optimize_forecasts, optimize_schedule
+
+            tomorrow = date.today() + timedelta(days=1)
+            for depot_fleet in (None, 10, 4):
+                updater = TransportDataUpdater(db_path=self.read_only_copy(), depot_fleet=depot_fleet)
+                forecast = updater.engine.forecast([tomorrow], [1.0], [1.0], variation_range=(1.0, 1.0))
+                planned, = updater.plan_schedules([forecast])
+                buses = planned.buses[0]
+                if depot_fleet is None:
+                    # The seeded depot holds every route's current_buses, so it never binds
+                    optimized, = optimize_forecasts([forecast], updater.registry)
+                    if (not np.array_equal(planned.buses, optimized.buses)
+                            or not np.array_equal(planned.frequency, optimized.frequency)):
+                        self.log_error("Depot allocation changed the optimizer's plan with fleet to spare")
+                        return False
+
+                route_fleet = np.array([updater.registry.get(route_id).current_buses
+                                        for route_id in planned.route_ids])
+                if (buses > route_fleet[:, None]).any():
+                    self.log_error(f"Planned buses exceed current_buses with depot fleet {depot_fleet}")
+                    return False
+                if depot_fleet is not None and buses.sum(axis=0).max() > depot_fleet:
+                    self.log_error(f"Planned buses exceed --depot-fleet {depot_fleet}: "
+                                   f"{buses.sum(axis=0).max()} in one hour")
+                    return False
+                for depot in updater.registry.depots():
+                    rows = [planned.route_ids.index(route_id) for route_id in depot.route_ids
+                            if route_id in planned.route_ids]
+                    if rows and buses[rows].sum(axis=0).max() > depot.fleet_size:
+                        self.log_error(f"Depot {depot.id} runs more than its fleet of {depot.fleet_size}")
+                        return False
+
+            # A route's own fleet binds even when the depot has buses to spare
+            demand = np.full((2, 24), 400)
+            allocation = allocate_depot(demand, [50, 50], [60, 60], 40, route_fleet=[3, 20])
+            if allocation.buses[0].max() > 3 or allocation.buses.sum(axis=0).max() > 40:
+                self.log_error("Depot allocation ignores the route fleet cap")
+                return False
+
+            # Without a binding fleet no bus is withdrawn
+            demand = np.repeat([[46], [91], [3]], 24, axis=1)
+            distances, travel_times, route_fleet = [85, 65, 113], [120, 90, 150], [12, 18, 15]
+            allocation = allocate_depot(demand, distances, travel_times, 45, route_fleet=route_fleet)
+            optimized = optimize_schedule(demand, distances, travel_times, route_fleet)
+            if (not np.array_equal(allocation.buses, optimized.buses) or any(allocation.withdrawn)
+                    or allocation.unserved.sum() != optimized.unserved.sum()):
+                self.log_error(f"Depot allocation ran {allocation.buses[:, 12].tolist()} buses with slack, "
+                               f"the optimizer {optimized.buses[:, 12].tolist()}")
+                return False
+
+            self.log_success("Schedules respect route, depot and --depot-fleet limits")
+            return True
+
+        except Exception as e:
+            self.log_error(f"Depot fleet test failed: {e}")
+            return False
+
+    def database_copy(self):
+        """Migrated copy of the test database in a temporary directory
+        
+        Local tests never open self.db_path through the pool, which would
+        migrate the checked-in database in place.
+        """
+        from migrations import migrate
+        
+        directory = tempfile.mkdtemp(prefix='transport_test_')
+        path = os.path.join(directory, os.path.basename(self.db_path))
+        source = sqlite3.connect(self.db_path)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+            migrate(target)
+        finally:
+            source.close()
+            target.close()
+        return path
+    
+    def read_only_copy(self):
+        """One migrated copy shared by the tests that only read"""
+        if self.shared_copy is None:
+            self.shared_copy = self.database_copy()
+        return self.shared_copy
+    
+    def remove_copy(self, path):
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    
+    def test_benchmark_suite(self):
+        """Test that the in-process benchmark covers every endpoint without errors"""
+        try:
+            import benchmark
+            
+            databases = {name: app.config.get('DATABASE') for name, app in benchmark.APPS.items()}
+            try:
+                report = benchmark.run_benchmark([3], [30], requests=3)
+            finally:
+                for name, app in benchmark.APPS.items():
+                    app.config['DATABASE'] = databases[name]
+            
+            result, = report['results']
+            if result['daily_update_first_seconds'] is None or result['target'] != 'sqlite':
+                self.log_error(f"Benchmark config not run as expected: {result}")
+                return False
+            cases = {(case.app, case.method, case.name) for case in benchmark.endpoint_cases()}
+            measured = {(e['app'], e['method'], e['endpoint']) for e in result['endpoints']}
+            if measured != cases:
+                self.log_error(f"Benchmark missed endpoints: {sorted(cases - measured)}")
+                return False
+            failing = [f"{e['app']} {e['endpoint']}" for e in result['endpoints'] if e['errors']]
+            if failing:
+                self.log_error(f"Benchmarked endpoints returned errors: {', '.join(failing)}")
+                return False
+            
+            # A report never regresses against itself; one twice as slow regresses on every endpoint
+            if benchmark.compare(report, report):
+                self.log_error("Benchmark report regresses against itself")
+                return False
+            slower = json.loads(json.dumps(report))
+            for e in slower['results'][0]['endpoints']:
+                e['p95_ms'] = e['p95_ms'] * 2 + benchmark.NOISE_FLOOR_MS + 1
+            regressions = benchmark.compare(slower, report)
+            if len(regressions) != len(cases):
+                self.log_error(f"Expected {len(cases)} p95 regressions, got {len(regressions)}")
+                return False
+            
+            self.log_success(f"Benchmarked {len(cases)} endpoints on 3 routes x 30 days without errors")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Benchmark suite test failed: {e}")
+            return False
+    
+    def test_metrics_render(self):
+        """Test the Prometheus text format of counters and histograms across threads"""
+        try:
+            import threading
+            from metrics import Metric, MetricsRegistry
+            
+            requests_total = Metric('test_requests_total', 'counter', 'Requests', ('endpoint',))
+            latency = Metric('test_latency_seconds', 'histogram', 'Latency', ('endpoint',), (1.0, 5.0))
+            registry = MetricsRegistry((requests_total, latency))
+            
+            def record():
+                registry.inc(requests_total, ('say "hi"',), 3)
+                for value in (3.0, 7.0):
+                    registry.observe(latency, ('a',), value)
+            
+            # One exited thread, whose shard is folded in, and the current thread's own
+            worker = threading.Thread(target=record)
+            worker.start()
+            worker.join()
+            registry.inc(requests_total, ('say "hi"',), 2)
+            for value in (0.5, 1.0):
+                registry.observe(latency, ('a',), value)
+            
+            expected = '\n'.join([
+                '# HELP test_requests_total Requests',
+                '# TYPE test_requests_total counter',
+                'test_requests_total{endpoint="say \\"hi\\""} 5',
+                '# HELP test_latency_seconds Latency',
+                '# TYPE test_latency_seconds histogram',
+                'test_latency_seconds_bucket{endpoint="a",le="1"} 2',
+                'test_latency_seconds_bucket{endpoint="a",le="5"} 3',
+                'test_latency_seconds_bucket{endpoint="a",le="+Inf"} 4',
+                'test_latency_seconds_sum{endpoint="a"} 11.5',
+                'test_latency_seconds_count{endpoint="a"} 4'
+            ]) + '\n'
+            rendered = registry.render()
+            if rendered != expected:
+                self.log_error(f"Unexpected /metrics text:\n{rendered}")
+                return False
+            
+            self.log_success("Metrics render cumulative buckets, +Inf, _sum and _count across threads")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Metrics render test failed: {e}")
+            return False
+    
+    def test_profiler_totals(self):
+        """Test nested stage names, wall time totals and per-route sums of the stage profiler"""
+        try:
+            import time
+            import metrics
+            from profiling import StageProfiler
+            
+            profiler = StageProfiler('test', slow_stage_seconds=0.005)
+            with profiler.run() as report:
+                with profiler.stage('a'):
+                    with profiler.stage('b'):
+                        for _ in range(2):
+                            with profiler.route('r1'):
+                                time.sleep(0.01)
+                    profiler.add_route('r2', 1.0, 0.5)
+                    profiler.add_route('r2', 0.5, 0.25)
+                try:
+                    with profiler.stage('c'):
+                        raise ValueError('stage failure')
+                except ValueError:
+                    pass
+            profiler.add_route('r3', 1.0, 1.0)  # outside a run: ignored
+            
+            stages = {stage.name: stage for stage in report.stages}
+            if list(stages) != ['a', 'a.b', 'c']:
+                self.log_error(f"Unexpected stage names: {list(stages)}")
+                return False
+            if [stage.failed for stage in report.stages] != [False, False, True]:
+                self.log_error("Only the raising stage should be marked failed")
+                return False
+            # Stage times are rounded to 0.1 ms
+            if not (report.wall_seconds + 0.001 >= stages['a'].wall_seconds >= stages['a.b'].wall_seconds >= 0.02):
+                self.log_error(f"Stage wall times are not nested: run {report.wall_seconds:.4f}s, "
+                               f"a {stages['a'].wall_seconds}s, a.b {stages['a.b'].wall_seconds}s")
+                return False
+            if sorted(report.slow_stages) != ['a', 'a.b']:
+                self.log_error(f"Unexpected slow stages: {report.slow_stages}")
+                return False
+            
+            summary = report.to_dict()['routes']
+            r1_wall = report.routes['r1'][0]
+            if (set(report.routes) != {'r1', 'r2'} or report.routes['r2'] != [1.5, 0.75]
+                    or not 0.02 <= r1_wall <= stages['a.b'].wall_seconds + 0.001
+                    or summary['wall_seconds'] != round(1.5 + r1_wall, 3)
+                    or summary['slowest'][0]['route_id'] != 'r2'):
+                self.log_error(f"Route totals do not add up: {report.routes}, {summary}")
+                return False
+            
+            if ('transport_daily_update_stage_duration_seconds', ('test', 'a.b')) not in metrics.registry.collect():
+                self.log_error("Stage durations are missing from the metrics registry")
+                return False
+            
+            self.log_success(f"Profiler nests stages and sums {len(report.routes)} routes' times")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Profiler totals test failed: {e}")
+            return False
+    
+    def test_migration_dedup(self):
+        """Test that migrations deduplicate an already-populated database"""
+        path = self.database_copy()
+        try:
+            from migrations import SCHEMA_VERSION, migrate
+            
+            conn = sqlite3.connect(path)
+            route_id, day, hour, day_of_week, count = conn.execute("""
+                SELECT route_id, date_recorded, hour, day_of_week, passenger_count
+                FROM passenger_demand WHERE is_predicted = 0 LIMIT 1
+            """).fetchone()
+            
+            # Back to the schema before unique keys, with a duplicate written later
+            conn.execute("DROP INDEX ux_passenger_demand_key")
+            conn.execute("""
+                INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+                VALUES (?, ?, ?, ?, ?, 0)
+            """, (route_id, hour, day_of_week, count + 7, day))
+            conn.execute("PRAGMA user_version = 1")
+            conn.commit()
+            
+            if migrate(conn) != SCHEMA_VERSION or migrate(conn) != SCHEMA_VERSION:
+                self.log_error("Migrations did not reach the current schema version")
+                return False
+            
+            duplicates = conn.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM passenger_demand
+                    GROUP BY route_id, date_recorded, hour, is_predicted HAVING COUNT(*) > 1
+                )
+            """).fetchone()[0]
+            kept = conn.execute("""
+                SELECT passenger_count FROM passenger_demand
+                WHERE route_id = ? AND date_recorded = ? AND hour = ? AND is_predicted = 0
+            """, (route_id, day, hour)).fetchone()[0]
+            if duplicates or kept != count + 7:
+                self.log_error(f"Migration left {duplicates} duplicate keys, kept count {kept}")
+                return False
+            
+            try:
+                conn.execute("""
+                    INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                """, (route_id, hour, day_of_week, count, day))
+                self.log_error("Unique key on passenger_demand not restored")
+                return False
+            except sqlite3.IntegrityError:
+                pass
+            conn.close()
+            
+            self.log_success(f"Migrations dedup a populated database up to version {SCHEMA_VERSION}")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Migration test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_incremental_ingestion(self):
+        """Test that actuals ingestion writes only the hours after each watermark"""
+        path = self.database_copy()
+        try:
+            from daily_update_scheduler import TransportDataUpdater
+            
+            updater = TransportDataUpdater(db_path=path)
+            routes = len(updater.registry.route_ids())
+            now = datetime.now().replace(minute=0, second=0, microsecond=0)
+            
+            updater.update_current_day_actual(now)  # Catches up from the stored watermarks
+            if updater.update_current_day_actual(now) != 0:
+                self.log_error("Ingesting the same hour again wrote rows")
+                return False
+            later = now + timedelta(hours=3)
+            written = updater.update_current_day_actual(later)
+            if written != 3 * routes:
+                self.log_error(f"Three new hours wrote {written} rows for {routes} routes")
+                return False
+            
+            with updater.pool.connection() as conn:
+                watermarks = updater.get_watermarks(conn)
+                duplicates = conn.execute("""
+                    SELECT COUNT(*) FROM (
+                        SELECT 1 FROM passenger_demand
+                        GROUP BY route_id, date_recorded, hour, is_predicted HAVING COUNT(*) > 1
+                    )
+                """).fetchone()[0]
+            if any(mark != later for mark in watermarks.values()) or len(watermarks) != routes:
+                self.log_error(f"Watermarks not advanced to {later}: {watermarks}")
+                return False
+            if duplicates:
+                self.log_error(f"Ingestion left {duplicates} duplicate actual hours")
+                return False
+            
+            self.log_success(f"Incremental ingestion: {written} rows for 3 new hours, watermarks advanced")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Incremental ingestion test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_rollup_averages(self):
+        """Test the hourly demand rollup against a raw AVG over passenger_demand"""
+        path = self.database_copy()
+        try:
+            import random
+            from demand_rollup import DAY_TYPES, hourly_average, sync
+            
+            today = date.today()
+            rng = random.Random(8)
+            conn = sqlite3.connect(path)
+            route_id = conn.execute("SELECT id FROM routes ORDER BY id LIMIT 1").fetchone()[0]
+            days = [today - timedelta(days=offset) for offset in range(1, 100)]
+            conn.executemany("""
+                INSERT OR REPLACE INTO passenger_demand
+                (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+                VALUES (?, ?, ?, ?, ?, 0)
+            """, [(route_id, hour, day.weekday(), rng.randint(0, 400), day.isoformat())
+                  for day in days for hour in range(24) if rng.random() > 0.1])
+            conn.commit()
+            sync(conn)  # As the writers do after ingesting actuals
+            
+            # A correction inside the windows must be picked up too
+            conn.execute("""
+                UPDATE passenger_demand SET passenger_count = passenger_count + 50
+                WHERE route_id = ? AND date_recorded = ? AND is_predicted = 0
+            """, (route_id, days[20].isoformat()))
+            conn.commit()
+            sync(conn)
+            
+            filters = {'all': '', 'weekday': "AND strftime('%w', date_recorded) NOT IN ('0', '6')",
+                       'weekend': "AND strftime('%w', date_recorded) IN ('0', '6')"}
+            for window in (7, 28, 90):
+                start = (today - timedelta(days=window)).isoformat()
+                for day_type in DAY_TYPES:
+                    raw = [0] * 24
+                    for hour, average in conn.execute(f"""
+                        SELECT hour, AVG(passenger_count) FROM passenger_demand
+                        WHERE route_id = ? AND is_predicted = 0 AND date_recorded >= ? {filters[day_type]}
+                        GROUP BY hour
+                    """, (route_id, start)):
+                        raw[hour] = int(average)
+                    rollup = hourly_average(conn, route_id, window, day_type, today)
+                    if rollup != raw:
+                        self.log_error(f"Rollup differs from AVG for {window} days ({day_type})")
+                        return False
+            conn.close()
+            
+            self.log_success("Rollup averages match a raw AVG over 7/28/90 days and day types")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Rollup test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_response_cache(self):
+        """Test ETag revalidation and cache invalidation by the daily update"""
+        try:
+            url = f"{self.api_base}/next-day-schedule/tp_pc"
+            first = requests.get(url, timeout=10)
+            etag = first.headers.get('ETag')
+            if first.status_code != 200 or not etag:
+                self.log_error(f"Cached endpoint returned {first.status_code} without an ETag")
+                return False
+            
+            revalidated = requests.get(url, headers={'If-None-Match': etag}, timeout=10)
+            if revalidated.status_code != 304 or revalidated.content:
+                self.log_error(f"Matching ETag returned {revalidated.status_code} with a body")
+                return False
+            
+            update = requests.post(f"{self.api_base}/daily-update", timeout=60)
+            if update.status_code != 200:
+                self.log_error(f"Daily update failed with status {update.status_code}")
+                return False
+            after = requests.get(url, headers={'If-None-Match': etag}, timeout=10)
+            if after.headers.get('X-Cache') != 'MISS':
+                self.log_error("Schedule served from the cache after a daily update")
+                return False
+            
+            self.log_success("Cache answers 304 for a matching ETag and refreshes after the daily update")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Response cache test failed: {e}")
+            return False
+    
+    def test_smoothing_update(self):
+        """Test that the smoothing model starts from the profiles and folds in only new actuals"""
+        path = self.database_copy()
+        try:
+            import numpy as np
+            from db_pool import get_pool
+            from forecast_engine import MARKET_MULTIPLIER
+            from route_registry import get_registry
+            from smoothing_model import (RouteModelState, SmoothingForecaster, forecast_states,
+                                         hour_step, initial_state, season_slot)
+            
+            registry = get_registry(path)
+            route = next(iter(registry))
+            
+            # Before any actuals the model forecasts the calendar baseline
+            dates = [date.today() + timedelta(days=offset) for offset in range(1, 8)]
+            seeded = forecast_states([initial_state(route)], dates)[:, 0]
+            expected = np.array([np.array(route.profile(day.weekday())) *
+                                 (MARKET_MULTIPLIER if day.weekday() in route.market_days else 1.0)
+                                 for day in dates])
+            if not np.allclose(seeded, expected, atol=1e-6):
+                self.log_error(f"Seeded smoothing state does not reproduce the {route.id} profiles")
+                return False
+            
+            model = SmoothingForecaster(registry)
+            with get_pool(path).connection() as conn:
+                model.update(conn)
+            with get_pool(path).connection() as conn:
+                if model.update(conn) != 0:
+                    self.log_error("Smoothing update replayed observations it had already seen")
+                    return False
+                state = model.load_states(conn)[route.id]
+            
+            day = date.fromordinal(state.last_step // 24 + 1) if state.last_step is not None else date.today()
+            reference = RouteModelState(state.route_id, state.level, state.trend, state.seasonal.copy(),
+                                        state.last_step, state.observations)
+            reference.update(hour_step(day, 8), season_slot(day, 8), 150, model.params)
+            
+            with get_pool(path).connection() as conn:
+                conn.execute("""
+                    INSERT INTO passenger_demand
+                    (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+                    VALUES (?, 8, ?, 150, ?, 0)
+                """, (route.id, day.weekday(), day))
+            with get_pool(path).connection() as conn:
+                applied = model.update(conn)
+            with get_pool(path).connection() as conn:
+                updated = model.load_states(conn)[route.id]
+            
+            if applied != 1 or updated.observations != reference.observations:
+                self.log_error(f"One new actual applied {applied} observations")
+                return False
+            if not (np.isclose(updated.level, reference.level) and np.isclose(updated.trend, reference.trend)
+                    and np.allclose(updated.seasonal, reference.seasonal)):
+                self.log_error("Persisted smoothing state differs from a single O(1) update")
+                return False
+            
+            self.log_success("Smoothing model seeds from the profiles and applies only new actuals")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Smoothing model test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_accuracy_bias(self):
+        """Test that accuracy metrics track bias and replace a corrected actual's error"""
+        path = self.database_copy()
+        try:
+            from forecast_accuracy import day_type_of, sync
+            
+            conn = sqlite3.connect(path)
+            route_id = conn.execute("SELECT id FROM routes ORDER BY id LIMIT 1").fetchone()[0]
+            day, hour = date(2030, 1, 7), 9  # A date nothing else writes
+            key = (route_id, hour, day_type_of(day.isoformat(), 1.0))
+            
+            def totals():
+                return {variant: conn.execute("""
+                    SELECT samples, error_sum FROM forecast_accuracy
+                    WHERE route_id = ? AND hour = ? AND day_type = ? AND variant = ?
+                """, key + (variant,)).fetchone() or (0, 0) for variant in ('forecast', 'without_weather')}
+            
+            sync(conn)
+            before = totals()
+            conn.executemany("""
+                INSERT INTO passenger_demand
+                (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted,
+                 weather_factor, festival_factor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1.0)
+            """, [(route_id, hour, day.weekday(), 120, day.isoformat(), 1, 1.2),
+                  (route_id, hour, day.weekday(), 100, day.isoformat(), 0, 1.0)])
+            conn.commit()
+            sync(conn)
+            
+            # Corrected actual: its error replaces the first one instead of adding to it
+            conn.execute("""
+                UPDATE passenger_demand SET passenger_count = 130
+                WHERE route_id = ? AND date_recorded = ? AND hour = ? AND is_predicted = 0
+            """, (route_id, day.isoformat(), hour))
+            conn.commit()
+            sync(conn)
+            after = totals()
+            conn.close()
+            
+            expected = {'forecast': (1, 120 - 130), 'without_weather': (1, 120 / 1.2 - 130)}
+            for variant, (samples, error) in expected.items():
+                delta = (after[variant][0] - before[variant][0], after[variant][1] - before[variant][1])
+                if delta[0] != samples or abs(delta[1] - error) > 1e-6:
+                    self.log_error(f"Accuracy {variant} changed by {delta}, expected ({samples}, {error:g})")
+                    return False
+            
+            self.log_success("Accuracy bias follows corrected actuals and divides out the weather factor")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Accuracy test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_optimizer_constraints(self):
+        """Test that the schedule optimizer meets demand, headways and fleet limits"""
+        try:
+            import numpy as np
+            from forecast_engine import hourly_cost_array, seats_array
+            from schedule_optimizer import ServiceLevel, max_headway, optimize_schedule
+            from timetable import cycle_minutes
+            
+            # Up to 540 passengers an hour, what a 5-minute headway seats
+            demand = np.random.default_rng(11).integers(0, 540, (5, 24))
+            distances = np.array([85, 65, 113, 40, 150])
+            travel_times = np.array([120, 90, 150, 45, 180])
+            cycle = cycle_minutes(travel_times)[:, None]
+            
+            free = optimize_schedule(demand, distances, travel_times)
+            if ((seats_array(free.buses, free.frequency) < demand).any()
+                    or (free.frequency > max_headway(demand, ServiceLevel())).any()
+                    or (free.buses[:, 5:23] < 1).any() or free.unserved.any()):
+                self.log_error("Unconstrained schedule misses demand, headway or minimum service")
+                return False
+            if (free.buses * free.frequency < np.where(free.buses > 0, cycle, 0)).any():
+                self.log_error("Unconstrained schedule has too few buses to keep its headways")
+                return False
+            
+            route_fleet = np.array([2, 3, 4, 5, 6])
+            capped = optimize_schedule(demand, distances, travel_times, route_fleet, depot_fleet=12)
+            if (capped.buses > route_fleet[:, None]).any() or capped.buses.sum(axis=0).max() > 12:
+                self.log_error("Optimized schedule exceeds the route or depot fleet")
+                return False
+            if (capped.buses * capped.frequency < np.where(capped.buses > 0, cycle, 0)).any():
+                self.log_error("Fleet-limited schedule keeps headways its buses cannot run")
+                return False
+            if not np.allclose(capped.cost, hourly_cost_array(capped.buses, distances[:, None], capped.frequency)):
+                self.log_error("Optimized schedule cost differs from calculate_hourly_cost")
+                return False
+            seated = np.minimum(demand, np.floor(seats_array(capped.buses, capped.frequency)))
+            if (not np.array_equal(capped.unserved, demand - seated)
+                    or not np.array_equal(capped.fleet_limited, capped.buses < free.buses)):
+                self.log_error("Unserved passengers or fleet-limited cells are misreported")
+                return False
+            
+            self.log_success("Optimizer covers demand within headways and route/depot fleets")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Optimizer test failed: {e}")
+            return False
+    
+    def test_simulated_plan(self):
+        """Test that the simulator carries an optimized plan and strands what it leaves unserved"""
+        try:
+            import numpy as np
+            from schedule_optimizer import optimize_schedule
+            from simulation import RouteDayPlan, run_monte_carlo
+            
+            demand = np.array([0, 0, 0, 0, 0, 20, 80, 300, 515, 400, 200, 150,
+                               120, 130, 150, 200, 300, 480, 500, 300, 150, 80, 30, 0])
+            for route_fleet in (None, [12]):
+                solution = optimize_schedule(demand[None], [85], [120], route_fleet)
+                plan = RouteDayPlan('tp_pc', date.today(), demand, solution.buses[0], solution.frequency[0],
+                                    120, int(solution.buses.max()))
+                summary, = run_monte_carlo([plan], replications=20, seed=5, workers=1)
+                metrics = {name: values['mean'] for name, values in summary.metrics.items()}
+                
+                if metrics['mean_delay'] > 0 or metrics['cancelled_departures'] > 0:
+                    self.log_error(f"Planned fleet of {plan.fleet} could not keep the headways")
+                    return False
+                unserved = int(solution.unserved.sum())
+                if route_fleet is None and (metrics['stranded'] > 0.02 * metrics['passengers']
+                                            or metrics['mean_wait'] > 15):
+                    self.log_error(f"Unconstrained plan stranded {metrics['stranded']:.0f} passengers "
+                                   f"with a {metrics['mean_wait']:.1f} minute mean wait")
+                    return False
+                if route_fleet is not None and abs(metrics['stranded'] - unserved) > 0.1 * unserved:
+                    self.log_error(f"Simulator stranded {metrics['stranded']:.0f} passengers, "
+                                   f"the optimizer reported {unserved} unserved")
+                    return False
+            
+            self.log_success("Simulator carries the optimizer's plan and strands what it reports unserved")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Simulated plan test failed: {e}")
+            return False
+    
+    def test_simulation_reproducible(self):
+        """Test that Monte Carlo results depend on the seed and not on the worker count"""
+        try:
+            import numpy as np
+            from dataclasses import asdict
+            from simulation import RouteDayPlan, run_monte_carlo
+            
+            demand = np.array([0, 0, 0, 0, 0, 20, 80, 300, 515, 400, 200, 150,
+                               120, 130, 150, 200, 300, 480, 500, 300, 150, 80, 30, 0])
+            plans = [RouteDayPlan('tp_pc', date.today(), demand, np.full(24, 12), np.full(24, 22), 120, 12),
+                     RouteDayPlan('tp_cb', date.today(), demand // 2, np.full(24, 4), np.full(24, 60), 90, 4)]
+            serial = [asdict(s) for s in run_monte_carlo(plans, 7, seed=3, workers=1, replications_per_task=3)]
+            pooled = [asdict(s) for s in run_monte_carlo(plans, 7, seed=3, workers=2, replications_per_task=3)]
+            other = [asdict(s) for s in run_monte_carlo(plans, 7, seed=4, workers=1, replications_per_task=3)]
+            
+            if serial != pooled:
+                self.log_error("Simulation results change with the worker count")
+                return False
+            if serial == other:
+                self.log_error("Simulation results ignore the seed")
+                return False
+            
+            self.log_success("Simulation results are identical for 1 and 2 workers with the same seed")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Simulation reproducibility test failed: {e}")
+            return False
+    
+    def test_scenario_baseline(self):
+        """Test scenario validation and that the baseline row costs the optimizer's schedule"""
+        try:
+            import numpy as np
+            from festival_calendar import TAMIL_NADU_FESTIVALS
+            from route_registry import get_registry
+            from scenarios import Scenario, evaluate_scenarios, scenario_engine
+            from schedule_optimizer import optimize_schedule
+            
+            invalid = ['fuel', {'speed': 2}, {'fuel_per_km': -1}, {'driver_per_hour': 0},
+                       {'bus_capacity': 40.5}, {'demand_multiplier': True}, {'weather_factor': 'high'},
+                       {'market_multiplier': float('nan')}, {'threshold_scale': float('inf')}]
+            for spec in invalid:
+                try:
+                    Scenario.from_dict(spec)
+                except ValueError:
+                    continue
+                self.log_error(f"Scenario {spec!r} was accepted")
+                return False
+            scenario = Scenario.from_dict({'bus_capacity': 60.0, 'festival_multiplier': None}, 'bigger')
+            if scenario.name != 'bigger' or scenario.bus_capacity != 60 or not isinstance(scenario.bus_capacity, int):
+                self.log_error(f"Valid scenario parsed as {scenario}")
+                return False
+            
+            registry = get_registry(self.read_only_copy())
+            engine, fleet, travel_times = scenario_engine(registry, TAMIL_NADU_FESTIVALS)
+            day = date.today() + timedelta(days=1)
+            baseline, = evaluate_scenarios(engine, fleet, travel_times, day, [])
+            demand = engine.demand_matrix([day], [1.0], variation=np.ones((1, len(engine.route_ids), 24)))
+            solution = optimize_schedule(demand[0], engine.distances, travel_times, fleet)
+            if (abs(baseline.total_cost - solution.total_cost) > 0.01
+                    or baseline.unserved != solution.unserved.sum()
+                    or baseline.bus_hours != solution.buses.sum()):
+                self.log_error(f"Baseline scenario costs {baseline.total_cost:,.2f} with {baseline.unserved} unserved, "
+                               f"the optimizer {solution.total_cost:,.2f} with {solution.unserved.sum()}")
+                return False
+            
+            self.log_success(f"Invalid scenarios are rejected; the baseline matches the optimizer at "
+                             f"₹{baseline.total_cost:,.2f}")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Scenario test failed: {e}")
+            return False
+    
+    def test_backtest_matches_live(self):
+        """Test that backtest policies forecast and schedule like the live daily update"""
+        path = self.database_copy()
+        try:
+            import numpy as np
+            from backtest import PRESET_POLICIES, forecast_days, load_backtest_data, schedule_days
+            from daily_update_scheduler import TransportDataUpdater
+            
+            updater = TransportDataUpdater(db_path=path)
+            updater.sync_cube()
+            first, last = updater.cube.stored_range()
+            day = last + timedelta(days=1)
+            data = load_backtest_data(path, day, day, (day - first).days, updater.festivals)
+            shape = (1, len(data.route_ids), 24)
+            
+            # The calendar profile policy against the live engine without random variation
+            profile = forecast_days(data, PRESET_POLICIES['current'], [len(data.dates) - 1])
+            if not np.array_equal(profile, updater.engine.demand_matrix([day], [1.0], variation=np.ones(shape))):
+                self.log_error("Backtest profile forecast differs from the live engine")
+                return False
+            
+            # The production policy, warmed up on the whole history, against the live pipeline
+            policy = PRESET_POLICIES['production']
+            forecast = forecast_days(data, policy, [len(data.dates) - 1])
+            buses, frequency, cost = schedule_days(data, policy, np.floor(forecast * policy.demand_buffer))
+            live, = updater.plan_schedules([updater.engine.forecast([day], [1.0], **updater.forecast_options([day]))])
+            if not np.array_equal(forecast, live.demand):
+                self.log_error(f"Backtest smoothing forecast differs from the live model in "
+                               f"{int((forecast != live.demand).sum())} cells")
+                return False
+            if (not np.array_equal(buses, live.buses) or not np.array_equal(frequency, live.frequency)
+                    or not np.allclose(cost, live.cost)):
+                self.log_error("Backtest optimizer schedule differs from the live plan")
+                return False
+            
+            self.log_success(f"Backtest policies reproduce the live forecast and schedule for {day}")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Backtest equivalence test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_synthetic_seed(self):
+        """Test that the synthetic generator reproduces its network and history from the seed"""
+        directory = tempfile.mkdtemp(prefix='transport_test_')
+        try:
+            from synthetic_data import ROUTE_CHUNK, generate
+            
+            def snapshot(seed, name):
+                path = os.path.join(directory, name)
+                # One route past a chunk boundary, so the per-chunk seeds are covered too
+                generate(path, ROUTE_CHUNK + 1, 3, seed=seed, end=date(2025, 6, 30))
+                conn = sqlite3.connect(path)
+                try:
+                    return [conn.execute(query).fetchall() for query in (
+                        "SELECT * FROM depots ORDER BY id",
+                        "SELECT id, distance, travel_time, current_buses, daily_passengers, depot_id "
+                        "FROM routes ORDER BY id",
+                        "SELECT * FROM route_demand_profiles ORDER BY route_id, day_type, hour",
+                        "SELECT route_id, date_recorded, hour, passenger_count FROM passenger_demand "
+                        "ORDER BY route_id, date_recorded, hour"
+                    )]
+                finally:
+                    conn.close()
+            
+            first = snapshot(11, 'first.db')
+            if snapshot(11, 'again.db') != first:
+                self.log_error("The same seed generated different synthetic data")
+                return False
+            if snapshot(12, 'other.db') == first:
+                self.log_error("A different seed generated the same synthetic data")
+                return False
+            
+            self.log_success(f"Seed 11 regenerates {len(first[3])} demand rows exactly; seed 12 differs")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Synthetic seed test failed: {e}")
+            return False
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    def test_timetable_vehicles(self):
+        """Test trip generation and the vehicle count of the blocks"""
+        try:
+            import numpy as np
+            from schedule_optimizer import optimize_schedule
+            from timetable import DEFAULT_LAYOVER_MINUTES, plan_route_day
+            
+            # Hourly departures from both ends, 50 minutes each way plus layover: two buses shuttle all day
+            shuttle = plan_route_day('tp_pc', date.today(), [1] * 24, [60] * 24, 50, layover=10)
+            if shuttle.vehicles != 2 or len(shuttle.trips) != 48 or shuttle.extra_vehicles != 1:
+                self.log_error(f"Shuttle timetable used {shuttle.vehicles} vehicles for {len(shuttle.trips)} trips, "
+                               f"{shuttle.extra_vehicles} above its plan of one bus")
+                return False
+            
+            # An optimized plan has the buses its headways need
+            demand = np.array([0, 0, 0, 0, 0, 20, 80, 300, 515, 400, 200, 150,
+                               120, 130, 150, 200, 300, 480, 500, 300, 150, 80, 30, 0])
+            for travel_time in (45, 90, 120, 150):
+                solution = optimize_schedule(demand[None], [85], [travel_time])
+                planned = plan_route_day('tp_pc', date.today(), solution.buses[0], solution.frequency[0],
+                                         travel_time)
+                if planned.extra_vehicles:
+                    self.log_error(f"Optimized plan with {travel_time}-minute trips needs {planned.vehicles} "
+                                   f"vehicles for {planned.planned_peak_buses} planned buses")
+                    return False
+            
+            buses = np.random.default_rng(17).integers(1, 6, 24)
+            frequency = np.resize([10, 15, 20, 30], 24)
+            result = plan_route_day('tp_pc', date.today(), buses, frequency, 37)
+            
+            blocks = {}
+            for trip in result.trips:
+                blocks.setdefault(trip.block_id, []).append(trip)
+            for trips in blocks.values():
+                for previous, trip in zip(trips, trips[1:]):
+                    if (trip.departure < previous.arrival + DEFAULT_LAYOVER_MINUTES
+                            or trip.direction == previous.direction):
+                        self.log_error(f"Vehicle block {trip.block_id} has an impossible connection")
+                        return False
+            # No timetable can run with fewer vehicles than are busy at once
+            busiest = max(sum(other.departure <= trip.departure < other.arrival + DEFAULT_LAYOVER_MINUTES
+                              for other in result.trips) for trip in result.trips)
+            if result.vehicles != len(blocks) or result.vehicles < busiest:
+                self.log_error(f"Timetable reports {result.vehicles} vehicles for {len(blocks)} blocks "
+                               f"with {busiest} busy at once")
+                return False
+            
+            # The daily update writes tomorrow's trips; the endpoint only reads them
+            update = requests.post(f"{self.api_base}/daily-update", timeout=60)
+            response = requests.get(f"{self.api_base}/timetable/tp_pc", timeout=30)
+            data = response.json()
+            if (update.status_code != 200 or response.status_code != 200
+                    or data['vehicles'] != len({t['block_id'] for t in data['trips']})):
+                self.log_error(f"Timetable endpoint returned {response.status_code} or a wrong vehicle count")
+                return False
+            for _ in range(2):
+                missing = requests.get(f"{self.api_base}/timetable/tp_pc?date=2001-01-01", timeout=30)
+                if missing.status_code != 404:
+                    self.log_error(f"Timetable for a date without predictions returned {missing.status_code}")
+                    return False
+            
+            self.log_success(f"Timetables chain {len(result.trips)} trips into {result.vehicles} vehicles")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Timetable test failed: {e}")
+            return False
+    
+    def test_cube_consistency(self):
+        """Test the demand cube against passenger_demand after syncs and a rebuild"""
+        path = self.database_copy()
+        try:
+            import numpy as np
+            from db_pool import get_pool
+            from demand_cube import MISSING, DemandCube, cube_path
+            
+            pool = get_pool(path)
+            cube = DemandCube(cube_path(path))
+            
+            def matches(cube):
+                with pool.connection() as conn:
+                    rows = conn.execute("""
+                        SELECT route_id, date_recorded, hour, passenger_count, is_predicted FROM passenger_demand
+                    """).fetchall()
+                start, end = cube.stored_range()
+                route_ids = sorted({row[0] for row in rows})
+                for predicted in (False, True):
+                    expected = np.full((len(route_ids), (end - start).days + 1, 24), MISSING)
+                    for route_id, day, hour, count, is_predicted in rows:
+                        if bool(is_predicted) == predicted:
+                            expected[route_ids.index(route_id), (date.fromisoformat(day) - start).days, hour] = count
+                    if not np.array_equal(cube.window(start, end, route_ids, predicted), expected):
+                        return False
+                return True
+            
+            with pool.connection() as conn:
+                cube.sync(conn)
+            if not matches(cube):
+                self.log_error("Demand cube differs from passenger_demand after the first sync")
+                return False
+            
+            # Appended rows are mirrored incrementally
+            with pool.connection() as conn:
+                route_id, day = conn.execute("""
+                    SELECT route_id, MAX(date_recorded) FROM passenger_demand WHERE is_predicted = 0
+                """).fetchone()
+                day = date.fromisoformat(day) + timedelta(days=3)
+                conn.executemany("""
+                    INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                """, [(route_id, hour, day.weekday(), 10 * hour, day) for hour in range(24)])
+            with pool.connection() as conn:
+                cube.sync(conn)
+            if not matches(cube):
+                self.log_error("Demand cube differs from passenger_demand after appending rows")
+                return False
+            
+            # Updates and deletes rewrite it
+            with pool.connection() as conn:
+                conn.execute("UPDATE passenger_demand SET passenger_count = passenger_count + 1 WHERE hour = 8")
+                conn.execute("DELETE FROM passenger_demand WHERE hour = 3")
+            with pool.connection() as conn:
+                cube.sync(conn)
+            if not matches(cube):
+                self.log_error("Demand cube differs from passenger_demand after updates and deletes")
+                return False
+            
+            # Another process sees the same files, and a rebuild from scratch agrees
+            other = DemandCube(cube_path(path))
+            if not matches(other):
+                self.log_error("A second cube instance does not see the synced state")
+                return False
+            with pool.connection() as conn:
+                other.rebuild(conn)
+            if not matches(other):
+                self.log_error("Demand cube differs from passenger_demand after a rebuild")
+                return False
+            
+            self.log_success("Demand cube matches SQLite after appends, rewrites and a rebuild")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Demand cube test failed: {e}")
+            return False
+        finally:
+            self.remove_copy(path)
+    
+    def test_event_stream(self):
+        """Test the SSE snapshot and the event sent after a daily update"""
+        response = None
+        try:
+            response = requests.get(f"{self.api_base}/events", stream=True, timeout=(5, 40))
+            if response.status_code != 200:
+                self.log_error(f"Event stream returned status {response.status_code}")
+                return False
+            lines = response.iter_lines(decode_unicode=True)
+            
+            def next_event():
+                name, data = None, None
+                for line in lines:
+                    if line.startswith('event:'):
+                        name = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data = json.loads(line[5:])
+                    elif not line and name:
+                        return name, data
+                raise ConnectionError("Event stream closed")
+            
+            name, snapshot = next_event()
+            if name != 'versions' or 'predictions' not in snapshot:
+                self.log_error(f"Event stream started with {name} instead of a versions snapshot")
+                return False
+            
+            update = requests.post(f"{self.api_base}/daily-update", timeout=60)
+            if update.status_code != 200:
+                self.log_error(f"Daily update failed with status {update.status_code}")
+                return False
+            while True:
+                name, data = next_event()
+                if name == 'predictions':
+                    break
+            if data['version'] <= snapshot['predictions']:
+                self.log_error(f"Predictions event carries an old version: {data}")
+                return False
+            
+            self.log_success(f"Event stream pushed predictions version {data['version']} after the daily update")
+            return True
+            
+        except Exception as e:
+            self.log_error(f"Event stream test failed: {e}")
+            return False
+        finally:
+            if response is not None:
+                response.close()
+    
     def run_comprehensive_test(self):
         """Run all system tests"""
         print("🧪 Starting Enhanced Transport Optimizer System Tests")
@@ -158,18 +1229,43 @@ class SystemTester:
             ("Weather Simulation", self.test_weather_simulation),
             ("Festival Detection", self.test_festival_detection),
             ("Schedule Optimization", self.test_schedule_optimization),
+            ("Forecast Engine", self.test_forecast_engine_equivalence),
+            ("Schedule Optimizer", self.test_optimizer_constraints),
+            ("Simulated Optimizer Plan", self.test_simulated_plan),
+            ("Simulation Reproducibility", self.test_simulation_reproducible),
+            ("Depot Fleet Limits", self.test_depot_fleet_caps),
+            ("Scenario Baseline", self.test_scenario_baseline),
+            ("Backtest Equivalence", self.test_backtest_matches_live),
+            ("Timetable Vehicles", self.test_timetable_vehicles),
+            ("Synthetic Seed", self.test_synthetic_seed),
+            ("Benchmark Suite", self.test_benchmark_suite),
+            ("Metrics Format", self.test_metrics_render),
+            ("Profiler Totals", self.test_profiler_totals),
+            ("Migration Dedup", self.test_migration_dedup),
+            ("Incremental Ingestion", self.test_incremental_ingestion),
+            ("Demand Rollup", self.test_rollup_averages),
+            ("Smoothing Model", self.test_smoothing_update),
+            ("Forecast Accuracy", self.test_accuracy_bias),
+            ("Demand Cube", self.test_cube_consistency),
             ("Prediction System", self.test_prediction_system),
+            ("Response Cache", self.test_response_cache),
+            ("Event Stream", self.test_event_stream),
         ]
         
         passed = 0
         failed = 0
         
-        for test_name, test_func in tests:
-            print(f"\n🔍 Testing {test_name}...")
-            if test_func():
-                passed += 1
-            else:
-                failed += 1
+        try:
+            for test_name, test_func in tests:
+                print(f"\n🔍 Testing {test_name}...")
+                if test_func():
+                    passed += 1
+                else:
+                    failed += 1
+        finally:
+            if self.shared_copy is not None:
+                self.remove_copy(self.shared_copy)
+                self.shared_copy = None
         
         print("\n" + "=" * 60)
         print(f"📊 Test Results: {passed} passed, {failed} failed")
@@ -0,0 +1,213 @@
+"""
+Tamil Nadu Transport Optimizer - Timetable and Vehicle Blocks
+Turns hourly headways into trips and chains the trips into vehicle blocks
+
+A route runs between two terminals. For every hour with buses scheduled,
+departures leave both terminals every frequency_minutes, and each trip
+arrives travel_time minutes later. A headway carries on into the next hour
+until that hour's headway takes over, so there are no bunched departures at
+hour boundaries. Times after midnight are written as 24:10, 25:30, ...,
+like the end of a service day in GTFS.
+
+Departures follow the headway alone; the planned buses only decide which
+hours have service. The optimizer plans ceil(cycle / headway) buses for a
+headway, enough to keep it once it has run for a full cycle, so the
+blocks normally need no more vehicles than the planned peak. Where they
+do (a schedule that was not optimized, or headways that shorten faster
+than buses come back), extra_vehicles reports how many more, and
+generate_timetables logs a warning for the route.
+
+Vehicle blocks come from greedy interval partitioning across the two
+terminals. Trips are taken in departure order. Each trip is given the
+vehicle that has been waiting longest at its terminal, once that vehicle
+has finished its previous trip plus the layover. If none is waiting, a
+new vehicle enters service. With no deadhead moves between terminals this
+uses the minimum number of vehicles.
+
+The result replaces the route-day's rows in bus_schedules.
+"""
+
+import heapq
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+import data_versions
+from bulk_writer import BulkWriter
+from route_registry import RouteRegistry
+
+OUTBOUND = 'outbound'
+INBOUND = 'inbound'
+DIRECTIONS = (OUTBOUND, INBOUND)
+
+DEFAULT_LAYOVER_MINUTES = 10
+
+# Same peak hours as the generated history
+PEAK_HOURS = (7, 8, 17, 18)
+
+
+@dataclass
+class Trip:
+    direction: str
+    departure: int      # minutes after midnight of the service date
+    arrival: int
+    hour: int
+    frequency: int
+    block_id: int = 0
+
+
+@dataclass
+class TimetableResult:
+    route_id: str
+    service_date: date
+    trips: List[Trip]
+    vehicles: int
+    planned_peak_buses: int
+
+    @property
+    def extra_vehicles(self) -> int:
+        """Vehicles the blocks need beyond the planned peak buses"""
+        return max(0, self.vehicles - self.planned_peak_buses)
+
+    def to_dict(self) -> dict:
+        return {
+            'route_id': self.route_id,
+            'service_date': self.service_date.strftime('%Y-%m-%d'),
+            'trips': len(self.trips),
+            'vehicles': self.vehicles,
+            'planned_peak_buses': self.planned_peak_buses,
+            'extra_vehicles': self.extra_vehicles
+        }
+
+
+def format_time(minutes: int) -> str:
+    """HH:MM, continuing past 24:00 for trips after midnight"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def cycle_minutes(travel_time, layover=DEFAULT_LAYOVER_MINUTES):
+    """Minutes before a vehicle can leave the same terminal again: a trip each way plus two layovers"""
+    return 2 * (travel_time + layover)
+
+
+def departure_minutes(buses: Sequence[int], frequency: Sequence[int]) -> List[Tuple[int, int, int]]:
+    """(departure minute, hour, headway) from one terminal over a service day"""
+    departures = []
+    minute = 0
+    while minute < 24 * 60:
+        hour = minute // 60
+        if buses[hour] <= 0 or frequency[hour] <= 0:
+            minute = (hour + 1) * 60  # No service this hour
+            continue
+        departures.append((minute, hour, int(frequency[hour])))
+        minute += int(frequency[hour])
+    return departures
+
+
+def build_trips(buses: Sequence[int], frequency: Sequence[int], travel_time: int) -> List[Trip]:
+    """Trips in both directions, ordered by departure"""
+    return [Trip(direction, minute, minute + travel_time, hour, headway)
+            for minute, hour, headway in departure_minutes(buses, frequency)
+            for direction in DIRECTIONS]
+
+
+def assign_blocks(trips: List[Trip], layover: int = DEFAULT_LAYOVER_MINUTES) -> int:
+    """Chain trips (ordered by departure) into vehicle blocks; returns the vehicle count"""
+    # Per terminal: (ready minute, block id) of vehicles waiting there
+    waiting = {OUTBOUND: [], INBOUND: []}
+    vehicles = 0
+    for trip in trips:
+        queue = waiting[trip.direction]
+        if queue and queue[0][0] <= trip.departure:
+            _, trip.block_id = heapq.heappop(queue)
+        else:
+            vehicles += 1
+            trip.block_id = vehicles
+        # The trip ends at the other terminal, where the vehicle starts the opposite direction
+        opposite = INBOUND if trip.direction == OUTBOUND else OUTBOUND
+        heapq.heappush(waiting[opposite], (trip.arrival + layover, trip.block_id))
+    return vehicles
+
+
+def plan_route_day(route_id: str, service_date: date, buses: Sequence[int],
+                   frequency: Sequence[int], travel_time: int,
+                   layover: int = DEFAULT_LAYOVER_MINUTES) -> TimetableResult:
+    trips = build_trips(buses, frequency, travel_time)
+    vehicles = assign_blocks(trips, layover)
+    return TimetableResult(route_id, service_date, trips, vehicles, int(max(buses, default=0)))
+
+
+def timetable_rows(result: TimetableResult):
+    for trip in result.trips:
+        yield (result.route_id, result.service_date, trip.direction, format_time(trip.departure),
+               format_time(trip.arrival), trip.frequency, trip.hour in PEAK_HOURS, trip.block_id)
+
+
+def generate_timetables(conn, registry: RouteRegistry, service_date: date,
+                        route_ids: Optional[Sequence[str]] = None,
+                        layover: int = DEFAULT_LAYOVER_MINUTES) -> List[TimetableResult]:
+    """Build and store the timetable of each route from its predicted schedule
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    schedules = {}
+    for route_id, hour, buses, frequency in conn.execute("""
+    SELECT route_id, hour, recommended_buses, frequency_minutes
+    FROM daily_schedule_predictions
+    WHERE prediction_date = ?
+    """, (service_date,)):
+        schedule = schedules.setdefault(route_id, ([0] * 24, [0] * 24))
+        schedule[0][hour] = buses
+        schedule[1][hour] = frequency
+
+    route_ids = list(route_ids) if route_ids is not None else registry.route_ids()
+    results = []
+    for route_id in route_ids:
+        route = registry.get(route_id)
+        if route is None or route_id not in schedules:
+            continue
+        buses, frequency = schedules[route_id]
+        results.append(plan_route_day(route_id, service_date, buses, frequency,
+                                      route.travel_time, layover))
+
+    conn.executemany("DELETE FROM bus_schedules WHERE route_id = ? AND service_date = ?",
+                     [(result.route_id, service_date) for result in results])
+    writer = BulkWriter(conn)
+    seconds = 0.0
+    for result in results:
+        seconds += writer.write("""
+        INSERT INTO bus_schedules
+        (route_id, service_date, direction, departure_time, arrival_time, frequency_minutes,
+         is_peak_hour, block_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, timetable_rows(result), single_transaction=True).seconds
+
+    for result in results:
+        if result.extra_vehicles:
+            logging.warning(f"Timetable for {result.route_id} on {service_date} needs {result.vehicles} "
+                            f"vehicles, {result.extra_vehicles} above the planned peak of "
+                            f"{result.planned_peak_buses} buses")
+    if results:
+        data_versions.bump_version(conn, data_versions.SCHEDULES)
+        logging.info(f"Timetables for {service_date}: {sum(len(r.trips) for r in results)} trips, "
+                     f"{sum(r.vehicles for r in results)} vehicles over {len(results)} routes, "
+                     f"written in {seconds:.3f}s")
+    return results
+
+
+def read_timetable(conn, route_id: str, service_date: date) -> List[dict]:
+    """Stored trips of a route-day in departure order"""
+    return [{
+        'direction': direction,
+        'departure_time': departure,
+        'arrival_time': arrival,
+        'frequency_minutes': frequency,
+        'is_peak_hour': bool(is_peak),
+        'block_id': block_id
+    } for direction, departure, arrival, frequency, is_peak, block_id in conn.execute("""
+    SELECT direction, departure_time, arrival_time, frequency_minutes, is_peak_hour, block_id
+    FROM bus_schedules
+    WHERE route_id = ? AND service_date = ?
+    ORDER BY departure_time, direction
+    """, (route_id, service_date))]